@@ -0,0 +1,124 @@
+# backend/backfill_contact_index.py
+# Backfill do índice de contatos do CRM (cabeleireiros/{id}/contatos_index) para os
+# clientes gravados antes dele existir:
+#  1. Indexa o telefone normalizado e o e-mail de cada cliente. Quando dois clientes têm
+#     o mesmo contato (duplicatas dos formatos antigos), o índice aponta para o mais
+#     antigo e o caso sai no relatório; uma entrada que aponta para um cadastro mais novo
+#     (duplicata criada antes do backfill) é re-apontada para o mais antigo.
+#  2. Grava o clienteId nos agendamentos antigos que não têm, casando telefone/e-mail
+#     normalizados pelo índice: o histórico do CRM passa a sair só pela busca por clienteId.
+# Depois de rodar em todos os salões, CONTACT_INDEX_FALLBACK=0 desliga as consultas antigas.
+#
+# Uso (a partir de backend/, com as credenciais do Firebase no ambiente):
+#   python backfill_contact_index.py --dry-run
+#   python backfill_contact_index.py [--salao-id SALAO_ID]
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from core import db as core_db
+from core.contacts import contact_keys
+from core.repositories import agendamentos, clientes, contatos_index, salons
+
+BATCH_SIZE = 400  # Abaixo do limite de 500 escritas por batch
+
+
+class _BatchWriter:
+    def __init__(self, dry_run: bool):
+        self.dry_run = dry_run
+        self.batch = None
+        self.pending = 0
+        self.total = 0
+
+    def _add(self, op, ref, data) -> None:
+        self.total += 1
+        if self.dry_run:
+            return
+        if self.batch is None:
+            self.batch = core_db.db.batch()
+        getattr(self.batch, op)(ref, data)
+        self.pending += 1
+        if self.pending >= BATCH_SIZE:
+            self.flush()
+
+    def set(self, ref, data) -> None:
+        self._add("set", ref, data)
+
+    def update(self, ref, data) -> None:
+        self._add("update", ref, data)
+
+    def flush(self) -> None:
+        if self.batch is not None and self.pending:
+            self.batch.commit()
+        self.batch = None
+        self.pending = 0
+
+
+def _signup_order(cliente: Dict) -> tuple:
+    cadastro = cliente.get("data_cadastro")
+    return (not isinstance(cadastro, datetime), cadastro if isinstance(cadastro, datetime) else 0, cliente["id"])
+
+
+def backfill_salon(salao_id: str, dry_run: bool) -> Dict[str, int]:
+    index = {doc.id: doc.to_dict().get("clienteId") for doc in contatos_index.collection(salao_id).stream()}
+    writer = _BatchWriter(dry_run)
+    duplicates: List[str] = []
+
+    # 1. Índice a partir dos clientes: o cadastro mais antigo fica com o contato. Uma entrada
+    #    que aponta para um cadastro mais novo (duplicata criada antes do backfill) é re-apontada.
+    now = datetime.now(timezone.utc)
+    oldest: Dict[str, str] = {}
+    repointed = 0
+    for cliente in sorted(clientes.list(salao_id, fields=("whatsapp", "email", "data_cadastro")), key=_signup_order):
+        for key in contact_keys(cliente.get("whatsapp"), cliente.get("email")):
+            if key in oldest:
+                duplicates.append(f"{key}: {oldest[key]} / {cliente['id']}")
+                continue
+            oldest[key] = cliente["id"]
+            owner = index.get(key)
+            if owner == cliente["id"]:
+                continue
+            if owner is not None:
+                repointed += 1
+                print(f"  [{salao_id}] {key} re-apontado: {owner} -> {cliente['id']}")
+            index[key] = cliente["id"]
+            writer.set(contatos_index.ref(salao_id, key), {"clienteId": cliente["id"], "atualizadoEm": now})
+    indexed = writer.total
+
+    # 2. clienteId nos agendamentos antigos
+    linked = 0
+    for appt in agendamentos.list(salao_id, fields=("clienteId", "customerPhone", "customerEmail")):
+        if appt.get("clienteId"):
+            continue
+        cliente_id = next(
+            (index[key] for key in contact_keys(appt.get("customerPhone"), appt.get("customerEmail")) if key in index),
+            None,
+        )
+        if cliente_id:
+            writer.update(agendamentos.ref(salao_id, appt["id"]), {"clienteId": cliente_id})
+            linked += 1
+    writer.flush()
+
+    for line in duplicates:
+        print(f"  [{salao_id}] contato duplicado -> {line}")
+    return {"indexados": indexed, "reapontados": repointed, "agendamentos_vinculados": linked, "duplicados": len(duplicates)}
+
+
+def main(args) -> None:
+    if core_db.db is None:
+        raise SystemExit("Banco de dados não inicializado.")
+    salao_ids = [args.salao_id] if args.salao_id else [salon["id"] for salon in salons.list_all()]
+    totals = {"indexados": 0, "reapontados": 0, "agendamentos_vinculados": 0, "duplicados": 0}
+    for salao_id in salao_ids:
+        result = backfill_salon(salao_id, args.dry_run)
+        print(f"{salao_id}: {result}")
+        for key, value in result.items():
+            totals[key] += value
+    print(f"{'[dry-run] ' if args.dry_run else ''}{len(salao_ids)} salões: {totals}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill do índice de contatos do CRM")
+    parser.add_argument("--salao-id", default=None, help="Só este salão (padrão: todos)")
+    parser.add_argument("--dry-run", action="store_true", help="Só conta, não grava")
+    main(parser.parse_args())
@@ -0,0 +1,110 @@
+# backend/bench_concurrency.py
+# Benchmark de concorrência: dispara N requisições simultâneas contra um endpoint
+# (ex: /admin/dashboard-data/{id}) e, ao mesmo tempo, mede a latência da rota raiz
+# ('/'), que não faz I/O. Se a rota testada bloquear o event loop, a raiz fica lenta
+# junto; com o acesso assíncrono ao Firestore ela continua respondendo na hora.
+#
+# Uso (API rodando com um único worker, ex: uvicorn main:app --workers 1):
+#   python bench_concurrency.py --base-url http://localhost:8000 \
+#       --path /api/v1/admin/dashboard-data/SALAO_ID --token "$ID_TOKEN" \
+#       --concurrency 20 --requests 200
+#
+# Sem projeto Firebase, contra o store em memória (core/memory_store.py):
+#   HORALIS_DATA_BACKEND=memory HORALIS_MEMORY_DEMO_SALOES=1 uvicorn main:app --workers 1
+#   python bench_concurrency.py --path /api/v1/admin/dashboard-data/demo-1 --token demo:demo-owner-1
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _report(label: str, latencies: List[float], errors: int, elapsed: float) -> None:
+    total = len(latencies) + errors
+    print(f"--- {label} ---")
+    print(f"  requisições: {total} (erros: {errors}) em {elapsed:.2f}s -> {total / elapsed:.1f} req/s")
+    if latencies:
+        print(
+            f"  latência (ms): média {statistics.mean(latencies):.1f} | "
+            f"p50 {_percentile(latencies, 50):.1f} | p95 {_percentile(latencies, 95):.1f} | "
+            f"p99 {_percentile(latencies, 99):.1f} | máx {max(latencies):.1f}"
+        )
+
+
+async def _timed_get(client: httpx.AsyncClient, url: str, headers: Dict[str, str], latencies: List[float]) -> bool:
+    started = time.perf_counter()
+    try:
+        response = await client.get(url, headers=headers)
+        ok = response.status_code < 500
+    except httpx.HTTPError:
+        ok = False
+    if ok:
+        latencies.append((time.perf_counter() - started) * 1000)
+    return ok
+
+
+async def _load(client, url, headers, concurrency, total, latencies) -> int:
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def _one():
+        nonlocal errors
+        async with semaphore:
+            if not await _timed_get(client, url, headers, latencies):
+                errors += 1
+
+    await asyncio.gather(*(_one() for _ in range(total)))
+    return errors
+
+
+async def _probe(client, url, stop: asyncio.Event, interval: float, latencies) -> int:
+    errors = 0
+    while not stop.is_set():
+        if not await _timed_get(client, url, {}, latencies):
+            errors += 1
+        await asyncio.sleep(interval)
+    return errors
+
+
+async def main(args) -> None:
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    target_url = args.base_url.rstrip("/") + args.path
+    probe_url = args.base_url.rstrip("/") + args.probe_path
+
+    load_latencies: List[float] = []
+    probe_latencies: List[float] = []
+    limits = httpx.Limits(max_connections=args.concurrency + 2)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(_probe(client, probe_url, stop, args.probe_interval, probe_latencies))
+        started = time.perf_counter()
+        load_errors = await _load(client, target_url, headers, args.concurrency, args.requests, load_latencies)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        probe_errors = await probe_task
+
+    _report(f"{args.path} (concorrência {args.concurrency})", load_latencies, load_errors, elapsed)
+    _report(f"{args.probe_path} durante a carga", probe_latencies, probe_errors, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de concorrência da API Horalis")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--path", required=True, help="Rota testada, ex: /api/v1/admin/dashboard-data/SALAO_ID")
+    parser.add_argument("--token", default=None, help="ID token do Firebase (rotas do admin)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--probe-path", default="/")
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,122 @@
+# backend/bench_double_booking.py
+# Teste de concorrência da reserva de horário: N threads pedem O MESMO horário do
+# mesmo profissional ao mesmo tempo. Com a reserva transacional (services/reservations.py)
+# exatamente um pedido pode vencer; com --sem-reserva roda o fluxo antigo
+# (validate_booking + set) para comparar. Em seguida mede a vazão com pedidos
+# espalhados por profissionais/dias diferentes (que não disputam o mesmo livro).
+# A garantia em si (sem medir vazão) é verificada por tests/test_double_booking.py.
+#
+# Uso (a partir de backend/):
+#   HORALIS_DATA_BACKEND=memory HORALIS_MEMORY_DEMO_SALOES=1 HORALIS_SETUP_PRICE=0 \
+#       python bench_double_booking.py --threads 32
+#   Firestore real (salão de teste!): python bench_double_booking.py --salao-id SALAO_ID --professional-id PRO_ID
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytz
+
+from core import db as core_db
+from core.db import get_hairdresser_data_from_db
+from core.repositories import agendamentos, profissionais
+from services import calendar_service, reservations
+
+LOCAL_TZ = pytz.timezone(calendar_service.LOCAL_TIMEZONE)
+
+
+def _appointment(salao_id: str, professional_id: str, start: datetime, index: int) -> dict:
+    return {
+        "salaoId": salao_id, "customerName": f"Concorrente {index}", "customerPhone": f"1190000{index:04d}",
+        "serviceName": "Teste de concorrência", "servicePrice": 0.0, "durationMinutes": 30,
+        "professionalId": professional_id, "startTime": start, "endTime": start + timedelta(minutes=30),
+        "status": "confirmado", "channel": "bench",
+    }
+
+
+def _book(salao_id: str, salon_data: dict, data: dict, use_reservation: bool) -> bool:
+    validation = calendar_service.validate_booking(
+        salao_id, salon_data, data["startTime"], data["durationMinutes"], professional_id=data["professionalId"]
+    )
+    if not validation.ok:
+        return False
+    if use_reservation:
+        return reservations.reserve_and_create(salao_id, data, data["professionalId"]) is not None
+    agendamentos.create(salao_id, data)  # Fluxo antigo: grava sem transação
+    return True
+
+
+def _open_starts(days_ahead: int, count: int) -> list:
+    # 'count' dias úteis (seg-sáb) a partir de days_ahead, às 10:00 (horário local)
+    starts = []
+    day = datetime.now(LOCAL_TZ).date() + timedelta(days=days_ahead)
+    while len(starts) < count:
+        if day.weekday() != 6:
+            starts.append(LOCAL_TZ.localize(datetime.combine(day, datetime.min.time()) + timedelta(hours=10)))
+        day += timedelta(days=1)
+    return starts
+
+
+def hammer_one_slot(salao_id, salon_data, professional_id, threads, use_reservation) -> int:
+    start = _open_starts(days_ahead=20, count=1)[0]
+    barrier = threading.Barrier(threads)
+
+    def _one(index):
+        barrier.wait()  # Todos disparam juntos
+        return _book(salao_id, salon_data, _appointment(salao_id, professional_id, start, index), use_reservation)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(_one, range(threads)))
+    stored = [a for a in agendamentos.in_range(salao_id, start, start, professional_id=professional_id)
+              if a.get("channel") == "bench"]
+    print(f"--- mesmo horário ({start.isoformat()}, {professional_id}), {threads} threads, "
+          f"{'com' if use_reservation else 'SEM'} reserva ---")
+    print(f"  pedidos aceitos: {sum(results)} | agendamentos gravados no horário: {len(stored)}")
+    return len(stored)
+
+
+def spread_throughput(salao_id, salon_data, pro_ids, threads, total) -> None:
+    days = _open_starts(days_ahead=30, count=20)
+
+    def _one(index):
+        pro_id = pro_ids[index % len(pro_ids)]
+        start = days[(index // len(pro_ids)) % len(days)]
+        start += timedelta(minutes=30 * ((index // (len(pro_ids) * len(days))) % 16))
+        return _book(salao_id, salon_data, _appointment(salao_id, pro_id, start, index), True)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(_one, range(total)))
+    elapsed = time.perf_counter() - started
+    print(f"--- {total} pedidos espalhados ({len(pro_ids)} profissionais x 20 dias), {threads} threads ---")
+    print(f"  aceitos: {sum(results)} em {elapsed:.2f}s -> {total / elapsed:.1f} reservas/s")
+
+
+def main(args) -> None:
+    if core_db.db is None:
+        raise SystemExit("Banco de dados não inicializado.")
+    salao_id = args.salao_id
+    salon_data = get_hairdresser_data_from_db(salao_id)
+    if not salon_data:
+        raise SystemExit(f"Salão {salao_id} não encontrado.")
+    pro_ids = list(profissionais.list_active(salao_id).keys())
+    professional_id = args.professional_id or pro_ids[0]
+
+    stored = hammer_one_slot(salao_id, salon_data, professional_id, args.threads, not args.sem_reserva)
+    if not args.sem_reserva and args.spread:
+        spread_throughput(salao_id, salon_data, pro_ids, args.threads, args.spread)
+    if not args.sem_reserva and stored != 1:
+        print("FALHA: o horário foi reservado mais de uma vez (ou nenhuma).")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concorrência na reserva de horários (double booking)")
+    parser.add_argument("--salao-id", default="demo-1")
+    parser.add_argument("--professional-id", default=None)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--spread", type=int, default=200, help="Pedidos espalhados para medir vazão (0 desliga)")
+    parser.add_argument("--sem-reserva", action="store_true", help="Fluxo antigo, sem transação (para comparar)")
+    main(parser.parse_args())
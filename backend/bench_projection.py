@@ -0,0 +1,86 @@
+# backend/bench_projection.py
+# Benchmark das projeções (select) nas consultas quentes: roda cada consulta com o
+# documento inteiro ("antes") e só com os campos declarados pela rota ("depois"),
+# medindo o tempo de stream() + to_dict() e o volume decodificado.
+#
+# Uso (a partir de backend/):
+#   Firestore real:  python bench_projection.py --salao-id SALAO_ID
+#   Em memória, salão com ~10k agendamentos:
+#     HORALIS_DATA_BACKEND=memory HORALIS_SETUP_PRICE=0 python bench_projection.py --seed
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from core import db as core_db
+from core.repositories import agendamentos, clientes, despesas
+from routers.admin_routes import CALENDAR_EVENT_FIELDS, CRM_LIST_FIELDS, DASHBOARD_CHART_FIELDS
+from routers.financial_routes import SUMMARY_APPOINTMENT_FIELDS, SUMMARY_EXPENSE_FIELDS
+
+
+def _measure(run, repeat: int):
+    timings = []
+    rows = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = run()
+        timings.append((time.perf_counter() - started) * 1000)
+    payload = sum(len(json.dumps(row, default=str)) for row in rows)
+    return statistics.median(timings), len(rows), payload
+
+
+def _cases(salao_id: str):
+    now = datetime.now(pytz.utc)
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+    ativos = [('status', '!=', 'cancelado')]
+    return [
+        ("get_calendar_events (mês)", CALENDAR_EVENT_FIELDS,
+         lambda fields: agendamentos.in_range(salao_id, month_start, month_end, fields=fields)),
+        ("list_crm_clients", CRM_LIST_FIELDS,
+         lambda fields: clientes.list(salao_id, fields=fields)),
+        ("dashboard gráfico (mês)", DASHBOARD_CHART_FIELDS,
+         lambda fields: agendamentos.list(
+             salao_id, [('startTime', '>=', month_start), ('startTime', '<', month_end)] + ativos, fields=fields)),
+        ("get_financial_summary (mês)", SUMMARY_APPOINTMENT_FIELDS,
+         lambda fields: agendamentos.in_range(salao_id, month_start, month_end, fields=fields)),
+        ("get_financial_summary despesas", SUMMARY_EXPENSE_FIELDS,
+         lambda fields: despesas.in_period(salao_id, month_start.strftime('%Y-%m-%d'), month_end.strftime('%Y-%m-%d'), fields=fields)),
+    ]
+
+
+def main(args) -> None:
+    if core_db.db is None:
+        raise SystemExit("Banco de dados não inicializado.")
+    salao_id = args.salao_id
+    if args.seed:
+        if core_db.DATA_BACKEND != "memory":
+            raise SystemExit("--seed só com HORALIS_DATA_BACKEND=memory.")
+        from core.memory_store import seed_demo_data
+        # ~62 dias úteis x 165 = ~10k agendamentos no salão demo-1
+        seed_demo_data(core_db.db, saloes=1, clientes_por_salao=args.clientes,
+                       agendamentos_por_dia=args.agendamentos_por_dia, dias=36)
+        salao_id = "demo-1"
+    if not salao_id:
+        raise SystemExit("Informe --salao-id ou --seed.")
+
+    total = len(agendamentos.list(salao_id, fields=('startTime',)))
+    print(f"Salão {salao_id}: {total} agendamentos (mediana de {args.repeat} execuções)")
+    print(f"{'consulta':32} {'docs':>6} {'antes ms':>9} {'depois ms':>10} {'antes KB':>9} {'depois KB':>10}")
+    for label, fields, run in _cases(salao_id):
+        full_ms, count, full_bytes = _measure(lambda: run(None), args.repeat)
+        proj_ms, _, proj_bytes = _measure(lambda: run(fields), args.repeat)
+        print(f"{label:32} {count:>6} {full_ms:>9.1f} {proj_ms:>10.1f} {full_bytes / 1024:>9.1f} {proj_bytes / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Antes/depois das projeções nas consultas do painel")
+    parser.add_argument("--salao-id", default=None)
+    parser.add_argument("--seed", action="store_true", help="Gera o salão demo-1 no store em memória")
+    parser.add_argument("--agendamentos-por-dia", type=int, default=165)
+    parser.add_argument("--clientes", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,59 @@
+# backend/core/async_db.py
+# Acesso assíncrono ao Firestore (AsyncClient) para as rotas 'async def'.
+# As leituras/escritas são aguardadas com 'await' e não travam o event loop do
+# worker: enquanto uma consulta lenta espera a rede, as outras requisições seguem.
+# O que só existe em versão síncrona (cache do salão, validação de horário, SDK
+# do Mercado Pago, e-mails, Google) roda no threadpool via run_blocking.
+# core.auth e o scheduler.py continuam no cliente síncrono (core.db.db).
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional, TypeVar
+
+import firebase_admin
+from firebase_admin import firestore_async
+from starlette.concurrency import run_in_threadpool
+
+from core import db as core_db  # Garante a inicialização do Firebase antes do cliente async
+
+T = TypeVar("T")
+
+try:
+    if core_db.DATA_BACKEND == "memory":
+        from core.memory_store import AsyncMemoryClient
+        async_db = AsyncMemoryClient(core_db.db)
+    else:
+        async_db = firestore_async.client() if firebase_admin._apps else None
+except Exception as e:
+    logging.error(f"Falha ao inicializar o cliente assíncrono do Firestore: {e}")
+    async_db = None
+
+
+def salon_ref(salao_id: str):
+    """Referência assíncrona do documento do salão."""
+    if async_db is None:
+        raise RuntimeError("Cliente assíncrono do Firestore não inicializado.")
+    return async_db.collection('cabeleireiros').document(salao_id)
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Executa uma função síncrona (bloqueante) no threadpool sem travar o event loop."""
+    return await run_in_threadpool(func, *args, **kwargs)
+
+
+async def gather_queries(*queries) -> List[List[Any]]:
+    """Dispara as consultas assíncronas juntas e devolve os snapshots na mesma ordem."""
+    return list(await asyncio.gather(*(query.get() for query in queries)))
+
+
+def aggregation_value(results, alias: str, default: Any = 0) -> Any:
+    """Valor de uma agregação (count/sum) pelo alias no resultado de AggregationQuery.get()."""
+    for row in results:
+        for result in row:
+            if result.alias == alias:
+                return result.value if result.value is not None else default
+    return default
+
+
+async def get_salon_data(salao_id: str) -> Optional[dict]:
+    """Dados do salão (cache + Firestore síncrono) sem bloquear o event loop."""
+    return await run_blocking(core_db.get_hairdresser_data_from_db, salao_id)
@@ -1,12 +1,17 @@
 # backend/core/auth.py
+import hashlib
 import logging
+import os
+import time
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
 from firebase_admin import auth, firestore
-from google.cloud.firestore import FieldFilter
 
 # --- <<< NOVOS IMPORTS >>> ---
-from core.db import db # Importa a instância do DB
+from core.db import DATA_BACKEND
+from core.repositories import salons
+from core.cache import StatsTTLCache
 import pytz
 from datetime import datetime
 # --- <<< FIM DOS NOVOS IMPORTS >>> ---
@@ -15,6 +20,96 @@ from datetime import datetime
 # Define o esquema de autenticação.
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
+# Só no backend em memória (benchmark local): token "demo:<uid>" dispensa o Firebase Auth
+DEMO_TOKEN_PREFIX = "demo:"
+
+# --- Cache uid do dono -> salao_id ---
+# O vínculo quase nunca muda: resolvido uma vez por TTL em vez de uma consulta
+# 'ownerUID ==' por requisição (get_current_user + cada rota do painel).
+# Só resultados positivos entram: um cadastro recém-concluído vale na hora.
+OWNER_SALON_CACHE_TTL_SECONDS = int(os.environ.get("OWNER_SALON_CACHE_TTL_SECONDS", 600))
+OWNER_SALON_CACHE_MAXSIZE = int(os.environ.get("OWNER_SALON_CACHE_MAXSIZE", 4096))
+
+_owner_salon_cache = StatsTTLCache(
+    name="owner_salon",
+    maxsize=OWNER_SALON_CACHE_MAXSIZE,
+    ttl=OWNER_SALON_CACHE_TTL_SECONDS,
+)
+
+
+def resolve_salon_id(owner_uid: str):
+    """salao_id do dono (cache LRU+TTL, depois Firestore). None se não há salão."""
+    salao_id = _owner_salon_cache.get(owner_uid)
+    if salao_id is None:
+        salao_id = salons.find_id_by_owner(owner_uid)
+        if salao_id:
+            _owner_salon_cache.set(owner_uid, salao_id)
+    return salao_id
+
+
+def forget_owner_salon(owner_uid: str) -> None:
+    """Descarta o vínculo em cache (ex: rollback que exclui o salão do dono)."""
+    _owner_salon_cache.pop(owner_uid)
+
+
+# --- Cache de tokens verificados ---
+# O painel dispara 5-10 chamadas em paralelo por tela com o mesmo ID token: a
+# verificação (assinatura RSA + claims) roda uma vez e o resultado vale até o 'exp'.
+# Chave = SHA-256 do token (o token em si não fica em memória). Os certificados
+# públicos do Google já são cacheados pelo firebase_admin conforme o max-age.
+VERIFIED_TOKEN_CACHE_MAXSIZE = int(os.environ.get("VERIFIED_TOKEN_CACHE_MAXSIZE", 2048))
+# Teto do TTL = vida máxima de um ID token do Firebase (1h); o 'exp' é conferido a cada hit
+VERIFIED_TOKEN_CACHE_TTL_SECONDS = int(os.environ.get("VERIFIED_TOKEN_CACHE_TTL_SECONDS", 3600))
+
+_verified_tokens = StatsTTLCache(
+    name="verified_tokens",
+    maxsize=VERIFIED_TOKEN_CACHE_MAXSIZE,
+    ttl=VERIFIED_TOKEN_CACHE_TTL_SECONDS,
+)
+
+
+def _verify_id_token_cached(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).hexdigest()
+    claims = _verified_tokens.get(key)
+    if claims is not None:
+        if claims.get("exp", 0) > time.time():
+            return dict(claims)
+        _verified_tokens.pop(key)  # Expirado: o verify_id_token abaixo levanta ExpiredIdTokenError
+    claims = auth.verify_id_token(token)
+    _verified_tokens.set(key, claims)
+    return dict(claims)
+
+
+def _decode_token(token: str) -> dict:
+    if DATA_BACKEND == "memory" and token.startswith(DEMO_TOKEN_PREFIX):
+        uid = token[len(DEMO_TOKEN_PREFIX):]
+        return {"uid": uid, "email": f"{uid}@demo.horalis.app"}
+    return _verify_id_token_cached(token)
+
+
+def _verify_token_and_salon(token: str) -> dict:
+    """
+    Fachada síncrona: valida o token no Firebase Auth e confere se o dono tem salão.
+    Usa o cliente síncrono do Firestore; a dependência async chama via threadpool.
+    O salao_id resolvido vai junto no token decodificado (chave 'salao_id').
+    """
+    # --- Passo 1: Verificar o Token do Firebase Auth ---
+    decoded_token = _decode_token(token)
+    user_uid = decoded_token.get("uid")
+    
+    # --- Passo 2: Verificar existência básica no Firestore ---
+    # Isso ainda é útil para garantir que o cadastro foi finalizado
+    salao_id = resolve_salon_id(user_uid)
+    if not salao_id:
+        logging.warning(f"Usuário autenticado (UID: {user_uid}) mas sem documento de salão.")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, 
+            detail="Cadastro incompleto. Salão não encontrado."
+        )
+    decoded_token["salao_id"] = salao_id
+    return decoded_token
+
+
 async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)):
     """
     Dependência FastAPI para verificar o token Firebase ID.
@@ -36,21 +131,8 @@ async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)
          raise credentials_exception
 
     try:
-        # --- Passo 1: Verificar o Token do Firebase Auth ---
-        decoded_token = auth.verify_id_token(token)
-        user_uid = decoded_token.get("uid")
-        
-        # --- Passo 2: Verificar existência básica no Firestore ---
-        # Isso ainda é útil para garantir que o cadastro foi finalizado
-        query = db.collection('cabeleireiros').where(filter=FieldFilter('ownerUID', '==', user_uid)).limit(1)
-        docs = list(query.stream())
-
-        if not docs:
-            logging.warning(f"Usuário autenticado (UID: {user_uid}) mas sem documento de salão.")
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN, 
-                detail="Cadastro incompleto. Salão não encontrado."
-            )
+        # Verificação do token + consulta do salão fora do event loop
+        decoded_token = await run_in_threadpool(_verify_token_and_salon, token)
 
         # 🌟 LÓGICA RELAXADA:
         # Não verificamos mais 'subscriptionStatus' ou 'trialEndsAt' aqui para bloquear a requisição.
@@ -66,4 +148,14 @@ async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)
         raise e
     except Exception as e:
         logging.error(f"Erro na verificação de token: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro interno de autenticação")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro interno de autenticação")
+
+
+async def get_current_salao_id(current_user: dict = Depends(get_current_user)) -> str:
+    """
+    Dependência FastAPI: salao_id do dono autenticado, já resolvido por get_current_user
+    (o FastAPI reaproveita a mesma chamada na requisição; nenhuma consulta extra).
+    """
+    if not current_user or not current_user.get("salao_id"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Salão não encontrado")
+    return current_user["salao_id"]
@@ -0,0 +1,167 @@
+# backend/core/cache.py
+# Cache em memória (por processo) com TTL, limite de tamanho e contadores.
+# Cada instância se registra pelo nome; as métricas de todos os caches do processo
+# vão para o log periodicamente (start_stats_logger, iniciado no main.py). Não há rota
+# HTTP: os contadores são do processo inteiro (todos os salões).
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from cachetools import TTLCache
+
+CACHE_STATS_LOG_SECONDS = int(os.environ.get("CACHE_STATS_LOG_SECONDS", 300))  # 0 desliga
+
+_MISSING = object()
+_REGISTRY: Dict[str, Any] = {}
+_stats_logger: Optional[threading.Thread] = None
+_stop_stats = threading.Event()
+
+
+class _EvictingTTLCache(TTLCache):
+    """TTLCache que anota os itens expirados/removidos por tamanho (para o callback on_evict)."""
+
+    def __init__(self, maxsize: int, ttl: float, evicted: List[Tuple[Hashable, Any]]):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self._evicted = evicted
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self._evicted.extend(expired)
+        return expired
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._evicted.append((key, value))
+        return key, value
+
+
+class StatsTTLCache:
+    """
+    TTLCache (cachetools) thread-safe com contadores de hit/miss/invalidação.
+    Com on_evict, toda saída de item (TTL, tamanho ou invalidação) chama
+    on_evict(key, value) FORA do lock (ex: para liberar recursos do item).
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float,
+                 on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._on_evict = on_evict
+        self._evicted: List[Tuple[Hashable, Any]] = []
+        if on_evict:
+            self._cache = _EvictingTTLCache(maxsize, ttl, self._evicted)
+        else:
+            self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        _REGISTRY[name] = self
+
+    def _drain_evicted(self) -> None:
+        if not self._on_evict:
+            return
+        with self._lock:
+            evicted, self._evicted[:] = list(self._evicted), []
+        for key, value in evicted:
+            self._on_evict(key, value)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._cache.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            previous = self._cache.pop(key, _MISSING) if self._on_evict else _MISSING
+            if previous is not _MISSING:
+                self._evicted.append((key, previous))
+            self._cache[key] = value
+        self._drain_evicted()
+
+    def pop(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._cache.pop(key, None)
+            if value is not None:
+                self.invalidations += 1
+                if self._on_evict:
+                    self._evicted.append((key, value))
+        self._drain_evicted()
+        return value
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Remove todas as chaves que satisfazem o predicado. Retorna quantas saíram."""
+        with self._lock:
+            keys = [key for key in list(self._cache.keys()) if predicate(key)]
+            for key in keys:
+                value = self._cache.pop(key, _MISSING)
+                if self._on_evict and value is not _MISSING:
+                    self._evicted.append((key, value))
+            self.invalidations += len(keys)
+        self._drain_evicted()
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._cache)
+            self._cache.clear()  # no _EvictingTTLCache, clear() passa por popitem()
+        self._drain_evicted()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+def register_stats_source(name: str, source: Any) -> None:
+    """Registra outra estrutura com método stats() (ex: pools) junto das métricas dos caches."""
+    _REGISTRY[name] = source
+
+
+def get_all_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Métricas de todos os caches registrados no processo."""
+    return {name: cache.stats() for name, cache in _REGISTRY.items()}
+
+
+def log_cache_stats() -> None:
+    logging.info(f"[Cache] Métricas (pid {os.getpid()}): {json.dumps(get_all_cache_stats(), sort_keys=True, default=str)}")
+
+
+def _stats_loop() -> None:
+    while not _stop_stats.wait(CACHE_STATS_LOG_SECONDS):
+        try:
+            log_cache_stats()
+        except Exception as e:
+            logging.error(f"[Cache] Falha ao registrar métricas: {e}")
+
+
+def start_stats_logger() -> None:
+    global _stats_logger
+    if _stats_logger is not None or CACHE_STATS_LOG_SECONDS <= 0:
+        return
+    _stop_stats.clear()
+    _stats_logger = threading.Thread(target=_stats_loop, name="cache-stats", daemon=True)
+    _stats_logger.start()
+
+
+def stop_stats_logger() -> None:
+    global _stats_logger
+    _stop_stats.set()
+    if _stats_logger is not None:
+        log_cache_stats()  # Último retrato antes de o processo sair
+    _stats_logger = None
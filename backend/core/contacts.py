@@ -0,0 +1,57 @@
+# backend/core/contacts.py
+# Normalização de contatos do CRM (telefone/e-mail) e chaves do índice de contatos
+# (cabeleireiros/{id}/contatos_index/{chave} -> clienteId, ver core/repositories.py).
+# O histórico tem telefones em vários formatos ('(11) 99999-0000', '+55 11 9...',
+# '011...'): todos viram só dígitos com DDD, sem o 55 do país e sem o 0 de longa distância.
+import re
+from typing import List, Optional
+from urllib.parse import quote
+
+COUNTRY_CODE = '55'
+PHONE_KEY_PREFIX = 'tel:'
+EMAIL_KEY_PREFIX = 'email:'
+_EMPTY_EMAILS = ('', 'n/a', 'na', '-')
+
+
+def normalize_phone(phone: Optional[str]) -> str:
+    """Só dígitos, formato nacional com DDD (10 ou 11 dígitos quando o número é válido)."""
+    if not phone:
+        return ""
+    digits = re.sub(r'\D', '', str(phone))
+    if len(digits) in (12, 13) and digits.startswith(COUNTRY_CODE):
+        digits = digits[len(COUNTRY_CODE):]
+    elif len(digits) in (11, 12) and digits.startswith('0'):
+        digits = digits[1:]
+    return digits
+
+
+def phone_variants(phone: Optional[str]) -> List[str]:
+    """
+    Formas em que o mesmo telefone pode estar gravado: a canônica e as antigas só com
+    dígitos (com o 55, ou com o 0). Para consultas 'in' antes do backfill do índice.
+    """
+    canonical = normalize_phone(phone)
+    if not canonical:
+        return []
+    legacy = re.sub(r'\D', '', str(phone))
+    return list(dict.fromkeys([canonical, legacy, f"{COUNTRY_CODE}{canonical}", f"0{canonical}"]))
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    if not email:
+        return None
+    email = str(email).strip().lower()
+    return None if email in _EMPTY_EMAILS else email
+
+
+def contact_keys(phone: Optional[str], email: Optional[str]) -> List[str]:
+    """Chaves do índice em ordem de prioridade (telefone antes do e-mail)."""
+    keys = []
+    phone = normalize_phone(phone)
+    if phone:
+        keys.append(f"{PHONE_KEY_PREFIX}{phone}")
+    email = normalize_email(email)
+    if email:
+        # '/' não pode aparecer no id do documento
+        keys.append(f"{EMAIL_KEY_PREFIX}{quote(email, safe='@+')}")
+    return keys
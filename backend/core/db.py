@@ -1,8 +1,16 @@
 # backend/core/db.py
+import hashlib
 import logging
 import firebase_admin
 from firebase_admin import credentials, firestore
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable, List, Tuple
+from core.cache import StatsTTLCache, register_stats_source
+from core.schedule import SCHEDULE_BOOK_KEY, ScheduleBook
 
 # --- Importação Relativa Corrigida ---
 # Importa os modelos Pydantic do arquivo 'models.py' que está NA MESMA PASTA (core)
@@ -11,61 +19,335 @@ import os
 # from .models import ClientDetail, Service 
 # --- Fim da Correção ---
 
-try:
-    if not firebase_admin._apps:
-        # Tenta encontrar a credencial
-        cred_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS", "credentials.json")
+# --- Backend de Dados ---
+# HORALIS_DATA_BACKEND=memory troca o Firestore por um store em memória (mesma
+# interface), para rodar a API e medir vazão/latência sem um projeto Firebase.
+# HORALIS_MEMORY_FIXTURE (JSON) e HORALIS_MEMORY_DEMO_SALOES (salões sintéticos)
+# populam o store na inicialização.
+DATA_BACKEND = os.environ.get("HORALIS_DATA_BACKEND", "firestore").strip().lower()
+
+
+def _init_memory_backend():
+    from core.memory_store import MemoryClient, load_fixture, seed_demo_data
+
+    client = MemoryClient()
+    fixture_path = os.environ.get("HORALIS_MEMORY_FIXTURE")
+    if fixture_path:
+        count = load_fixture(client, fixture_path)
+        logging.info(f"Backend em memória: {count} documentos carregados de {fixture_path}")
+    demo_saloes = int(os.environ.get("HORALIS_MEMORY_DEMO_SALOES", 0))
+    if demo_saloes:
+        seed_demo_data(client, saloes=demo_saloes)
+    logging.warning("HORALIS_DATA_BACKEND=memory: usando o store em memória (dados NÃO persistem).")
+    return client
+
+
+if DATA_BACKEND == "memory":
+    db = _init_memory_backend()
+else:
+    try:
+        if not firebase_admin._apps:
+            # Tenta encontrar a credencial
+            cred_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS", "credentials.json")
         
-        # Verificação do caminho (baseado no Root Directory do Render ser 'backend')
-        if not os.path.exists(cred_path):
-            logging.warning(f"Credencial não encontrada em '{cred_path}', tentando 'backend/credentials.json'")
-            cred_path_backend = "backend/credentials.json"
-            if os.path.exists(cred_path_backend):
-                 cred_path = cred_path_backend
-            else:
-                 logging.warning(f"Credencial não encontrada em '{cred_path_backend}'. Usando 'credentials.json' como padrão.")
-                 cred_path = "credentials.json" # Tenta o caminho simples
-
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-        logging.info(f"Firebase Admin SDK inicializado (a partir do db.py) com: {cred_path}")
+            # Verificação do caminho (baseado no Root Directory do Render ser 'backend')
+            if not os.path.exists(cred_path):
+                logging.warning(f"Credencial não encontrada em '{cred_path}', tentando 'backend/credentials.json'")
+                cred_path_backend = "backend/credentials.json"
+                if os.path.exists(cred_path_backend):
+                     cred_path = cred_path_backend
+                else:
+                     logging.warning(f"Credencial não encontrada em '{cred_path_backend}'. Usando 'credentials.json' como padrão.")
+                     cred_path = "credentials.json" # Tenta o caminho simples
+
+            cred = credentials.Certificate(cred_path)
+            firebase_admin.initialize_app(cred)
+            logging.info(f"Firebase Admin SDK inicializado (a partir do db.py) com: {cred_path}")
     
-    db = firestore.client() # Define a variável db global
-except Exception as e:
-    logging.error(f"Falha CRÍTICA ao inicializar Firebase no db.py: {e}")
-    db = None # Define db como None se a inicialização falhar
+        db = firestore.client() # Define a variável db global
+    except Exception as e:
+        logging.error(f"Falha CRÍTICA ao inicializar Firebase no db.py: {e}")
+        db = None # Define db como None se a inicialização falhar
 # --- Fim da Inicialização ---
 
 
+# --- Leituras em Paralelo ---
+# Leituras independentes (ex: salão + serviços + equipe) disparadas juntas: a
+# latência passa a ser a da leitura mais lenta, não a soma das três.
+DB_PARALLEL_WORKERS = int(os.environ.get("DB_PARALLEL_WORKERS", 8))
+_PARALLEL_THREAD_PREFIX = "db-parallel"
+_parallel_executor = ThreadPoolExecutor(max_workers=DB_PARALLEL_WORKERS, thread_name_prefix=_PARALLEL_THREAD_PREFIX)
+
+
+def run_parallel(*calls: Callable[[], Any]) -> List[Any]:
+    """
+    Executa as funções (sem argumentos) em paralelo e devolve os resultados na mesma ordem.
+    A primeira roda na própria thread; se alguma falhar, a exceção é relançada.
+    Chamadas aninhadas (de dentro do pool) rodam em sequência para não esgotar o pool.
+    """
+    if len(calls) <= 1 or threading.current_thread().name.startswith(_PARALLEL_THREAD_PREFIX):
+        return [call() for call in calls]
+    futures = [_parallel_executor.submit(call) for call in calls[1:]]
+    first = calls[0]()
+    return [first] + [future.result() for future in futures]
+
+
+# --- Cache dos Dados do Salão ---
+# get_hairdresser_data_from_db é o caminho mais chamado do Firestore (slots,
+# agendamentos, cancelamentos, webhook). O dicionário montado (salão + serviços
+# + agenda compilada) fica em cache por processo; listeners on_snapshot no
+# documento do salão e nas subcoleções 'servicos' e 'profissionais' invalidam a
+# entrada (e os caches derivados: página/perfil públicos, disponibilidade) quando
+# algo muda (inclusive em outro worker). Com listener ativo a entrada (e os listeners)
+# vive SALON_CACHE_LISTENER_TTL_SECONDS: expirar antes obrigaria a reler salão +
+# serviços e a registrar os listeners de novo (cujo primeiro snapshot relê tudo).
+# SALON_CACHE_TTL_SECONDS vale só sem listener (desligado ou falha ao registrar).
+SALON_CACHE_TTL_SECONDS = int(os.environ.get("SALON_CACHE_TTL_SECONDS", 300))
+SALON_CACHE_LISTENER_TTL_SECONDS = int(os.environ.get("SALON_CACHE_LISTENER_TTL_SECONDS", 3600))
+SALON_CACHE_MAXSIZE = int(os.environ.get("SALON_CACHE_MAXSIZE", 256))
+SALON_CACHE_LISTENERS = os.environ.get("SALON_CACHE_LISTENERS", "1") != "0"
+
+
+class _SalonCacheEntry:
+    def __init__(self, data: dict, salon_update_time, services_versions: dict):
+        self.data = data
+        self.salon_update_time = salon_update_time
+        self.services_versions = services_versions
+        self.loaded_at = time.monotonic()
+        self.watches = []
+        self.seen_salon = False
+        self.seen_services = False
+        self.seen_team = False
+
+
+class _SalonCacheMetrics:
+    """Idade dos dados servidos do cache e atraso listener → invalidação."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.served = 0
+        self.served_age_total = 0.0
+        self.served_age_max = 0.0
+        self.listener_invalidations = 0
+        self.listener_lag_total = 0.0
+        self.listener_lag_max = 0.0
+        self.stale_on_attach = 0
+        self.active_listeners = 0
+
+    def record_hit(self, age: float) -> None:
+        with self._lock:
+            self.served += 1
+            self.served_age_total += age
+            self.served_age_max = max(self.served_age_max, age)
+
+    def record_listener_invalidation(self, lag: float, on_attach: bool) -> None:
+        with self._lock:
+            self.listener_invalidations += 1
+            self.listener_lag_total += lag
+            self.listener_lag_max = max(self.listener_lag_max, lag)
+            if on_attach:
+                self.stale_on_attach += 1
+
+    def add_listeners(self, count: int) -> None:
+        with self._lock:
+            self.active_listeners += count
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "served_from_cache": self.served,
+                "avg_served_age_seconds": round(self.served_age_total / self.served, 3) if self.served else 0.0,
+                "max_served_age_seconds": round(self.served_age_max, 3),
+                "listener_invalidations": self.listener_invalidations,
+                "avg_listener_lag_seconds": round(self.listener_lag_total / self.listener_invalidations, 3) if self.listener_invalidations else 0.0,
+                "max_listener_lag_seconds": round(self.listener_lag_max, 3),
+                "stale_on_attach": self.stale_on_attach,
+                "active_listeners": self.active_listeners,
+            }
+
+
+_salon_metrics = _SalonCacheMetrics()
+# Cancelar um listener de dentro do próprio callback trava a thread do watch: roda à parte
+_listener_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="salon-cache-unsub")
+
+
+def _unsubscribe(entry: _SalonCacheEntry) -> None:
+    watches, entry.watches = entry.watches, []
+    for watch in watches:
+        try:
+            watch.unsubscribe()
+        except Exception as e:
+            logging.warning(f"Falha ao cancelar listener do cache de salão: {e}")
+    if watches:
+        _salon_metrics.add_listeners(-len(watches))
+
+
+def _on_salon_entry_evicted(salao_id: str, entry: _SalonCacheEntry) -> None:
+    if entry.watches:
+        _listener_executor.submit(_unsubscribe, entry)
+
+
+_salon_cache = StatsTTLCache(
+    name="salon_data",
+    maxsize=SALON_CACHE_MAXSIZE,
+    ttl=SALON_CACHE_LISTENER_TTL_SECONDS if SALON_CACHE_LISTENERS else SALON_CACHE_TTL_SECONDS,
+    on_evict=_on_salon_entry_evicted,
+)
+register_stats_source("salon_data_freshness", _salon_metrics)
+
+# Versão do conteúdo (salão + serviços) guardada junto dos dados, para ETags
+SALON_VERSION_KEY = '_content_version'
+
+# Caches derivados dos dados do salão (ex: página e perfil públicos) se inscrevem aqui.
+# Rodam nas escritas deste processo (invalidate_salon_cache) e nas vistas pelo listener.
+_invalidation_hooks: List[Callable[[str], None]] = []
+
+
+def version_digest(versions: Iterable[Tuple[str, Any]]) -> str:
+    """Hash curto e estável de pares (id, update_time)."""
+    digest = hashlib.sha1()
+    for key, update_time in versions:
+        stamp = update_time.isoformat() if hasattr(update_time, 'isoformat') else str(update_time)
+        digest.update(f"{key}={stamp};".encode())
+    return digest.hexdigest()[:16]
+
+
+def on_salon_invalidated(hook: Callable[[str], None]) -> None:
+    """Registra um callback chamado com o salao_id sempre que o cache do salão é invalidado."""
+    _invalidation_hooks.append(hook)
+
+
+def _run_invalidation_hooks(salao_id: str) -> None:
+    for hook in _invalidation_hooks:
+        try:
+            hook(salao_id)
+        except Exception as e:
+            logging.warning(f"Falha em hook de invalidação do salão {salao_id}: {e}")
+
+
+def _invalidate_from_listener(salao_id: str, changed_at, on_attach: bool = False, keep_entry: bool = False) -> None:
+    """keep_entry: a mudança não está nos dados em cache (equipe), só os caches derivados caem."""
+    lag = 0.0
+    if changed_at is not None:
+        lag = max((datetime.now(timezone.utc) - changed_at).total_seconds(), 0.0)
+    _salon_metrics.record_listener_invalidation(lag, on_attach)
+    if not keep_entry:
+        _salon_cache.invalidate_where(lambda key: key == salao_id)
+    _run_invalidation_hooks(salao_id)
+    logging.info(f"Cache do salão {salao_id} invalidado pelo listener (atraso {lag:.2f}s).")
+
+
+def _attach_listeners(salao_id: str, entry: _SalonCacheEntry) -> None:
+    """
+    Um listener no documento, um em 'servicos' e um em 'profissionais'. O primeiro
+    snapshot de salão/serviços é o estado atual: só invalida se já for diferente do
+    que foi lido (mudança entre a leitura e o registro do listener). A equipe não faz
+    parte dos dados em cache: o primeiro snapshot dela é ignorado e as mudanças
+    seguintes só disparam os hooks (página/perfil públicos, disponibilidade).
+    """
+    doc_ref = db.collection('cabeleireiros').document(salao_id)
+
+    def on_salon_snapshot(snapshots, changes, read_time):
+        snapshot = snapshots[0] if snapshots else None
+        update_time = snapshot.update_time if snapshot is not None and snapshot.exists else None
+        if not entry.seen_salon:
+            entry.seen_salon = True
+            if update_time == entry.salon_update_time: return
+            _invalidate_from_listener(salao_id, update_time or read_time, on_attach=True)
+            return
+        _invalidate_from_listener(salao_id, update_time or read_time)
+
+    def on_services_snapshot(snapshots, changes, read_time):
+        if not entry.seen_services:
+            entry.seen_services = True
+            if {doc.id: doc.update_time for doc in snapshots} == entry.services_versions: return
+            _invalidate_from_listener(salao_id, read_time, on_attach=True)
+            return
+        update_times = [change.document.update_time for change in changes if change.document.update_time]
+        _invalidate_from_listener(salao_id, max(update_times) if update_times else read_time)
+
+    def on_team_snapshot(snapshots, changes, read_time):
+        if not entry.seen_team:
+            entry.seen_team = True
+            return
+        update_times = [change.document.update_time for change in changes if change.document.update_time]
+        _invalidate_from_listener(salao_id, max(update_times) if update_times else read_time, keep_entry=True)
+
+    try:
+        entry.watches.append(doc_ref.on_snapshot(on_salon_snapshot))
+        entry.watches.append(doc_ref.collection('servicos').on_snapshot(on_services_snapshot))
+        entry.watches.append(doc_ref.collection('profissionais').on_snapshot(on_team_snapshot))
+    except Exception as e:
+        logging.warning(f"Listener do cache de salão indisponível para {salao_id} (só TTL): {e}")
+    if entry.watches:
+        _salon_metrics.add_listeners(len(entry.watches))
+
+
+def invalidate_salon_cache(salao_id: str) -> None:
+    """Invalidação explícita (escritas feitas por este processo)."""
+    _salon_cache.invalidate_where(lambda key: key == salao_id)
+    _run_invalidation_hooks(salao_id)
+
+
 # --- Funções DB ---
+def _load_hairdresser_data(salao_id: str):
+    """Lê salão + serviços do Firestore. Retorna (dados, update_time do salão, versões dos serviços) ou None."""
+    doc_ref = db.collection('cabeleireiros').document(salao_id)
+    services_ref = doc_ref.collection('servicos')
+
+    # 1/2. Documento do salão e subcoleção de serviços em paralelo
+    hairdresser_doc, services_docs = run_parallel(
+        doc_ref.get,
+        lambda: list(services_ref.stream()),
+    )
+    if not hairdresser_doc.exists: 
+        logging.warning(f"Salão não encontrado no Firestore: {salao_id}")
+        return None
+    
+    # Pega o dicionário COMPLETO (com token, sync_enabled, etc.)
+    hairdresser_data = hairdresser_doc.to_dict()
+    services_dict_with_ids = {doc.id: doc.to_dict() for doc in services_docs} # Guarda ID e dados
+    
+    # 3. Adiciona os serviços ao dicionário COMPLETO
+    hairdresser_data['servicos_data'] = services_dict_with_ids
+
+    # 3.1 Compila os horários uma única vez (slots, almoço, validações)
+    hairdresser_data[SCHEDULE_BOOK_KEY] = ScheduleBook(hairdresser_data.get('horario_trabalho_detalhado'))
+
+    services_versions = {doc.id: doc.update_time for doc in services_docs}
+    hairdresser_data[SALON_VERSION_KEY] = version_digest(
+        [("salon", hairdresser_doc.update_time)] + sorted(services_versions.items())
+    )
+    return hairdresser_data, hairdresser_doc.update_time, services_versions
+
 def get_hairdresser_data_from_db(salao_id: str):
     """Busca dados completos do salão (horários, ID calendário, serviços, cores, etc.)."""
     if db is None:
         logging.error("Firestore DB não está inicializado. get_hairdresser_data_from_db falhou.")
         return None
+
+    # 0. Cache (cópia rasa: as rotas alteram chaves do topo, ex: 'telefone')
+    entry = _salon_cache.get(salao_id)
+    if entry is not None:
+        age = time.monotonic() - entry.loaded_at
+        if entry.watches or age <= SALON_CACHE_TTL_SECONDS:
+            _salon_metrics.record_hit(age)
+            return dict(entry.data)
+        _salon_cache.pop(salao_id)  # Sem listener: vale o TTL curto
+
     try:
-        doc_ref = db.collection('cabeleireiros').document(salao_id)
-        hairdresser_doc = doc_ref.get()
-        if not hairdresser_doc.exists: 
-            logging.warning(f"Salão não encontrado no Firestore: {salao_id}")
+        loaded = _load_hairdresser_data(salao_id)
+        if loaded is None:
             return None
-        
-        # 1. Pega o dicionário COMPLETO (com token, sync_enabled, etc.)
-        hairdresser_data = hairdresser_doc.to_dict()
-        
-        # 2. Busca os serviços da subcoleção
-        services_ref = doc_ref.collection('servicos')
-        services_stream = services_ref.stream()
-        services_dict_with_ids = {doc.id: doc.to_dict() for doc in services_stream} # Guarda ID e dados
-        
-        # --- CORREÇÃO DA SINCRONIZAÇÃO (Bug do 'None') ---
-        
-        # 3. Adiciona os serviços ao dicionário COMPLETO
-        hairdresser_data['servicos_data'] = services_dict_with_ids
-        
+        hairdresser_data, salon_update_time, services_versions = loaded
+
+        entry = _SalonCacheEntry(hairdresser_data, salon_update_time, services_versions)
+        if SALON_CACHE_LISTENERS:
+            _attach_listeners(salao_id, entry)
+        _salon_cache.set(salao_id, entry)
+
         # 4. Retorna o dicionário COMPLETO
-        return hairdresser_data
-        # --- FIM DA CORREÇÃO ---
+        return dict(hairdresser_data)
 
     except Exception as e: 
         logging.error(f"Erro ao buscar dados Firestore para {salao_id}: {e}")
@@ -0,0 +1,959 @@
+# backend/core/memory_store.py
+# Backend em memória com a mesma interface do cliente do Firestore usada no
+# projeto (collection/document/where/order_by/limit/stream/get/set/update/delete,
+# collection_group, get_all, batch, transaction, on_snapshot, agregações
+# count/sum/avg e os sentinelas SERVER_TIMESTAMP, DELETE_FIELD, Increment,
+# ArrayUnion/ArrayRemove).
+# Ativado com HORALIS_DATA_BACKEND=memory: a API e o scheduler rodam sem um
+# projeto Firebase, o que permite medir vazão e latência localmente.
+# Não é um emulador completo: cobre os filtros de igualdade/intervalo que o
+# código usa e a ordenação padrão do Firestore (campo da desigualdade, depois id).
+import asyncio
+import copy
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from google.api_core import exceptions as gapi_exceptions
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.aggregation import AggregationResult
+
+from .contacts import contact_keys
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+_RANGE_OPS = ('<', '<=', '>', '>=')
+_AUTO_ID_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _auto_id() -> str:
+    raw = uuid.uuid4().int
+    chars = []
+    for _ in range(20):
+        raw, index = divmod(raw, len(_AUTO_ID_CHARS))
+        chars.append(_AUTO_ID_CHARS[index])
+    return "".join(chars)
+
+
+# ----------------------------------------------------------------------
+# Valores: normalização, comparação e ordenação no estilo do Firestore
+# ----------------------------------------------------------------------
+
+def _normalize(value: Any) -> Any:
+    """Datetimes viram UTC com fuso (como o Firestore devolve); o resto é copiado."""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def _type_rank(value: Any) -> int:
+    # Ordem de tipos do Firestore: null < bool < número < timestamp < string < bytes < array < map
+    if value is None: return 0
+    if isinstance(value, bool): return 1
+    if isinstance(value, (int, float)): return 2
+    if isinstance(value, datetime): return 3
+    if isinstance(value, str): return 4
+    if isinstance(value, bytes): return 5
+    if isinstance(value, list): return 8
+    if isinstance(value, dict): return 9
+    return 10
+
+
+def _sort_key(value: Any):
+    rank = _type_rank(value)
+    if rank in (8, 9, 10):
+        return (rank, repr(value))
+    return (rank, value if value is not None else 0)
+
+
+def _same_type(a: Any, b: Any) -> bool:
+    return _type_rank(a) == _type_rank(b)
+
+
+def _equals(a: Any, b: Any) -> bool:
+    return _same_type(a, b) and a == b
+
+
+_MISSING = object()
+
+
+def _parts(field_path) -> Tuple[str, ...]:
+    # 'a.b' (update/filtros) é caminho aninhado; em set() as chaves são literais (tupla)
+    return tuple(field_path.split('.')) if isinstance(field_path, str) else tuple(field_path)
+
+
+def _get_field(data: Dict[str, Any], field_path) -> Any:
+    current: Any = data
+    for part in _parts(field_path):
+        if not isinstance(current, dict) or part not in current:
+            return _MISSING
+        current = current[part]
+    return current
+
+
+def _op_name(op: Any) -> str:
+    # FieldFilter troca '=='/'!=' contra None por enums (IS_NULL / IS_NOT_NULL)
+    return op if isinstance(op, str) else getattr(op, 'name', str(op))
+
+
+def _matches(data: Dict[str, Any], field_path: str, op: Any, value: Any) -> bool:
+    op = _op_name(op)
+    current = _get_field(data, field_path)
+    if current is _MISSING:
+        return False
+    if op == 'IS_NULL':
+        return current is None
+    if op == 'IS_NOT_NULL':
+        return current is not None
+    if op == 'IS_NAN':
+        return isinstance(current, float) and current != current
+    if op == '==':
+        return _equals(current, value)
+    if op == '!=':
+        return current is not None and not _equals(current, value)
+    if op in _RANGE_OPS:
+        if not _same_type(current, value) or current is None:
+            return False
+        if op == '<': return current < value
+        if op == '<=': return current <= value
+        if op == '>': return current > value
+        return current >= value
+    if op == 'in':
+        return any(_equals(current, item) for item in value)
+    if op == 'not-in':
+        return current is not None and not any(_equals(current, item) for item in value)
+    if op == 'array_contains':
+        return isinstance(current, list) and any(_equals(item, value) for item in current)
+    if op == 'array_contains_any':
+        return isinstance(current, list) and any(_equals(item, wanted) for item in current for wanted in value)
+    raise ValueError(f"Operador não suportado pelo backend em memória: {op}")
+
+
+def _set_field(data: Dict[str, Any], field_path, value: Any) -> None:
+    parts = _parts(field_path)
+    current = data
+    for part in parts[:-1]:
+        nested = current.get(part)
+        if not isinstance(nested, dict):
+            nested = current[part] = {}
+        current = nested
+    current[parts[-1]] = value
+
+
+def _delete_field(data: Dict[str, Any], field_path) -> None:
+    parts = _parts(field_path)
+    current = data
+    for part in parts[:-1]:
+        current = current.get(part)
+        if not isinstance(current, dict):
+            return
+    current.pop(parts[-1], None)
+
+
+def _apply_value(data: Dict[str, Any], field_path, value: Any, now: datetime) -> None:
+    """Grava um campo resolvendo os sentinelas/transformações do Firestore."""
+    if value is transforms.DELETE_FIELD:
+        _delete_field(data, field_path)
+    elif value is transforms.SERVER_TIMESTAMP:
+        _set_field(data, field_path, now)
+    elif isinstance(value, transforms.Increment):
+        current = _get_field(data, field_path)
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        _set_field(data, field_path, base + value.value)
+    elif isinstance(value, transforms.Maximum):
+        current = _get_field(data, field_path)
+        _set_field(data, field_path, value.value if current is _MISSING else max(current, value.value))
+    elif isinstance(value, transforms.Minimum):
+        current = _get_field(data, field_path)
+        _set_field(data, field_path, value.value if current is _MISSING else min(current, value.value))
+    elif isinstance(value, transforms.ArrayUnion):
+        current = _get_field(data, field_path)
+        items = list(current) if isinstance(current, list) else []
+        for item in _normalize(value.values):
+            if not any(_equals(item, existing) for existing in items):
+                items.append(item)
+        _set_field(data, field_path, items)
+    elif isinstance(value, transforms.ArrayRemove):
+        current = _get_field(data, field_path)
+        items = list(current) if isinstance(current, list) else []
+        removed = _normalize(value.values)
+        _set_field(data, field_path, [item for item in items if not any(_equals(item, r) for r in removed)])
+    elif isinstance(value, dict):
+        nested: Dict[str, Any] = {}
+        for key, item in value.items():
+            _apply_value(nested, (key,), item, now)
+        _set_field(data, field_path, nested)
+    else:
+        _set_field(data, field_path, _normalize(value))
+
+
+def _merge_into(data: Dict[str, Any], incoming: Dict[str, Any], now: datetime) -> None:
+    for key, value in incoming.items():
+        if isinstance(value, dict) and isinstance(data.get(key), dict):
+            _merge_into(data[key], value, now)
+        else:
+            _apply_value(data, (key,), value, now)
+
+
+# ----------------------------------------------------------------------
+# Snapshots e referências
+# ----------------------------------------------------------------------
+
+class _Record:
+    __slots__ = ("data", "create_time", "update_time")
+
+    def __init__(self, data: Dict[str, Any], create_time: datetime, update_time: datetime):
+        self.data = data
+        self.create_time = create_time
+        self.update_time = update_time
+
+
+class MemoryDocumentSnapshot:
+    def __init__(self, reference: "MemoryDocumentReference", record: Optional[_Record],
+                 read_time: datetime, field_paths: Optional[List[str]] = None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = record is not None
+        self.create_time = record.create_time if record else None
+        self.update_time = record.update_time if record else None
+        self.read_time = read_time
+        self._data = None
+        if record is not None:
+            if field_paths is None:
+                self._data = copy.deepcopy(record.data)
+            else:
+                self._data = {}
+                for field_path in field_paths:
+                    value = _get_field(record.data, field_path)
+                    if value is not _MISSING:
+                        _set_field(self._data, field_path, copy.deepcopy(value))
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        if self._data is None:
+            return None
+        value = _get_field(self._data, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class _Watch:
+    def __init__(self, client: "MemoryClient", path: str, is_document: bool, callback: Callable):
+        self._client = client
+        self.path = path
+        self.is_document = is_document
+        self.callback = callback
+        self.active = True
+
+    def unsubscribe(self) -> None:
+        self.active = False
+        self._client._remove_watch(self)
+
+
+class _Change:
+    def __init__(self, document: MemoryDocumentSnapshot, change_type: str):
+        self.document = document
+        self.type = change_type
+
+
+class MemoryQuery:
+    def __init__(self, client: "MemoryClient", collection_path: Optional[str], group_id: Optional[str] = None,
+                 filters: Tuple = (), orders: Tuple = (), limit_count: Optional[int] = None,
+                 offset_count: int = 0, projection: Optional[List[str]] = None):
+        self._client = client
+        self._collection_path = collection_path
+        self._group_id = group_id
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit_count
+        self._offset = offset_count
+        self._projection = projection
+
+    def _copy(self, **changes) -> "MemoryQuery":
+        params = dict(
+            filters=self._filters, orders=self._orders, limit_count=self._limit,
+            offset_count=self._offset, projection=self._projection,
+        )
+        params.update(changes)
+        return MemoryQuery(self._client, self._collection_path, self._group_id, **params)
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None,
+              value: Any = None, *, filter=None) -> "MemoryQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        elif value is None and op_string in ('==', '!='):
+            op_string = 'IS_NULL' if op_string == '==' else 'IS_NOT_NULL'
+        return self._copy(filters=self._filters + ((field_path, op_string, _normalize(value)),))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "MemoryQuery":
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int) -> "MemoryQuery":
+        return self._copy(limit_count=count)
+
+    def offset(self, count: int) -> "MemoryQuery":
+        return self._copy(offset_count=count)
+
+    def select(self, field_paths: Iterable[str]) -> "MemoryQuery":
+        return self._copy(projection=list(field_paths))
+
+    def _effective_orders(self) -> List[Tuple[str, str]]:
+        orders = list(self._orders)
+        if not orders:
+            # Sem order_by explícito o Firestore ordena pelo campo da desigualdade
+            for field_path, op, _ in self._filters:
+                if _op_name(op) in _RANGE_OPS + ('!=', 'not-in', 'IS_NOT_NULL'):
+                    orders.append((field_path, ASCENDING))
+                    break
+        return orders
+
+    def count(self, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return MemoryAggregationQuery(self).count(alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return MemoryAggregationQuery(self).sum(field_ref, alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return MemoryAggregationQuery(self).avg(field_ref, alias)
+
+    def _matched(self) -> List[Tuple[str, "_Record"]]:
+        """(caminho, registro) que passam nos filtros, já ordenados/paginados. Chamar com o lock."""
+        client = self._client
+        matched = []
+        for collection_path, documents in client._iter_collections(self._collection_path, self._group_id):
+            for doc_id, record in documents.items():
+                data = record.data
+                if all(_matches(data, f, op, v) for f, op, v in self._filters):
+                    matched.append((f"{collection_path}/{doc_id}", record))
+
+        orders = self._effective_orders()
+        for field_path, _ in orders:
+            matched = [item for item in matched if _get_field(item[1].data, field_path) is not _MISSING]
+        matched.sort(key=lambda item: item[0])
+        for field_path, direction in reversed(orders):
+            matched.sort(
+                key=lambda item: _sort_key(_get_field(item[1].data, field_path)),
+                reverse=(direction == DESCENDING),
+            )
+        if self._offset:
+            matched = matched[self._offset:]
+        if self._limit is not None:
+            matched = matched[:self._limit]
+        return matched
+
+    def _run(self) -> List[MemoryDocumentSnapshot]:
+        client = self._client
+        read_time = _now()
+        with client._lock:
+            return [
+                MemoryDocumentSnapshot(client.document(path), record, read_time, self._projection)
+                for path, record in self._matched()
+            ]
+
+    def stream(self, transaction=None, **kwargs) -> Iterator[MemoryDocumentSnapshot]:
+        return iter(self._run())
+
+    def get(self, transaction=None, **kwargs) -> List[MemoryDocumentSnapshot]:
+        return self._run()
+
+
+class MemoryAggregationQuery:
+    """count()/sum()/avg() sobre uma consulta: calcula no store, sem montar snapshots."""
+
+    def __init__(self, query: MemoryQuery):
+        self._query = query
+        self._aggregations: List[Tuple[str, Optional[str], str]] = []
+
+    def _add(self, kind: str, field_ref: Optional[str], alias: Optional[str]) -> "MemoryAggregationQuery":
+        # Sem alias o Firestore nomeia field_1, field_2, ...
+        self._aggregations.append((kind, field_ref, alias or f"field_{len(self._aggregations) + 1}"))
+        return self
+
+    def count(self, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return self._add("count", None, alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return self._add("sum", field_ref, alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return self._add("avg", field_ref, alias)
+
+    def get(self, transaction=None, **kwargs) -> List[List[AggregationResult]]:
+        read_time = _now()
+        with self._query._client._lock:
+            records = [record for _, record in self._query._matched()]
+            results = []
+            for kind, field_ref, alias in self._aggregations:
+                if kind == "count":
+                    value = len(records)
+                else:
+                    # Como no Firestore: só valores numéricos entram (bool não)
+                    numbers = [
+                        value for value in (_get_field(record.data, field_ref) for record in records)
+                        if isinstance(value, (int, float)) and not isinstance(value, bool)
+                    ]
+                    if kind == "sum":
+                        value = sum(numbers)
+                    else:
+                        value = sum(numbers) / len(numbers) if numbers else None
+                results.append(AggregationResult(alias=alias, value=value, read_time=read_time))
+        return [results]
+
+    def stream(self, transaction=None, **kwargs) -> Iterator[List[AggregationResult]]:
+        return iter(self.get())
+
+
+class MemoryCollectionReference(MemoryQuery):
+    def __init__(self, client: "MemoryClient", path: str):
+        super().__init__(client, path)
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self) -> Optional["MemoryDocumentReference"]:
+        if '/' not in self.path:
+            return None
+        return self._client.document(self.path.rsplit('/', 1)[0])
+
+    def document(self, document_id: Optional[str] = None) -> "MemoryDocumentReference":
+        return MemoryDocumentReference(self._client, f"{self.path}/{document_id or _auto_id()}")
+
+    def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None):
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return ref.get().update_time, ref
+
+    def list_documents(self, page_size: Optional[int] = None) -> Iterator["MemoryDocumentReference"]:
+        with self._client._lock:
+            ids = list(self._client._collections.get(self.path, {}).keys())
+        return iter(self.document(doc_id) for doc_id in ids)
+
+    def on_snapshot(self, callback: Callable) -> _Watch:
+        return self._client._add_watch(self.path, False, callback)
+
+
+class MemoryDocumentReference:
+    def __init__(self, client: "MemoryClient", path: str):
+        self._client = client
+        self.path = path
+        self._collection_path, self.id = path.rsplit('/', 1)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, MemoryDocumentReference) and other.path == self.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+    @property
+    def parent(self) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self._client, self._collection_path)
+
+    def collection(self, collection_id: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def get(self, field_paths: Optional[Iterable[str]] = None, transaction=None, **kwargs) -> MemoryDocumentSnapshot:
+        return self._client._snapshot(self, list(field_paths) if field_paths is not None else None)
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False):
+        return self._client._commit([("set", self, document_data, merge)])
+
+    def create(self, document_data: Dict[str, Any]):
+        return self._client._commit([("create", self, document_data, False)])
+
+    def update(self, field_updates: Dict[str, Any], option=None):
+        return self._client._commit([("update", self, field_updates, False)])
+
+    def delete(self, option=None):
+        return self._client._commit([("delete", self, None, False)])
+
+    def on_snapshot(self, callback: Callable) -> _Watch:
+        return self._client._add_watch(self.path, True, callback)
+
+
+# ----------------------------------------------------------------------
+# Escritas em lote e transações
+# ----------------------------------------------------------------------
+
+class MemoryWriteBatch:
+    def __init__(self, client: "MemoryClient"):
+        self._client = client
+        self._writes: List[Tuple] = []
+
+    def set(self, reference, document_data, merge: bool = False):
+        self._writes.append(("set", reference, document_data, merge))
+        return self
+
+    def create(self, reference, document_data):
+        self._writes.append(("create", reference, document_data, False))
+        return self
+
+    def update(self, reference, field_updates, option=None):
+        self._writes.append(("update", reference, field_updates, False))
+        return self
+
+    def delete(self, reference, option=None):
+        self._writes.append(("delete", reference, None, False))
+        return self
+
+    def commit(self, **kwargs):
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """
+    Transação pessimista: segura o lock do store do _begin ao _commit, então as
+    leituras dentro dela nunca ficam desatualizadas e não há retentativa.
+    Compatível com o decorator @firestore.transactional.
+    """
+    _read_only = False
+    _max_attempts = 1
+
+    def __init__(self, client: "MemoryClient"):
+        super().__init__(client)
+        self._id = None
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _clean_up(self) -> None:
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id=None) -> None:
+        self._client._lock.acquire()
+        self._id = uuid.uuid4().bytes
+
+    def _commit(self):
+        if not self.in_progress:
+            raise ValueError("Transação não iniciada.")
+        writes = self._writes
+        try:
+            result = self._client._commit(writes, notify=False)
+        finally:
+            self._clean_up()
+            self._client._lock.release()
+        self._client._notify([ref.path for _, ref, _, _ in writes])
+        return result
+
+    def _rollback(self) -> None:
+        if self.in_progress:
+            self._clean_up()
+            self._client._lock.release()
+
+    def get(self, ref_or_query, **kwargs):
+        if isinstance(ref_or_query, MemoryDocumentReference):
+            return iter([ref_or_query.get()])
+        return ref_or_query.stream()
+
+    def get_all(self, references, **kwargs):
+        return self._client.get_all(references)
+
+
+# ----------------------------------------------------------------------
+# Cliente
+# ----------------------------------------------------------------------
+
+class MemoryClient:
+    """Substituto do firestore.client() com os dados em memória (por processo)."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # caminho da coleção -> {id do documento -> _Record}
+        self._collections: Dict[str, Dict[str, _Record]] = {}
+        self._watches: List[_Watch] = []
+
+    # --- API pública (mesma do firestore.Client) ---
+    def collection(self, collection_path: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, collection_path)
+
+    def collection_group(self, collection_id: str) -> MemoryQuery:
+        return MemoryQuery(self, None, group_id=collection_id)
+
+    def document(self, document_path: str) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self, document_path)
+
+    def get_all(self, references, field_paths=None, transaction=None, **kwargs) -> Iterator[MemoryDocumentSnapshot]:
+        fields = list(field_paths) if field_paths is not None else None
+        return iter([self._snapshot(ref, fields) for ref in references])
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def transaction(self, **kwargs) -> MemoryTransaction:
+        return MemoryTransaction(self)
+
+    def collections(self) -> Iterator[MemoryCollectionReference]:
+        with self._lock:
+            roots = sorted({path for path in self._collections if '/' not in path})
+        return iter(self.collection(path) for path in roots)
+
+    # --- Internos ---
+    def _iter_collections(self, collection_path: Optional[str], group_id: Optional[str]):
+        if collection_path is not None:
+            documents = self._collections.get(collection_path)
+            return [(collection_path, documents)] if documents else []
+        return [
+            (path, documents) for path, documents in self._collections.items()
+            if path.rsplit('/', 1)[-1] == group_id
+        ]
+
+    def _snapshot(self, ref: MemoryDocumentReference, field_paths: Optional[List[str]] = None) -> MemoryDocumentSnapshot:
+        with self._lock:
+            record = self._collections.get(ref._collection_path, {}).get(ref.id)
+            return MemoryDocumentSnapshot(ref, record, _now(), field_paths)
+
+    def _commit(self, writes: List[Tuple], notify: bool = True) -> List[datetime]:
+        """Aplica as escritas de forma atômica (tudo ou nada)."""
+        now = _now()
+        with self._lock:
+            staged: Dict[str, Optional[_Record]] = {}
+
+            def current(ref):
+                if ref.path in staged:
+                    return staged[ref.path]
+                return self._collections.get(ref._collection_path, {}).get(ref.id)
+
+            for kind, ref, data, merge in writes:
+                existing = current(ref)
+                if kind == "delete":
+                    staged[ref.path] = None
+                    continue
+                if kind == "create" and existing is not None:
+                    raise gapi_exceptions.AlreadyExists(f"Documento já existe: {ref.path}")
+                if kind == "update" and existing is None:
+                    raise gapi_exceptions.NotFound(f"Documento não encontrado: {ref.path}")
+
+                if kind == "update":
+                    new_data = copy.deepcopy(existing.data)
+                    for field_path, value in data.items():
+                        _apply_value(new_data, field_path, value, now)
+                elif merge and existing is not None:
+                    new_data = copy.deepcopy(existing.data)
+                    _merge_into(new_data, data, now)
+                else:
+                    new_data = {}
+                    for key, value in data.items():
+                        _apply_value(new_data, (key,), value, now)
+                create_time = existing.create_time if existing is not None else now
+                staged[ref.path] = _Record(new_data, create_time, now)
+
+            for path, record in staged.items():
+                collection_path, doc_id = path.rsplit('/', 1)
+                if record is None:
+                    documents = self._collections.get(collection_path)
+                    if documents is not None:
+                        documents.pop(doc_id, None)
+                        if not documents:
+                            del self._collections[collection_path]
+                else:
+                    self._collections.setdefault(collection_path, {})[doc_id] = record
+
+        if notify:
+            self._notify(list(staged.keys()))
+        return [now] * len(writes)
+
+    # --- Listeners (on_snapshot) ---
+    def _add_watch(self, path: str, is_document: bool, callback: Callable) -> _Watch:
+        watch = _Watch(self, path, is_document, callback)
+        with self._lock:
+            self._watches.append(watch)
+        self._emit(watch, [])
+        return watch
+
+    def _remove_watch(self, watch: _Watch) -> None:
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def _emit(self, watch: _Watch, changed_paths: List[str]) -> None:
+        if not watch.active:
+            return
+        read_time = _now()
+        changes = []
+        for path in changed_paths:
+            snapshot = self.document(path).get()
+            changes.append(_Change(snapshot, "MODIFIED" if snapshot.exists else "REMOVED"))
+        if watch.is_document:
+            snapshots = [self.document(watch.path).get()]
+        else:
+            snapshots = self.collection(watch.path).get()
+        try:
+            watch.callback(snapshots, changes, read_time)
+        except Exception as e:
+            logging.error(f"Erro no listener em memória ({watch.path}): {e}")
+
+    def _notify(self, paths: List[str]) -> None:
+        if not paths:
+            return
+        with self._lock:
+            watches = list(self._watches)
+        for watch in watches:
+            if watch.is_document:
+                changed = [path for path in paths if path == watch.path]
+            else:
+                changed = [path for path in paths if path.rsplit('/', 1)[0] == watch.path]
+            if changed:
+                self._emit(watch, changed)
+
+
+# ----------------------------------------------------------------------
+# Fachada assíncrona (mesma forma do firestore_async.client())
+# O trabalho roda em thread (asyncio.to_thread), como a E/S de rede do cliente
+# real: o store em memória não deve travar o event loop durante o benchmark.
+# ----------------------------------------------------------------------
+
+class AsyncMemoryQuery:
+    def __init__(self, query: MemoryQuery):
+        self._query = query
+
+    def where(self, *args, **kwargs) -> "AsyncMemoryQuery":
+        return AsyncMemoryQuery(self._query.where(*args, **kwargs))
+
+    def order_by(self, *args, **kwargs) -> "AsyncMemoryQuery":
+        return AsyncMemoryQuery(self._query.order_by(*args, **kwargs))
+
+    def limit(self, count: int) -> "AsyncMemoryQuery":
+        return AsyncMemoryQuery(self._query.limit(count))
+
+    def offset(self, count: int) -> "AsyncMemoryQuery":
+        return AsyncMemoryQuery(self._query.offset(count))
+
+    def select(self, field_paths) -> "AsyncMemoryQuery":
+        return AsyncMemoryQuery(self._query.select(field_paths))
+
+    def count(self, alias: Optional[str] = None) -> "AsyncMemoryAggregationQuery":
+        return AsyncMemoryAggregationQuery(self._query.count(alias))
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> "AsyncMemoryAggregationQuery":
+        return AsyncMemoryAggregationQuery(self._query.sum(field_ref, alias))
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> "AsyncMemoryAggregationQuery":
+        return AsyncMemoryAggregationQuery(self._query.avg(field_ref, alias))
+
+    async def get(self, transaction=None, **kwargs) -> List[MemoryDocumentSnapshot]:
+        return await asyncio.to_thread(self._query.get)
+
+    async def stream(self, transaction=None, **kwargs):
+        for snapshot in await asyncio.to_thread(self._query.get):
+            yield snapshot
+
+
+class AsyncMemoryAggregationQuery:
+    def __init__(self, aggregation: MemoryAggregationQuery):
+        self._aggregation = aggregation
+
+    def count(self, alias: Optional[str] = None) -> "AsyncMemoryAggregationQuery":
+        self._aggregation.count(alias)
+        return self
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> "AsyncMemoryAggregationQuery":
+        self._aggregation.sum(field_ref, alias)
+        return self
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> "AsyncMemoryAggregationQuery":
+        self._aggregation.avg(field_ref, alias)
+        return self
+
+    async def get(self, transaction=None, **kwargs) -> List[List[AggregationResult]]:
+        return await asyncio.to_thread(self._aggregation.get)
+
+
+class AsyncMemoryCollectionReference(AsyncMemoryQuery):
+    def __init__(self, collection: MemoryCollectionReference):
+        super().__init__(collection)
+        self.id = collection.id
+        self.path = collection.path
+
+    def document(self, document_id: Optional[str] = None) -> "AsyncMemoryDocumentReference":
+        return AsyncMemoryDocumentReference(self._query.document(document_id))
+
+    async def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None):
+        update_time, ref = await asyncio.to_thread(self._query.add, document_data, document_id)
+        return update_time, AsyncMemoryDocumentReference(ref)
+
+
+class AsyncMemoryDocumentReference:
+    def __init__(self, ref: MemoryDocumentReference):
+        self._ref = ref
+        self.id = ref.id
+        self.path = ref.path
+
+    def collection(self, collection_id: str) -> AsyncMemoryCollectionReference:
+        return AsyncMemoryCollectionReference(self._ref.collection(collection_id))
+
+    async def get(self, field_paths=None, transaction=None, **kwargs) -> MemoryDocumentSnapshot:
+        return await asyncio.to_thread(self._ref.get, field_paths)
+
+    async def set(self, document_data: Dict[str, Any], merge: bool = False):
+        return await asyncio.to_thread(self._ref.set, document_data, merge)
+
+    async def create(self, document_data: Dict[str, Any]):
+        return await asyncio.to_thread(self._ref.create, document_data)
+
+    async def update(self, field_updates: Dict[str, Any], option=None):
+        return await asyncio.to_thread(self._ref.update, field_updates)
+
+    async def delete(self, option=None):
+        return await asyncio.to_thread(self._ref.delete)
+
+
+class AsyncMemoryClient:
+    def __init__(self, client: MemoryClient):
+        self._client = client
+
+    def collection(self, collection_path: str) -> AsyncMemoryCollectionReference:
+        return AsyncMemoryCollectionReference(self._client.collection(collection_path))
+
+    def collection_group(self, collection_id: str) -> AsyncMemoryQuery:
+        return AsyncMemoryQuery(self._client.collection_group(collection_id))
+
+    def document(self, document_path: str) -> AsyncMemoryDocumentReference:
+        return AsyncMemoryDocumentReference(self._client.document(document_path))
+
+    async def get_all(self, references, field_paths=None, **kwargs):
+        snapshots = await asyncio.to_thread(
+            lambda: list(self._client.get_all([ref._ref for ref in references], field_paths))
+        )
+        for snapshot in snapshots:
+            yield snapshot
+
+
+# ----------------------------------------------------------------------
+# Carga de dados (fixtures JSON)
+# ----------------------------------------------------------------------
+
+def _decode_fixture_value(value: Any) -> Any:
+    # Datas no JSON: {"$date": "2025-01-01T10:00:00-03:00"}
+    if isinstance(value, dict):
+        if set(value.keys()) == {"$date"}:
+            return datetime.fromisoformat(value["$date"].replace('Z', '+00:00'))
+        return {key: _decode_fixture_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode_fixture_value(item) for item in value]
+    return value
+
+
+def load_fixture(client: MemoryClient, path: str) -> int:
+    """
+    Carrega um JSON no formato {"cabeleireiros/ID": {...}, "cabeleireiros/ID/servicos/X": {...}}.
+    Retorna quantos documentos foram gravados.
+    """
+    with open(path, encoding='utf-8') as fixture_file:
+        documents = json.load(fixture_file)
+    batch = client.batch()
+    for document_path, data in documents.items():
+        batch.set(client.document(document_path), _decode_fixture_value(data))
+    batch.commit()
+    return len(documents)
+
+
+# ----------------------------------------------------------------------
+# Dados sintéticos para benchmark
+# ----------------------------------------------------------------------
+
+def seed_demo_data(client: MemoryClient, saloes: int = 1, clientes_por_salao: int = 200,
+                   agendamentos_por_dia: int = 12, dias: int = 30, seed: int = 42) -> None:
+    """
+    Popula salões 'demo-1'..'demo-N' (dono 'demo-owner-N') com serviços, equipe,
+    clientes, agendamentos (de 'dias' atrás até 'dias' à frente), produtos e despesas.
+    """
+    import random
+    from datetime import timedelta
+    import pytz
+
+    rng = random.Random(seed)
+    local_tz = pytz.timezone('America/Sao_Paulo')
+    today = datetime.now(local_tz).date()
+    weekdays = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+    horario = {
+        key: {'isOpen': key != 'sunday', 'openTime': '09:00', 'closeTime': '19:00',
+              'hasLunch': True, 'lunchStart': '12:00', 'lunchEnd': '13:00'}
+        for key in weekdays
+    }
+    servicos = [('corte', 'Corte', 30, 50.0), ('barba', 'Barba', 20, 35.0), ('escova', 'Escova', 45, 70.0),
+                ('coloracao', 'Coloração', 90, 180.0), ('manicure', 'Manicure', 40, 45.0)]
+
+    for index in range(1, saloes + 1):
+        batch = client.batch()
+        salao_id = f"demo-{index}"
+        salao_ref = client.collection('cabeleireiros').document(salao_id)
+        batch.set(salao_ref, {
+            'nome_salao': f"Salão Demo {index}", 'ownerUID': f"demo-owner-{index}",
+            'calendar_id': f"demo{index}@horalis.app", 'numero_whatsapp': f"1199999{index:04d}",
+            'horario_trabalho_detalhado': horario, 'subscriptionStatus': 'active',
+            'paidUntil': datetime.now(timezone.utc) + timedelta(days=30),
+            'marketing_cota_total': 100, 'marketing_cota_usada': 0,
+        })
+        for service_id, nome, duracao, preco in servicos:
+            batch.set(salao_ref.collection('servicos').document(service_id),
+                      {'nome_servico': nome, 'duracao_minutos': duracao, 'preco': preco})
+        pro_ids = [f"pro-{n}" for n in range(1, 4)]
+        for n, pro_id in enumerate(pro_ids, start=1):
+            batch.set(salao_ref.collection('profissionais').document(pro_id),
+                      {'nome': f"Profissional {n}", 'cargo': 'Cabeleireiro', 'ativo': True, 'servicos': []})
+
+        clientes = []
+        for n in range(clientes_por_salao):
+            cliente_id = f"cli-{n}"
+            phone = f"11{rng.randint(900000000, 999999999)}"
+            clientes.append((cliente_id, phone))
+            batch.set(salao_ref.collection('clientes').document(cliente_id), {
+                'nome': f"Cliente {n}", 'whatsapp': phone, 'email': f"cliente{n}@exemplo.com",
+                'data_cadastro': datetime.now(timezone.utc) - timedelta(days=rng.randint(0, 365)),
+                'ultima_visita': datetime.now(timezone.utc) - timedelta(days=rng.randint(0, 120)),
+                'total_gasto': 0.0,
+            })
+            for key in contact_keys(phone, f"cliente{n}@exemplo.com"):
+                batch.set(salao_ref.collection('contatos_index').document(key), {'clienteId': cliente_id})
+
+        for offset in range(-dias, dias + 1):
+            day = today + timedelta(days=offset)
+            if not horario[weekdays[day.weekday()]]['isOpen']:
+                continue
+            for _ in range(agendamentos_por_dia):
+                service_id, nome, duracao, preco = rng.choice(servicos)
+                cliente_id, phone = rng.choice(clientes)
+                start = local_tz.localize(datetime.combine(day, datetime.min.time())) + timedelta(
+                    minutes=rng.choice(range(9 * 60, 19 * 60 - duracao, 15)))
+                batch.set(salao_ref.collection('agendamentos').document(), {
+                    'salaoId': salao_id, 'clienteId': cliente_id, 'customerName': f"Cliente {cliente_id}",
+                    'customerPhone': phone, 'customerEmail': f"{cliente_id}@exemplo.com",
+                    'serviceId': service_id, 'serviceName': nome, 'servicePrice': preco, 'durationMinutes': duracao,
+                    'professionalId': rng.choice(pro_ids), 'startTime': start,
+                    'endTime': start + timedelta(minutes=duracao), 'status': 'confirmado',
+                    'reminderSent': offset < 0, 'createdAt': transforms.SERVER_TIMESTAMP,
+                })
+
+        for n in range(10):
+            batch.set(salao_ref.collection('produtos').document(f"prod-{n}"), {
+                'nome': f"Produto {n}", 'categoria': 'Revenda', 'quantidade_atual': rng.randint(0, 20),
+                'quantidade_minima': 5, 'preco_custo': 10.0, 'preco_venda': 25.0,
+            })
+        for n in range(20):
+            day = today - timedelta(days=rng.randint(0, dias))
+            batch.set(salao_ref.collection('despesas').document(), {
+                'description': f"Despesa {n}", 'amount': float(rng.randint(20, 500)),
+                'category': rng.choice(['fixa', 'variavel']), 'status': 'pending', 'date': day.isoformat(),
+            })
+        batch.commit()
+    logging.info(f"Backend em memória: {saloes} salão(ões) de demonstração carregado(s).")
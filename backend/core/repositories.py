@@ -0,0 +1,262 @@
+# backend/core/repositories.py
+# Repositórios das coleções do salão (cabeleireiros/{id}/...).
+# As rotas pedem dados por intenção (ex: "agendamentos da janela", "salão do
+# dono") em vez de montar db.collection(...).where(...) na mão. O backend é o
+# cliente de core.db: Firestore em produção ou o store em memória
+# (HORALIS_DATA_BACKEND=memory) para testes de carga sem projeto Firebase.
+# Os métodos de leitura devolvem dicionários com o 'id' do documento. Com 'fields'
+# a consulta usa projeção (select): só esses campos trafegam e são decodificados.
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from google.cloud.firestore import FieldFilter
+
+from core import db as core_db
+from core.contacts import contact_keys, normalize_email, phone_variants
+
+SALONS_COLLECTION = 'cabeleireiros'
+# Busca de cliente pelas consultas antigas (whatsapp/email) quando o índice de contatos
+# não acha. Necessária até o backfill_contact_index.py rodar em todos os salões.
+CONTACT_INDEX_FALLBACK = os.environ.get("CONTACT_INDEX_FALLBACK", "1") != "0"
+
+# (campo, operador, valor) -> vira FieldFilter
+Filter = Tuple[str, str, Any]
+
+
+def _client():
+    # Lido a cada chamada: main.py pode trocar core.db.db depois do import
+    if core_db.db is None:
+        raise RuntimeError("Banco de dados não inicializado.")
+    return core_db.db
+
+
+def _with_id(doc) -> Dict[str, Any]:
+    return {**doc.to_dict(), "id": doc.id}
+
+
+def _apply_filters(query, filters: Iterable[Filter]):
+    for field_path, op, value in filters:
+        query = query.where(filter=FieldFilter(field_path, op, value))
+    return query
+
+
+def _apply_projection(query, fields: Optional[Sequence[str]]):
+    return query.select(list(fields)) if fields else query
+
+
+class SalonRepository:
+    """Documentos de 'cabeleireiros' (o salão em si)."""
+
+    def ref(self, salao_id: str):
+        return _client().collection(SALONS_COLLECTION).document(salao_id)
+
+    def get(self, salao_id: str) -> Optional[Dict[str, Any]]:
+        doc = self.ref(salao_id).get()
+        return _with_id(doc) if doc.exists else None
+
+    def exists(self, salao_id: str) -> bool:
+        return self.ref(salao_id).get().exists
+
+    def find_id_by_owner(self, owner_uid: str) -> Optional[str]:
+        query = _client().collection(SALONS_COLLECTION).where(
+            filter=FieldFilter('ownerUID', '==', owner_uid)
+        ).limit(1)
+        docs = list(query.stream())
+        return docs[0].id if docs else None
+
+    def update(self, salao_id: str, data: Dict[str, Any]) -> None:
+        self.ref(salao_id).update(data)
+
+    def list_all(self) -> List[Dict[str, Any]]:
+        return [_with_id(doc) for doc in _client().collection(SALONS_COLLECTION).stream()]
+
+
+class SalonSubcollectionRepository:
+    """CRUD genérico de uma subcoleção do salão (cabeleireiros/{salao_id}/{collection_name})."""
+
+    collection_name: str = ""
+
+    def collection(self, salao_id: str):
+        return _client().collection(SALONS_COLLECTION).document(salao_id).collection(self.collection_name)
+
+    def ref(self, salao_id: str, doc_id: Optional[str] = None):
+        return self.collection(salao_id).document(doc_id) if doc_id else self.collection(salao_id).document()
+
+    def get(self, salao_id: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        doc = self.ref(salao_id, doc_id).get()
+        return _with_id(doc) if doc.exists else None
+
+    def get_many(self, salao_id: str, doc_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """Vários documentos em UMA ida ao banco (get_all). Retorna {id: dados} dos existentes."""
+        if not doc_ids:
+            return {}
+        refs = [self.ref(salao_id, doc_id) for doc_id in doc_ids]
+        return {doc.id: doc.to_dict() for doc in _client().get_all(refs) if doc.exists}
+
+    def list(
+        self,
+        salao_id: str,
+        filters: Iterable[Filter] = (),
+        limit: Optional[int] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        query = _apply_projection(_apply_filters(self.collection(salao_id), filters), fields)
+        if limit is not None:
+            query = query.limit(limit)
+        return [_with_id(doc) for doc in query.stream()]
+
+    def find_one(self, salao_id: str, field_path: str, value: Any) -> Optional[Dict[str, Any]]:
+        found = self.list(salao_id, [(field_path, '==', value)], limit=1)
+        return found[0] if found else None
+
+    def create(self, salao_id: str, data: Dict[str, Any], doc_id: Optional[str] = None) -> str:
+        ref = self.ref(salao_id, doc_id)
+        ref.set(data)
+        return ref.id
+
+    def update(self, salao_id: str, doc_id: str, data: Dict[str, Any]) -> None:
+        self.ref(salao_id, doc_id).update(data)
+
+    def delete(self, salao_id: str, doc_id: str) -> None:
+        self.ref(salao_id, doc_id).delete()
+
+
+class AgendamentoRepository(SalonSubcollectionRepository):
+    collection_name = 'agendamentos'
+
+    def in_range(
+        self,
+        salao_id: str,
+        start: datetime,
+        end: datetime,
+        field_path: str = 'startTime',
+        end_inclusive: bool = True,
+        professional_id: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Agendamentos com 'field_path' em [start, end] (ou [start, end) se end_inclusive=False)."""
+        filters: List[Filter] = [(field_path, '>=', start), (field_path, '<=' if end_inclusive else '<', end)]
+        if professional_id:
+            filters.append(('professionalId', '==', professional_id))
+        return self.list(salao_id, filters, fields=fields)
+
+
+class ClienteRepository(SalonSubcollectionRepository):
+    collection_name = 'clientes'
+
+    def find_by_contact(self, salao_id: str, phone: Optional[str], email: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self.find_by_contact_indexed(salao_id, phone, email)[0]
+
+    def find_by_contact_indexed(
+        self, salao_id: str, phone: Optional[str], email: Optional[str]
+    ) -> Tuple[Optional[Dict[str, Any]], Dict[str, str]]:
+        """
+        Cliente pelo telefone (prioridade) ou e-mail via índice de contatos: duas leituras
+        diretas (índice + cliente). Retorna (cliente, {chave: clienteId} já indexadas).
+        Sem entrada no índice, cai nas consultas antigas (CONTACT_INDEX_FALLBACK).
+        """
+        indexed = contatos_index.lookup(salao_id, phone, email)
+        live = self.get_many(salao_id, list(dict.fromkeys(indexed.values())))
+        indexed = {key: cliente_id for key, cliente_id in indexed.items() if cliente_id in live}
+        for cliente_id in indexed.values():
+            return {**live[cliente_id], "id": cliente_id}, indexed
+        if not CONTACT_INDEX_FALLBACK:
+            return None, indexed
+
+        # Cadastros antigos guardam o telefone só com dígitos (ex: com o 55): busca todas as formas
+        phones, email = phone_variants(phone), normalize_email(email)
+        lookups = []
+        if phones:
+            lookups.append(('whatsapp', 'in', phones))
+        if email:
+            lookups.append(('email', '==', email))
+        found = core_db.run_parallel(*(
+            lambda lookup=lookup: next(iter(self.list(salao_id, [lookup], limit=1)), None)
+            for lookup in lookups
+        ))
+        return next((match for match in found if match), None), indexed
+
+
+class ProfissionalRepository(SalonSubcollectionRepository):
+    collection_name = 'profissionais'
+
+    def list_active(self, salao_id: str, service_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Equipe ativa em uma leitura. Com service_id, mantém só quem executa o serviço
+        (lista 'servicos' vazia = executa todos). Retorna {id: dados}.
+        """
+        pros = {}
+        for data in self.list(salao_id):
+            pro_id = data.pop("id")
+            if data.get('ativo', True) is False: continue
+            if service_id and data.get('servicos') and service_id not in data['servicos']: continue
+            pros[pro_id] = data
+        return pros
+
+
+class ProdutoRepository(SalonSubcollectionRepository):
+    collection_name = 'produtos'
+
+
+class DespesaRepository(SalonSubcollectionRepository):
+    collection_name = 'despesas'
+
+    def in_period(
+        self, salao_id: str, start_date: str, end_date: str, fields: Optional[Sequence[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Despesas com 'date' (YYYY-MM-DD) entre start_date e end_date, inclusive."""
+        return self.list(salao_id, [('date', '>=', start_date), ('date', '<=', end_date)], fields=fields)
+
+
+class ReservaAgendaRepository(SalonSubcollectionRepository):
+    """Livro de reservas por dia/profissional (services/reservations.py)."""
+    collection_name = 'agenda_reservas'
+
+
+class ContatoIndexRepository(SalonSubcollectionRepository):
+    """
+    Índice de contatos do CRM: um documento por telefone normalizado ('tel:11999990000')
+    e por e-mail em minúsculas ('email:ana@x.com') apontando para o clienteId.
+    Mantido junto com cada escrita de cliente; backfill em backfill_contact_index.py.
+    """
+    collection_name = 'contatos_index'
+
+    def lookup(self, salao_id: str, phone: Optional[str], email: Optional[str]) -> Dict[str, str]:
+        """{chave: clienteId} das chaves indexadas, em ordem de prioridade, numa ida ao banco."""
+        keys = contact_keys(phone, email)
+        found = self.get_many(salao_id, keys)
+        return {key: found[key]['clienteId'] for key in keys if key in found}
+
+    def entries(
+        self, salao_id: str, cliente_id: str, phone: Optional[str], email: Optional[str],
+        skip: Iterable[str] = (),
+    ) -> List[Tuple[Any, Dict[str, Any]]]:
+        """(ref, dados) das entradas do cliente para gravar junto com o cliente ('skip': já indexadas)."""
+        skip = set(skip)
+        return [
+            (self.ref(salao_id, key), {"clienteId": cliente_id, "atualizadoEm": datetime.now(timezone.utc)})
+            for key in contact_keys(phone, email) if key not in skip
+        ]
+
+
+class IdempotencyRepository(SalonSubcollectionRepository):
+    """Respostas gravadas por Idempotency-Key (services/idempotency.py)."""
+    collection_name = 'idempotency_keys'
+
+
+class OutboxRepository(SalonSubcollectionRepository):
+    """Efeitos pós-agendamento pendentes (services/outbox.py)."""
+    collection_name = 'outbox'
+
+
+salons = SalonRepository()
+agendamentos = AgendamentoRepository()
+clientes = ClienteRepository()
+profissionais = ProfissionalRepository()
+produtos = ProdutoRepository()
+despesas = DespesaRepository()
+reservas_agenda = ReservaAgendaRepository()
+contatos_index = ContatoIndexRepository()
+chaves_idempotencia = IdempotencyRepository()
+outbox = OutboxRepository()
@@ -0,0 +1,136 @@
+# backend/core/schedule.py
+# Representação "compilada" (imutável) dos horários de trabalho.
+# As strings 'HH:MM' de 'horario_trabalho_detalhado' (salão) e 'horario_trabalho'
+# (profissional) são convertidas UMA vez em minutos do dia, já com a interseção
+# salão ∩ profissional resolvida para cada dia da semana.
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+from services.slot_engine import hhmm_to_minutes
+
+# Índice = date.weekday() (0 = segunda)
+WEEKDAY_KEYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+DEFAULT_OPEN_TIME = '09:00'
+DEFAULT_CLOSE_TIME = '18:00'
+
+SCHEDULE_BOOK_KEY = '_schedule_book'
+
+
+@dataclass(frozen=True)
+class DaySchedule:
+    """Um dia de atendimento em minutos do dia. 'lunch' é (início, fim) ou None."""
+    open_minute: int
+    close_minute: int
+    lunch: Optional[Tuple[int, int]] = None
+
+    def lunch_overlaps(self, start_minute: int, end_minute: int) -> bool:
+        return bool(self.lunch) and start_minute < self.lunch[1] and end_minute > self.lunch[0]
+
+    def contains(self, start_minute: int, end_minute: int) -> bool:
+        return self.open_minute <= start_minute and end_minute <= self.close_minute
+
+
+@dataclass(frozen=True)
+class WeeklySchedule:
+    """Sete DaySchedule (ou None = fechado/folga), indexados por weekday()."""
+    days: Tuple[Optional[DaySchedule], ...]
+
+    def for_weekday(self, weekday: int) -> Optional[DaySchedule]:
+        return self.days[weekday]
+
+    def for_date(self, day: date) -> Optional[DaySchedule]:
+        return self.days[day.weekday()]
+
+
+def _compile_day(daily: Optional[Dict[str, Any]], pro_daily: Optional[Dict[str, Any]] = None) -> Optional[DaySchedule]:
+    """Mesma regra do cálculo de slots: o mais restritivo ganha; almoço do profissional sobrescreve o do salão."""
+    if not daily or not daily.get('isOpen'):
+        return None
+
+    start = daily.get('openTime', DEFAULT_OPEN_TIME)
+    end = daily.get('closeTime', DEFAULT_CLOSE_TIME)
+    has_lunch = daily.get('hasLunch', False)
+    lunch_start = daily.get('lunchStart')
+    lunch_end = daily.get('lunchEnd')
+
+    if pro_daily:
+        if not pro_daily.get('isOpen', True):
+            return None
+        if pro_daily.get('openTime') and pro_daily['openTime'] > start:
+            start = pro_daily['openTime']
+        if pro_daily.get('closeTime') and pro_daily['closeTime'] < end:
+            end = pro_daily['closeTime']
+        if start >= end:
+            return None
+        if 'hasLunch' in pro_daily:
+            has_lunch = pro_daily['hasLunch']
+            if has_lunch:
+                lunch_start = pro_daily.get('lunchStart', lunch_start)
+                lunch_end = pro_daily.get('lunchEnd', lunch_end)
+
+    try:
+        open_minute, close_minute = hhmm_to_minutes(start), hhmm_to_minutes(end)
+    except (ValueError, AttributeError):
+        logging.error(f"Horário inválido na agenda: {start}-{end}")
+        return None
+
+    lunch = None
+    if has_lunch and lunch_start and lunch_end:
+        try:
+            lunch = (hhmm_to_minutes(lunch_start), hhmm_to_minutes(lunch_end))
+        except (ValueError, AttributeError):
+            lunch = None
+
+    return DaySchedule(open_minute, close_minute, lunch)
+
+
+def compile_salon_schedule(horario_trabalho_detalhado: Optional[Dict[str, Any]]) -> WeeklySchedule:
+    detailed = horario_trabalho_detalhado or {}
+    return WeeklySchedule(tuple(_compile_day(detailed.get(key)) for key in WEEKDAY_KEYS))
+
+
+def compile_professional_schedule(
+    horario_trabalho_detalhado: Optional[Dict[str, Any]],
+    horario_trabalho: Optional[Dict[str, Any]]
+) -> WeeklySchedule:
+    """Interseção salão ∩ profissional para cada dia da semana."""
+    detailed = horario_trabalho_detalhado or {}
+    pro_hours = horario_trabalho or {}
+    return WeeklySchedule(tuple(_compile_day(detailed.get(key), pro_hours.get(key)) for key in WEEKDAY_KEYS))
+
+
+class ScheduleBook:
+    """
+    Agendas compiladas de um salão: a do salão e, sob demanda, a de cada profissional.
+    Fica guardada junto com os dados do salão (salon_data[SCHEDULE_BOOK_KEY]).
+    """
+
+    def __init__(self, horario_trabalho_detalhado: Optional[Dict[str, Any]]):
+        self._detailed = horario_trabalho_detalhado or {}
+        self.salon = compile_salon_schedule(self._detailed)
+        self._professionals: Dict[str, Tuple[Dict[str, Any], WeeklySchedule]] = {}
+        self._lock = threading.Lock()
+
+    def for_professional(self, professional_id: str, horario_trabalho: Optional[Dict[str, Any]]) -> WeeklySchedule:
+        """Agenda compilada do profissional; recompila só se o 'horario_trabalho' mudou."""
+        if not horario_trabalho:
+            return self.salon
+        with self._lock:
+            entry = self._professionals.get(professional_id)
+            if entry and entry[0] == horario_trabalho:
+                return entry[1]
+            compiled = compile_professional_schedule(self._detailed, horario_trabalho)
+            self._professionals[professional_id] = (horario_trabalho, compiled)
+            return compiled
+
+
+def get_schedule_book(salon_data: Dict[str, Any]) -> ScheduleBook:
+    """Retorna o ScheduleBook do salão, compilando (uma vez) se ainda não existir."""
+    book = salon_data.get(SCHEDULE_BOOK_KEY)
+    if book is None:
+        book = ScheduleBook(salon_data.get('horario_trabalho_detalhado'))
+        salon_data[SCHEDULE_BOOK_KEY] = book
+    return book
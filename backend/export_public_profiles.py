@@ -0,0 +1,46 @@
+# backend/export_public_profiles.py
+# Exporta os perfis públicos (public_profiles/{salao_id}) como arquivos JSON estáticos,
+# um por salão (<saida>/<salao_id>.json), para servir o microsite de um bucket/CDN.
+# Só entram salões com assinatura ativa no momento da exportação; o ETag vai no .etag.
+#
+# Uso (a partir de backend/, com as credenciais do Firebase no ambiente):
+#   python export_public_profiles.py --out ./public --rebuild
+import argparse
+import json
+import os
+
+from core import db as core_db
+from core.repositories import salons
+from services import public_profile
+
+
+def main(args) -> None:
+    if core_db.db is None:
+        raise SystemExit("Banco de dados não inicializado.")
+    os.makedirs(args.out, exist_ok=True)
+
+    if args.rebuild:
+        # Backfill: gera o perfil de todos os salões (inclusive os criados antes dele existir)
+        for salon in salons.list_all():
+            public_profile.rebuild(salon["id"])
+
+    exported = skipped = 0
+    for doc in core_db.db.collection(public_profile.PUBLIC_PROFILE_COLLECTION).stream():
+        profile = doc.to_dict()
+        if not public_profile.is_active(profile):
+            skipped += 1
+            continue
+        with open(os.path.join(args.out, f"{doc.id}.json"), "w", encoding="utf-8") as f:
+            json.dump(profile["payload"], f, ensure_ascii=False)
+        if profile.get("etag"):
+            with open(os.path.join(args.out, f"{doc.id}.etag"), "w", encoding="utf-8") as f:
+                f.write(profile["etag"])
+        exported += 1
+    print(f"{exported} perfis exportados para {args.out} ({skipped} inativos ignorados).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta os perfis públicos dos salões como JSON estático")
+    parser.add_argument("--out", default="public_profiles")
+    parser.add_argument("--rebuild", action="store_true", help="Reconstrói o perfil de todos os salões antes")
+    main(parser.parse_args())
@@ -17,29 +17,34 @@ from routers import public_routes, admin_routes, financial_routes, stock_routes,
 # (Serviços que são importados pelos routers)
 from services import calendar_service as calendar_service
 from services import email_service as email_service
+from services import outbox
+from core import cache as core_cache
 
 # Configuração do logging
 logging.basicConfig(level=logging.INFO)
 
 # --- INICIALIZAÇÃO DO FIREBASE ---
 # (Esta lógica permanece a mesma, garantindo que o db seja inicializado)
-try:
-    cred_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS", "credentials.json")
-    if not os.path.exists(cred_path) and os.path.exists("backend/credentials.json"):
-         cred_path = "backend/credentials.json"
+from core import db as core_db_module
+
+# Com HORALIS_DATA_BACKEND=memory o core.db já usa o store em memória
+if core_db_module.DATA_BACKEND != "memory":
+    try:
+        cred_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS", "credentials.json")
+        if not os.path.exists(cred_path) and os.path.exists("backend/credentials.json"):
+             cred_path = "backend/credentials.json"
          
-    cred = credentials.Certificate(cred_path)
-    if not firebase_admin._apps:
-        firebase_admin.initialize_app(cred)
-        logging.info(f"Firebase Admin SDK inicializado com: {cred_path}")
-    db = firestore.client()
+        cred = credentials.Certificate(cred_path)
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(cred)
+            logging.info(f"Firebase Admin SDK inicializado com: {cred_path}")
+        db = firestore.client()
     
-    # Injeta a instância 'db' nos módulos que a utilizam
-    from core import db as core_db_module
-    core_db_module.db = db
+        # Injeta a instância 'db' nos módulos que a utilizam
+        core_db_module.db = db
     
-except Exception as e:
-    logging.error(f"Falha CRÍTICA ao inicializar Firebase: {e}")
+    except Exception as e:
+        logging.error(f"Falha CRÍTICA ao inicializar Firebase: {e}")
 # --- FIM DA INICIALIZAÇÃO ---
 
 # Cria a instância principal do FastAPI
@@ -89,6 +94,25 @@ app.include_router(financial_routes.router, prefix="/api/v1") # <--- Adicione
 app.include_router(stock_routes.router, prefix="/api/v1") # <--- Adicione
 app.include_router(team_routes.router, prefix="/api/v1")
 
+# --- WORKERS EM SEGUNDO PLANO ---
+# Outbox: e-mails/Google dos agendamentos rodam fora da requisição (services/outbox.py)
+@app.on_event("startup")
+def start_outbox_sweeper():
+    outbox.start_sweeper()
+
+@app.on_event("shutdown")
+def stop_outbox_sweeper():
+    outbox.stop_sweeper()
+
+# Métricas dos caches em memória (por processo) vão para o log (core/cache.py)
+@app.on_event("startup")
+def start_cache_stats_logger():
+    core_cache.start_stats_logger()
+
+@app.on_event("shutdown")
+def stop_cache_stats_logger():
+    core_cache.stop_stats_logger()
+
 # --- Rota Raiz Principal ---
 @app.get("/", tags=["Root"])
 def read_root():
@@ -26,9 +26,12 @@ from core.models import (
     PayerIdentification, PayerData, HistoricoAgendamentoItem, ClienteDetailsResponse,
     MarketingMassaBody,PagamentoSettingsBody,OwnerRegisterRequest
 )
-from core.auth import get_current_user 
-from core.db import get_all_clients_from_db, get_hairdresser_data_from_db, db
-from services import email_service, calendar_service
+from core.auth import forget_owner_salon, get_current_salao_id, get_current_user
+from core.db import get_all_clients_from_db, get_hairdresser_data_from_db, invalidate_salon_cache, run_parallel, db
+from core.async_db import aggregation_value, gather_queries, get_salon_data, run_blocking, salon_ref
+from services import email_service, calendar_service, availability_cache, google_client_pool
+from core.contacts import phone_variants
+from core.repositories import CONTACT_INDEX_FALLBACK
 
 API_BASE_URL = "https://api-agendador-2n55.onrender.com/api/v1"
 sdk = mercadopago.SDK("TEST_ACCESS_TOKEN")
@@ -37,6 +40,14 @@ sdk = mercadopago.SDK("TEST_ACCESS_TOKEN")
 MARKETING_COTA_INICIAL = 100 
 SETUP_PRICE = float(os.environ.get("HORALIS_SETUP_PRICE"))
 
+# Projeções (select) por endpoint: só os campos que cada rota lê trafegam/decodificam
+CALENDAR_EVENT_FIELDS = (
+    'startTime', 'endTime', 'serviceName', 'customerName', 'customerPhone',
+    'customerEmail', 'durationMinutes', 'googleEventId',
+)
+CRM_LIST_FIELDS = ('nome', 'email', 'whatsapp', 'data_cadastro', 'ultima_visita')
+DASHBOARD_CHART_FIELDS = ('startTime',)
+
 # --- Configuração dos Roteadores ---
 router = APIRouter(
     prefix="/admin",
@@ -278,6 +289,7 @@ async def criar_conta_paga_com_pagamento(payload: UserPaidSignupPayload,
             "marketing_cota_reset_em": None,
         }
         salao_doc_ref.set(salao_data)
+        invalidate_salon_cache(salao_id)
     except Exception as e:
         logging.error(f"Erro ao criar salão no Firestore: {e}. Fazendo rollback do Auth...")
         if uid: admin_auth.delete_user(uid)
@@ -331,6 +343,7 @@ async def criar_conta_paga_com_pagamento(payload: UserPaidSignupPayload,
             payment_result = payment_response["response"]
             qr_code_data = payment_result.get("point_of_interaction", {}).get("transaction_data", {})
             salao_doc_ref.update({"mercadopagoLastPaymentId": payment_result.get("id")})
+            invalidate_salon_cache(salao_id)
             
             return { "status": "pending_pix", "message": "PIX gerado. Aguardando pagamento.",
                      "payment_data": { "qr_code": qr_code_data.get("qr_code"), "qr_code_base64": qr_code_data.get("qr_code_base64"),
@@ -362,6 +375,7 @@ async def criar_conta_paga_com_pagamento(payload: UserPaidSignupPayload,
                     "marketing_cota_total": MARKETING_COTA_INICIAL, "marketing_cota_usada": 0,
                     "marketing_cota_reset_em": new_paid_until
                 })
+                invalidate_salon_cache(salao_id)
                 
                 background_tasks.add_task(
                     email_service.send_welcome_email_to_salon,
@@ -374,12 +388,15 @@ async def criar_conta_paga_com_pagamento(payload: UserPaidSignupPayload,
             elif payment_status in ["in_process", "pending", "pending_review_manual"]:
                 logging.info(f"Assinatura (Cartão) PENDENTE ou EM REVISÃO ({payment_status}). Salão {salao_id} aguardando webhook.")
                 salao_doc_ref.update({"mercadopagoLastPaymentId": payment_response["response"].get("id")})
+                invalidate_salon_cache(salao_id)
                 return {"status": "pending_review", "message": "Seu pagamento está em análise. Você será notificado por e-mail."}
             
             else:
                 error_detail = payment_response["response"].get("status_detail", "Pagamento rejeitado.")
                 if uid: admin_auth.delete_user(uid)
                 salao_doc_ref.delete()
+                invalidate_salon_cache(salao_id)
+                if uid: forget_owner_salon(uid)
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error_detail)
 
     except Exception as e:
@@ -390,6 +407,8 @@ async def criar_conta_paga_com_pagamento(payload: UserPaidSignupPayload,
             except Exception as auth_err: logging.error(f"Falha no rollback do Auth: {auth_err}")
         try: db.collection("cabeleireiros").document(salao_id).delete()
         except Exception as db_err: logging.error(f"Falha no rollback do Firestore: {db_err}")
+        invalidate_salon_cache(salao_id)
+        if uid: forget_owner_salon(uid)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_message)
     
     
@@ -453,6 +472,7 @@ def register_owner(data: OwnerRegisterRequest):
 
         # 5. Salvar no Firestore usando o WhatsApp como ID
         doc_ref.set(new_salon_data)
+        invalidate_salon_cache(salao_id)
         
         return {
             "message": "Conta criada com sucesso!",
@@ -469,20 +489,12 @@ def register_owner(data: OwnerRegisterRequest):
 # --- ENDPOINT PARA CRIAR ASSINATURA (LOGADO) ---
 @router.post("/pagamentos/criar-assinatura", status_code=status.HTTP_201_CREATED)
 async def create_subscription_checkout(
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    salao_id: str = Depends(get_current_salao_id)
 ):
     if not mp_preference_client:
         raise HTTPException(status_code=503, detail="Serviço de pagamento indisponível.")
-    user_uid = current_user.get("uid")
     user_email = current_user.get("email")
-    try:
-        query = db.collection('cabeleireiros').where(filter=FieldFilter('ownerUID', '==', user_uid)).limit(1)
-        client_doc_list = list(query.stream())
-        if not client_doc_list:
-            raise HTTPException(status_code=404, detail="Nenhum salão encontrado.")
-        salao_id = client_doc_list[0].id
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Erro ao associar pagamento.")
 
     back_url_success = f"https://horalis.app/painel/{salao_id}/assinatura?status=success"
     notification_url = f"{RENDER_API_URL}/webhooks/mercado-pago"
@@ -535,7 +547,7 @@ async def webhook_mercado_pago(request: Request):
             return {"status": "id não encontrado"}
             
         try:
-            payment_data = mp_payment_client.get(payment_id)
+            payment_data = await run_blocking(mp_payment_client.get, payment_id)
             if payment_data["status"] != 200:
                 return {"status": "erro ao buscar dados"}
             
@@ -559,21 +571,24 @@ async def webhook_mercado_pago(request: Request):
                     logging.error(f"Webhook falhou. Formato de external_reference inválido: {ref_id}")
                     return {"status": "referência inválida"}
 
-                agendamento_ref = db.collection('cabeleireiros').document(salao_id).collection('agendamentos').document(agendamento_id)
+                agendamento_ref = salon_ref(salao_id).collection('agendamentos').document(agendamento_id)
                 
                 if status_pagamento == 'approved':
                     logging.info(f"Sinal APROVADO para agendamento {agendamento_id}. Confirmando...")
                     
-                    agendamento_ref.update({
+                    await agendamento_ref.update({
                         "status": "confirmado",
                         "mercadopagoPaymentId": payment_id
                     })
+                    # Invalida DEPOIS da gravação: um cálculo concorrente não recoloca o status antigo no cache
+                    availability_cache.invalidate(salao_id)
                     
                     try:
-                        agendamento_data = agendamento_ref.get().to_dict()
-                        salon_data = get_hairdresser_data_from_db(salao_id)
+                        agendamento_data = (await agendamento_ref.get()).to_dict()
+                        salon_data = await get_salon_data(salao_id)
                         
-                        email_service.send_confirmation_email_to_salon(
+                        await run_blocking(
+                            email_service.send_confirmation_email_to_salon,
                             salon_email=salon_data.get('calendar_id'), 
                             salon_name=salon_data.get('nome_salao'), 
                             customer_name=agendamento_data.get('customerName'), 
@@ -581,7 +596,8 @@ async def webhook_mercado_pago(request: Request):
                             service_name=agendamento_data.get('serviceName'), 
                             start_time_iso=agendamento_data.get('startTime').isoformat()
                         )
-                        email_service.send_confirmation_email_to_customer(
+                        await run_blocking(
+                            email_service.send_confirmation_email_to_customer,
                             customer_email=agendamento_data.get('customerEmail'), 
                             customer_name=agendamento_data.get('customerName'),
                             service_name=agendamento_data.get('serviceName'), 
@@ -594,19 +610,21 @@ async def webhook_mercado_pago(request: Request):
                 
                 else:
                     logging.info(f"Sinal falhou/expirou para agendamento {agendamento_id}. Status: {status_pagamento}")
-                    agendamento_ref.update({"status": status_pagamento}) 
+                    await agendamento_ref.update({"status": status_pagamento}) 
+                    # Sinal recusado/expirado libera o horário
+                    availability_cache.invalidate(salao_id)
 
             # CASO 2: É um PAGAMENTO DE ASSINATURA
             else:
                 logging.info(f"Webhook recebido para uma Assinatura de Salão: {ref_id}")
                 salao_id = ref_id
-                salao_doc_ref = db.collection('cabeleireiros').document(salao_id)
+                salao_doc_ref = salon_ref(salao_id)
                 
                 if status_pagamento == 'approved':
                     new_paid_until = datetime.now(pytz.utc) + timedelta(days=30)
                     logging.info(f"Assinatura APROVADA. Atualizando para 'active' o salão: {salao_id}...")
                     
-                    salao_doc_ref.update({
+                    await salao_doc_ref.update({
                         "subscriptionStatus": "active",
                         "paidUntil": new_paid_until,
                         "mercadopagoLastPaymentId": payment_id,
@@ -617,12 +635,13 @@ async def webhook_mercado_pago(request: Request):
                     })
                 elif status_pagamento in ['rejected', 'cancelled', 'refunded']:
                     logging.info(f"Assinatura falhou. Status: '{status_pagamento}' para o salão: {salao_id}")
-                    salao_doc_ref.update({
+                    await salao_doc_ref.update({
                         "subscriptionStatus": status_pagamento,
                         "subscriptionLastUpdated": firestore.SERVER_TIMESTAMP
                     })
                 else:
                     logging.info(f"Webhook de assinatura recebido com status: '{status_pagamento}'. Aguardando.")
+                invalidate_salon_cache(salao_id)
 
             return {"status": "recebido"}
             
@@ -695,6 +714,7 @@ async def google_auth_callback_handler(
             "google_refresh_token": refresh_token,
             "google_sync_enabled": True
         })
+        invalidate_salon_cache(salao_doc_ref.id)
         logging.info(f"Refresh Token do Google salvo com sucesso para o salão: {salao_doc_ref.id}")
         frontend_redirect_url = f"https://horalis.app/painel/{salao_doc_ref.id}/configuracoes?sync=success"
         return RedirectResponse(frontend_redirect_url)
@@ -796,6 +816,7 @@ async def mercadopago_auth_callback_handler(
             "mp_sync_enabled": True,          
             "mp_last_updated": firestore.SERVER_TIMESTAMP
         })
+        invalidate_salon_cache(salao_id)
 
         logging.info(f"Credenciais do MercadoPago salvas com sucesso para o salão: {salao_id}")
         
@@ -812,33 +833,9 @@ async def mercadopago_auth_callback_handler(
 # --- <<< FIM DOS ENDPOINTS DO MERCADO PAGO OAUTH >>> ---
 
 @router.get("/user/salao-id", response_model=dict[str, str])
-async def get_salao_id_for_user(current_user: dict[str, Any] = Depends(get_current_user)):
-    user_uid = current_user.get("uid")
-    
-    try:
-        clients_ref = db.collection('cabeleireiros')
-        
-        # Busca o documento onde o campo 'ownerUID' é igual ao UID do usuário logado
-        query = clients_ref.where(filter=FieldFilter('ownerUID', '==', user_uid)).limit(1)
-        
-        docs = list(query.stream())
-        
-        if not docs:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, 
-                detail="Nenhum salão encontrado para esta conta. Complete o cadastro."
-            )
-        
-        # O ID do documento agora é o telefone (ex: 11999999999)
-        salao_id = docs[0].id 
-        
-        return {"salao_id": salao_id}
-
-    except HTTPException as he:
-        raise he
-    except Exception as e:
-        logging.exception(f"Erro ao buscar salão por UID ({user_uid}): {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro interno ao buscar dados do usuário.")
+async def get_salao_id_for_user(salao_id: str = Depends(get_current_salao_id)):
+    # Resolvido (e cacheado) por get_current_user: o ID do documento é o telefone (ex: 11999999999)
+    return {"salao_id": salao_id}
 
 @router.patch("/clientes/{salao_id}/google-sync", status_code=status.HTTP_200_OK)
 async def disconnect_google_sync(
@@ -848,16 +845,21 @@ async def disconnect_google_sync(
     user_uid = current_user.get("uid") 
     try:
         salao_doc_ref = db.collection('cabeleireiros').document(salao_id)
-        salao_doc = salao_doc_ref.get(['ownerUID']) 
+        salao_doc = salao_doc_ref.get(['ownerUID', 'google_refresh_token']) 
         if not salao_doc.exists:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Salão não encontrado.")
         salon_owner_uid = salao_doc.get('ownerUID')
         if salon_owner_uid != user_uid:
              raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Ação não autorizada.")
+        old_refresh_token = (salao_doc.to_dict() or {}).get('google_refresh_token')
         salao_doc_ref.update({
             "google_sync_enabled": False,
             "google_refresh_token": firestore.DELETE_FIELD
         })
+        if old_refresh_token:
+            google_client_pool.discard(old_refresh_token)
+        invalidate_salon_cache(salao_id)
+        availability_cache.invalidate(salao_id)
         return {"message": "Sincronização com Google Calendar desativada com sucesso."}
     except Exception as e:
         logging.exception(f"Erro ao desativar Google Sync para salão {salao_id}: {e}")
@@ -895,6 +897,7 @@ async def disconnect_mercadopago_sync(
             "mp_user_id": firestore.DELETE_FIELD,
             "mp_last_updated": firestore.SERVER_TIMESTAMP
         })
+        invalidate_salon_cache(salao_id)
 
         logging.info(f"Credenciais MercadoPago removidas com sucesso para o salão: {salao_id}")
         return {"message": "Conta do MercadoPago desconectada com sucesso."}
@@ -916,13 +919,13 @@ async def list_clients(current_user: dict = Depends(get_current_user)):
 @router.get("/clientes/{client_id}", response_model=ClientDetail)
 async def get_client_details(client_id: str, current_user: dict = Depends(get_current_user)):
     try:
-        client_ref = db.collection('cabeleireiros').document(client_id); client_doc = client_ref.get()
+        client_ref = db.collection('cabeleireiros').document(client_id)
+        client_doc, services_docs = run_parallel(client_ref.get, lambda: list(client_ref.collection('servicos').stream()))
         if not client_doc.exists: raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cliente não encontrado.")
         client_data = client_doc.to_dict()
         if 'id' in client_data:
             del client_data['id']
-        services_ref = client_ref.collection('servicos').stream()
-        services_list = [Service(id=doc.id, **doc.to_dict()) for doc in services_ref]
+        services_list = [Service(id=doc.id, **doc.to_dict()) for doc in services_docs]
         client_details = ClientDetail(id=client_doc.id, servicos=services_list, **client_data) 
         return client_details
     except Exception as e: logging.exception(f"Erro buscar detalhes cliente {client_id}:"); raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro interno.")
@@ -993,6 +996,9 @@ async def update_client(client_id: str, client_update_data: ClientDetail, curren
         transaction = db.transaction()
         # Passa o dicionário PURAMENTE serializável
         update_in_transaction(transaction, client_ref, client_info_to_save, updated_services)
+        # Horários/serviços podem ter mudado: descarta os dados do salão e a disponibilidade calculada
+        invalidate_salon_cache(client_id)
+        availability_cache.invalidate(client_id)
         
         logging.info(f"Cliente '{client_update_data.nome_salao}' atualizado.")
         
@@ -1046,6 +1052,7 @@ async def create_manual_appointment(
 
         agendamento_ref = db.collection('cabeleireiros').document(salao_id).collection('agendamentos').document()
         agendamento_ref.set(agendamento_data)
+        availability_cache.invalidate_for_datetimes(salao_id, start_time_dt)
         logging.info(f"Agendamento manual criado no Firestore com ID: {agendamento_ref.id}")
 
         if customer_email_provided and salon_email_destino:
@@ -1113,12 +1120,11 @@ async def get_calendar_events(
     try:
         start_dt_utc = datetime.fromisoformat(start)
         end_dt_utc = datetime.fromisoformat(end)
-        agendamentos_ref = db.collection('cabeleireiros').document(salao_id).collection('agendamentos')
-        query = agendamentos_ref.where(filter=FieldFilter("startTime", ">=", start_dt_utc)).where(filter=FieldFilter("startTime", "<=", end_dt_utc))
+        agendamentos_ref = salon_ref(salao_id).collection('agendamentos')
+        query = agendamentos_ref.where(filter=FieldFilter("startTime", ">=", start_dt_utc)).where(filter=FieldFilter("startTime", "<=", end_dt_utc)).select(CALENDAR_EVENT_FIELDS)
         
-        docs = query.stream()
         eventos = []
-        for doc in docs:
+        async for doc in query.stream():
             data = doc.to_dict()
             startTime = data.get('startTime')
             endTime = data.get('endTime')
@@ -1144,6 +1150,78 @@ async def get_calendar_events(
         logging.exception(f"Erro ao buscar eventos do calendário para {salao_id}:")
         raise HTTPException(status_code=500, detail="Erro interno ao buscar eventos.")
 
+# --- Grade de Disponibilidade (Profissionais × Dias) ---
+@router.get("/calendario/{salao_id}/grade-disponibilidade")
+async def get_availability_grid(
+    salao_id: str,
+    start_date: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    dias: int = Query(30, ge=1, le=calendar_service.MAX_RANGE_DAYS),
+    service_id: Optional[str] = Query(None),
+    duracao_minutos: Optional[int] = Query(None, ge=1, le=1440),
+    professional_ids: Optional[List[str]] = Query(None),
+    current_user: dict = Depends(get_current_user),
+    owner_salao_id: str = Depends(get_current_salao_id)
+):
+    """
+    Matriz de horários livres (HH:MM) por profissional e dia, para o painel do operador.
+    A duração vem do serviço (service_id) ou de duracao_minutos. Só o dono do salão acessa.
+    """
+    if owner_salao_id != salao_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Ação não autorizada.")
+    logging.info(f"Admin {current_user.get('email')} buscando grade de disponibilidade de {salao_id} ({dias} dias)")
+    try:
+        salon_data = await get_salon_data(salao_id)
+        if not salon_data:
+            raise HTTPException(status_code=404, detail="Salão não encontrado.")
+
+        duration = duracao_minutos
+        if service_id:
+            service_info = salon_data.get("servicos_data", {}).get(service_id)
+            if not service_info:
+                raise HTTPException(status_code=404, detail="Serviço não encontrado.")
+            duration = service_info.get('duracao_minutos')
+        if not duration:
+            raise HTTPException(status_code=400, detail="Informe service_id ou duracao_minutos.")
+
+        if not start_date:
+            start_date = datetime.now(pytz.timezone(calendar_service.LOCAL_TIMEZONE)).date().isoformat()
+
+        # Leituras do Firestore/Google (síncronas) fora do event loop
+        grid, pros, days = await run_blocking(
+            calendar_service.build_availability_grid,
+            salao_id, salon_data, start_date, dias,
+            professional_ids=professional_ids, service_id=service_id
+        )
+
+        row_ids = list(pros.keys()) or [None]
+        profissionais = []
+        total_por_dia = {day.isoformat(): 0 for day in days}
+        for pro_id in row_ids:
+            horarios = {}
+            for day in days:
+                starts = grid.starts(pro_id, day, duration)
+                horarios[day.isoformat()] = [f"{m // 60:02d}:{m % 60:02d}" for m in starts]
+                total_por_dia[day.isoformat()] += len(starts)
+            profissionais.append({
+                "id": pro_id,
+                "nome": (pros.get(pro_id) or {}).get('nome') if pro_id else salon_data.get('nome_salao'),
+                "horarios": horarios,
+                "total_horarios": sum(len(h) for h in horarios.values()),
+            })
+
+        return {
+            "inicio": days[0].isoformat(),
+            "dias": dias,
+            "duracao_minutos": duration,
+            "profissionais": profissionais,
+            "total_por_dia": total_por_dia,
+        }
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logging.exception(f"Erro ao montar grade de disponibilidade para {salao_id}:")
+        raise HTTPException(status_code=500, detail="Erro interno ao montar a grade de disponibilidade.")
+
 # --- Endpoint de Cancelar Agendamento ---
 @router.delete("/calendario/{salao_id}/agendamentos/{agendamento_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def cancel_appointment(
@@ -1174,6 +1252,7 @@ async def cancel_appointment(
                 calendar_service.delete_google_event(refresh_token, google_event_id)
         
         agendamento_ref.delete()
+        availability_cache.invalidate_for_datetimes(salao_id, start_time_dt)
         
         if customer_email and customer_name and service_name and start_time_dt and salon_name:
             try:
@@ -1232,15 +1311,16 @@ async def reschedule_appointment(
              new_start_dt = new_start_dt.astimezone(local_tz)
         new_end_dt = new_start_dt + timedelta(minutes=duration)
         
-        is_free = calendar_service.is_slot_available(
+        validation = calendar_service.validate_booking(
             salao_id=salao_id, salon_data=salon_data,
             new_start_dt=new_start_dt, duration_minutes=duration,
+            professional_id=agendamento_data.get("professionalId"),
             ignore_firestore_id=agendamento_id, ignore_google_event_id=google_event_id
         )
-        if not is_free:
+        if not validation.ok:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
-                detail="Horário indisponível. Conflito com outro agendamento ou evento pessoal."
+                detail=validation.message
             )
         
         if google_event_id:
@@ -1255,6 +1335,7 @@ async def reschedule_appointment(
             "startTime": new_start_dt,
             "endTime": new_end_dt
         })
+        availability_cache.invalidate_for_datetimes(salao_id, old_start_time_dt, new_start_dt)
         logging.info(f"Agendamento {agendamento_id} atualizado no Firestore.")
 
         if customer_email and customer_name and service_name and salon_name:
@@ -1319,6 +1400,7 @@ async def google_auth_callback_handler(
             "google_refresh_token": refresh_token,
             "google_sync_enabled": True
         })
+        invalidate_salon_cache(salao_doc_ref.id)
         logging.info(f"Refresh Token do Google salvo com sucesso para o salão: {salao_doc_ref.id}")
         frontend_redirect_url = f"https://horalis.app/painel/{salao_doc_ref.id}/configuracoes?sync=success"
         return RedirectResponse(frontend_redirect_url)
@@ -1391,11 +1473,11 @@ async def list_crm_clients(
     user_email = current_user.get("email")
     logging.info(f"Admin {user_email} solicitou lista CRM para salão: {salao_id}")
     try:
-        clientes_ref = db.collection('cabeleireiros').document(salao_id).collection('clientes')
-        docs = clientes_ref.stream()
+        clientes_ref = salon_ref(salao_id).collection('clientes')
+        docs = clientes_ref.select(CRM_LIST_FIELDS).stream()
         
         clientes_list = []
-        for doc in docs:
+        async for doc in docs:
             data = doc.to_dict()
             data_cadastro = data.get('data_cadastro')
             ultima_visita = data.get('ultima_visita')
@@ -1439,8 +1521,8 @@ async def get_cliente_details_and_history(
 
         # Pega o telefone do cadastro para a busca secundária
         raw_phone = str(cliente_data.get('whatsapp', ''))
-        # Limpa o telefone (apenas números) para garantir o match
-        cliente_whatsapp_clean = re.sub(r'\D', '', raw_phone) if raw_phone else None
+        # Formas do telefone: canônica (agendamentos novos) e só dígitos (histórico antigo, ex: com 55)
+        cliente_phone_variants = phone_variants(raw_phone)
 
         # ----------------------------------------------------
         # 2. BUSCA O NOME DO SALÃO
@@ -1480,9 +1562,11 @@ async def get_cliente_details_and_history(
                 processed_ids.add(doc.id)
 
         # B. Busca por Telefone (Vínculo Fraco/Histórico Antigo)
-        if cliente_whatsapp_clean:
-            # Busca onde customerPhone é igual ao número limpo
-            query_phone = agendamentos_ref.where(filter=FieldFilter("customerPhone", "==", cliente_whatsapp_clean))
+        # O backfill_contact_index.py grava o clienteId nesses agendamentos; depois dele
+        # (CONTACT_INDEX_FALLBACK=0) a busca A basta.
+        if cliente_phone_variants and CONTACT_INDEX_FALLBACK:
+            # Busca onde customerPhone está em qualquer uma das formas do número
+            query_phone = agendamentos_ref.where(filter=FieldFilter("customerPhone", "in", cliente_phone_variants))
             docs_phone = query_phone.stream()
 
             for doc in docs_phone:
@@ -1643,8 +1727,8 @@ async def get_dashboard_data_consolidated(
     logging.info(f"Admin {current_user.get('email')} buscando dados consolidados para {salao_id}.")
     
     try:
-        agendamentos_ref = db.collection('cabeleireiros').document(salao_id).collection('agendamentos')
-        clientes_ref = db.collection('cabeleireiros').document(salao_id).collection('clientes')
+        agendamentos_ref = salon_ref(salao_id).collection('agendamentos')
+        clientes_ref = salon_ref(salao_id).collection('clientes')
 
         now_utc = datetime.now(pytz.utc) 
         hoje_utc = now_utc.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -1691,29 +1775,30 @@ async def get_dashboard_data_consolidated(
         
         
         # --- Queries Firestone (CORRIGIDAS) ---
-        novos_clientes_query = clientes_ref.where(filter=FieldFilter('data_cadastro', '>=', clientes_start)).where(filter=FieldFilter('data_cadastro', '<', clientes_end))
+        # Contadores e receita são agregações no servidor (count/sum): o custo não cresce
+        # com o número de documentos na janela. Só o gráfico busca documentos.
+        novos_clientes_query = clientes_ref.where(filter=FieldFilter('data_cadastro', '>=', clientes_start)).where(filter=FieldFilter('data_cadastro', '<', clientes_end)).count(alias='total')
         
-        foco_query = agendamentos_ref.where(filter=FieldFilter('startTime', '>=', foco_start)).where(filter=FieldFilter('startTime', '<', foco_end)).where(filter=FieldFilter('status', '!=', 'cancelado'))
+        foco_query = agendamentos_ref.where(filter=FieldFilter('startTime', '>=', foco_start)).where(filter=FieldFilter('startTime', '<', foco_end)).where(filter=FieldFilter('status', '!=', 'cancelado')).count(alias='total')
         
         # CORREÇÃO CRÍTICA: AGORA USA receita_end para limitar a consulta de receita
-        receita_query = agendamentos_ref.where(filter=FieldFilter('startTime', '>=', receita_start)).where(filter=FieldFilter('startTime', '<', receita_end)).where(filter=FieldFilter('status', '!=', 'cancelado'))
+        receita_query = agendamentos_ref.where(filter=FieldFilter('startTime', '>=', receita_start)).where(filter=FieldFilter('startTime', '<', receita_end)).where(filter=FieldFilter('status', '!=', 'cancelado')).sum('servicePrice', alias='total')
         
-        chart_query = agendamentos_ref.where(filter=FieldFilter('startTime', '>=', chart_start)).where(filter=FieldFilter('startTime', '<', chart_end)).where(filter=FieldFilter('status', '!=', 'cancelado'))
+        chart_query = agendamentos_ref.where(filter=FieldFilter('startTime', '>=', chart_start)).where(filter=FieldFilter('startTime', '<', chart_end)).where(filter=FieldFilter('status', '!=', 'cancelado')).select(DASHBOARD_CHART_FIELDS)
 
         
-        # --- Execução das Consultas (Síncronas) ---
-        novos_clientes_snapshot = novos_clientes_query.get()
-        foco_snapshot = foco_query.get()
-        receita_snapshot = receita_query.get()
-        chart_snapshot = chart_query.get()
+        # --- Execução das Consultas (Assíncronas, em paralelo) ---
+        novos_clientes_result, foco_result, receita_result, chart_snapshot = await gather_queries(
+            novos_clientes_query, foco_query, receita_query, chart_query
+        )
         
         
         # --- Processamento dos Resultados ---
-        count_novos_clientes = len(novos_clientes_snapshot)
-        count_agendamentos_foco = len(foco_snapshot)
+        count_novos_clientes = int(aggregation_value(novos_clientes_result, 'total'))
+        count_agendamentos_foco = int(aggregation_value(foco_result, 'total'))
         
-        # O cálculo da receita agora será preciso, pois o snapshot já está filtrado
-        total_receita = sum(doc.to_dict().get('servicePrice', 0) for doc in receita_snapshot)
+        # O cálculo da receita agora será preciso, pois a agregação já está filtrada
+        total_receita = float(aggregation_value(receita_result, 'total'))
         receita_formatada = f"{total_receita:.2f}".replace('.', ',')
         
         processed_chart_data = _process_chart_data(
@@ -1770,6 +1855,7 @@ def _process_mass_email_send(salao_id: str, subject: str, message: str, admin_em
                 "marketing_cota_usada": 0,
                 "marketing_cota_reset_em": novo_reset
             })
+            invalidate_salon_cache(salao_id)
         
         # 2. Constrói a Query do Segmento
         clientes_ref = salao_doc_ref.collection('clientes')
@@ -1802,6 +1888,7 @@ def _process_mass_email_send(salao_id: str, subject: str, message: str, admin_em
         salao_doc_ref.update({
             "marketing_cota_usada": firestore.Increment(tamanho_do_envio)
         })
+        invalidate_salon_cache(salao_id)
         
     except Exception as e:
         logging.exception(f"Erro CRÍTICO na verificação de cota: {e}")
@@ -1927,10 +2014,11 @@ async def update_payment_settings(
             update_data["mp_public_key"] = settings.mp_public_key
         
         salao_doc_ref.update(update_data)
+        invalidate_salon_cache(salao_id)
         
         logging.info(f"Configurações de pagamento (Sinal: {settings.sinal_valor}) salvas para {salao_id}.")
         return {"message": "Configurações de pagamento salvas com sucesso!"}
 
     except Exception as e:
         logging.exception(f"Erro ao salvar configurações de pagamento para {salao_id}: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro interno ao salvar configurações.")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro interno ao salvar configurações.")
@@ -3,12 +3,15 @@ from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 import pytz
-from google.cloud.firestore import FieldFilter
-from core.db import db
-from core.auth import get_current_user 
+from core.repositories import agendamentos, despesas
+from core.auth import get_current_salao_id
 
 router = APIRouter(prefix="/admin/financeiro", tags=["Financeiro"])
 
+# Projeções do resumo: só os campos usados no cálculo/retorno
+SUMMARY_APPOINTMENT_FIELDS = ('startTime', 'servicePrice', 'status')
+SUMMARY_EXPENSE_FIELDS = ('description', 'amount', 'date', 'category', 'status')
+
 # --- Modelos Pydantic ---
 class ExpenseCreate(BaseModel):
     description: str
@@ -32,26 +35,18 @@ class FinancialSummary(BaseModel):
 @router.post("/despesas", status_code=status.HTTP_201_CREATED)
 def create_expense(
     expense: ExpenseCreate,
-    current_user: dict = Depends(get_current_user)
+    salao_id: str = Depends(get_current_salao_id)
 ):
     """Cria uma nova despesa no Firestore"""
-    uid = current_user['uid']
-    
-    # 1. Busca o ID do Salão (garantia de segurança)
-    query = db.collection('cabeleireiros').where(filter=FieldFilter('ownerUID', '==', uid)).limit(1)
-    docs = list(query.stream())
-    if not docs: raise HTTPException(404, "Salão não encontrado")
-    salao_id = docs[0].id
 
     try:
         # Salva na subcoleção 'despesas'
         new_expense = expense.dict()
         new_expense['createdAt'] = datetime.utcnow()
         
-        doc_ref = db.collection('cabeleireiros').document(salao_id).collection('despesas').document()
-        doc_ref.set(new_expense)
+        despesa_id = despesas.create(salao_id, new_expense)
         
-        return {"message": "Despesa salva com sucesso", "id": doc_ref.id}
+        return {"message": "Despesa salva com sucesso", "id": despesa_id}
     except Exception as e:
         print(f"Erro ao salvar despesa: {e}")
         raise HTTPException(500, "Erro ao salvar despesa")
@@ -59,17 +54,11 @@ def create_expense(
 @router.delete("/despesas/{despesa_id}")
 def delete_expense(
     despesa_id: str,
-    current_user: dict = Depends(get_current_user)
+    salao_id: str = Depends(get_current_salao_id)
 ):
-    uid = current_user['uid']
-    # Busca Salão
-    query = db.collection('cabeleireiros').where(filter=FieldFilter('ownerUID', '==', uid)).limit(1)
-    docs = list(query.stream())
-    if not docs: raise HTTPException(404, "Salão não encontrado")
-    salao_id = docs[0].id
 
     try:
-        db.collection('cabeleireiros').document(salao_id).collection('despesas').document(despesa_id).delete()
+        despesas.delete(salao_id, despesa_id)
         return {"message": "Despesa removida"}
     except Exception as e:
         raise HTTPException(500, f"Erro ao deletar: {str(e)}")
@@ -77,23 +66,17 @@ def delete_expense(
 @router.patch("/despesas/{despesa_id}/toggle")
 def toggle_expense_status(
     despesa_id: str,
-    current_user: dict = Depends(get_current_user)
+    salao_id: str = Depends(get_current_salao_id)
 ):
-    uid = current_user['uid']
-    query = db.collection('cabeleireiros').where(filter=FieldFilter('ownerUID', '==', uid)).limit(1)
-    docs = list(query.stream())
-    if not docs: raise HTTPException(404, "Salão não encontrado")
-    salao_id = docs[0].id
 
     try:
-        ref = db.collection('cabeleireiros').document(salao_id).collection('despesas').document(despesa_id)
-        doc = ref.get()
-        if not doc.exists: raise HTTPException(404, "Despesa não encontrada")
+        despesa = despesas.get(salao_id, despesa_id)
+        if not despesa: raise HTTPException(404, "Despesa não encontrada")
         
-        current_status = doc.to_dict().get('status', 'pending')
+        current_status = despesa.get('status', 'pending')
         new_status = 'paid' if current_status == 'pending' else 'pending'
         
-        ref.update({'status': new_status})
+        despesas.update(salao_id, despesa_id, {'status': new_status})
         return {"status": new_status}
     except Exception as e:
         raise HTTPException(500, f"Erro ao atualizar: {str(e)}")
@@ -101,16 +84,11 @@ def toggle_expense_status(
 @router.get("/resumo", response_model=FinancialSummary)
 def get_financial_summary(
     period: str = Query("month", enum=["week", "month"]),
-    current_user: dict = Depends(get_current_user)
+    salao_id: str = Depends(get_current_salao_id)
 ):
     """
     Calcula Entradas (Agendamentos) vs Saídas (Despesas) e monta o gráfico.
     """
-    uid = current_user['uid']
-    query = db.collection('cabeleireiros').where(filter=FieldFilter('ownerUID', '==', uid)).limit(1)
-    docs = list(query.stream())
-    if not docs: raise HTTPException(404, "Salão não encontrado")
-    salao_id = docs[0].id
 
     # 1. Definir Datas (Fuso SP)
     tz = pytz.timezone('America/Sao_Paulo')
@@ -131,17 +109,12 @@ def get_financial_summary(
 
     # 2. BUSCAR RECEITA (AGENDAMENTOS)
     # Somamos o preço de todos os serviços confirmados ou pendentes (não cancelados)
-    appt_ref = db.collection('cabeleireiros').document(salao_id).collection('agendamentos')
-    appt_query = appt_ref.where(filter=FieldFilter('startTime', '>=', start_utc))\
-                         .where(filter=FieldFilter('startTime', '<=', end_utc))
-    
-    appts = list(appt_query.stream())
+    appts = agendamentos.in_range(salao_id, start_utc, end_utc, fields=SUMMARY_APPOINTMENT_FIELDS)
     
     total_revenue = 0.0
     revenue_by_day = {} # Para o gráfico
 
-    for doc in appts:
-        data = doc.to_dict()
+    for data in appts:
         if data.get('status') == 'cancelado': continue
         
         price = float(data.get('servicePrice', 0))
@@ -156,27 +129,22 @@ def get_financial_summary(
         revenue_by_day[day_key] += price
 
     # 3. BUSCAR DESPESAS
-    exp_ref = db.collection('cabeleireiros').document(salao_id).collection('despesas')
     # Filtragem simples por string de data YYYY-MM-DD (como salvamos no create)
     start_str = start_date.strftime('%Y-%m-%d')
     end_str = (end_date + timedelta(days=1)).strftime('%Y-%m-%d')
     
-    exp_query = exp_ref.where(filter=FieldFilter('date', '>=', start_str))\
-                       .where(filter=FieldFilter('date', '<=', end_str))
-    
-    exps = list(exp_query.stream())
+    exps = despesas.in_period(salao_id, start_str, end_str, fields=SUMMARY_EXPENSE_FIELDS)
     
     total_expenses = 0.0
     expenses_list = []
     expenses_by_day = {}
 
-    for doc in exps:
-        data = doc.to_dict()
+    for data in exps:
         val = float(data.get('amount', 0))
         total_expenses += val
         
         # Formata para lista de retorno
-        expenses_list.append({**data, "id": doc.id})
+        expenses_list.append(data)
         
         # Agrupar por dia
         # data['date'] já é "2025-11-09"
@@ -1,19 +1,21 @@
 import logging
-import re
 import os 
 import pytz 
-from fastapi import APIRouter, HTTPException, Query, status, Depends
+from fastapi import APIRouter, HTTPException, Query, status, Depends, Request, Response, Header
+from fastapi.responses import JSONResponse
 from datetime import datetime, timedelta 
 from firebase_admin import firestore 
-from google.cloud.firestore import FieldFilter
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 import mercadopago 
 from mercadopago.config import RequestOptions
 
 # Importações dos nossos módulos
-from core.models import SalonPublicDetails, Service, Appointment, Cliente, AppointmentPaymentPayload, Professional # 🌟 Adicionado Professional
-from core.db import get_hairdresser_data_from_db, db 
-from services import calendar_service, email_service 
+from core.models import SalonPublicDetails, Appointment, Cliente, AppointmentPaymentPayload
+from core.db import db
+from core.async_db import get_salon_data, run_blocking
+from core import contacts
+from core.repositories import agendamentos, clientes, contatos_index
+from services import calendar_service, availability_cache, booking_effects, idempotency, outbox, public_page_cache, public_profile, reservations
 
 # --- Constantes ---
 CLIENTE_COLLECTION = 'clientes' 
@@ -38,176 +40,89 @@ except Exception as e:
 
 # --- Helpers (Mantidos) ---
 def normalize_phone(phone: str) -> str:
-    """Remove tudo que não é dígito para garantir buscas precisas no banco."""
-    if not phone: return ""
-    return re.sub(r'\D', '', phone)
-
-def is_conflict_with_lunch(booking_start_dt: datetime, service_duration_minutes: int, salon_data: Dict[str, Any]) -> bool:
-    """Verifica conflito com almoço considerando o FUSO HORÁRIO (America/Sao_Paulo)."""
-    try:
-        timezone = pytz.timezone('America/Sao_Paulo')
-
-        if booking_start_dt.tzinfo is None:
-            booking_local = pytz.utc.localize(booking_start_dt).astimezone(timezone)
-        else:
-            booking_local = booking_start_dt.astimezone(timezone)
-
-        day_name = booking_local.strftime('%A').lower()
-        daily_schedule = salon_data.get('horario_trabalho_detalhado', {}).get(day_name)
-
-        if not daily_schedule: return False
-        if not daily_schedule.get('hasLunch') or not daily_schedule.get('lunchStart') or not daily_schedule.get('lunchEnd'):
-            return False
-
-        date_local = booking_local.date()
-        lunch_start_time = datetime.strptime(daily_schedule['lunchStart'], '%H:%M').time()
-        lunch_end_time = datetime.strptime(daily_schedule['lunchEnd'], '%H:%M').time()
-
-        lunch_start_dt = timezone.localize(datetime.combine(date_local, lunch_start_time))
-        lunch_end_dt = timezone.localize(datetime.combine(date_local, lunch_end_time))
-        
-        service_duration = timedelta(minutes=service_duration_minutes)
-        booking_end_local = booking_local + service_duration
-
-        if (booking_local < lunch_end_dt) and (booking_end_local > lunch_start_dt):
-            logging.warning(f"CONFLITO DE ALMOÇO DETECTADO!")
-            return True
-        return False
-    except Exception as e:
-        logging.error(f"Erro ao verificar almoço: {e}")
-        return False
-
-def check_and_update_cliente_profile(salao_id: str, appointment_data) -> str:
-    """Cria ou atualiza o perfil do cliente (CRM) e retorna o ID do documento."""
+    """Só dígitos, com DDD e sem o 55 do país (mesma chave do índice de contatos)."""
+    return contacts.normalize_phone(phone)
+
+def prepare_cliente_upsert(salao_id: str, appointment_data) -> Tuple[str, List[Tuple[Any, Dict[str, Any]]]]:
+    """
+    Resolve o perfil do cliente (CRM) sem gravar: devolve (cliente_id, [(ref, dados)]).
+    As escritas (cliente + entradas do índice de contatos) entram na mesma transação do
+    agendamento (cliente novo com id pré-gerado), então uma falha no meio não deixa perfil órfão.
+    """
     phone_clean = normalize_phone(appointment_data.customer_phone)
-    email_clean = appointment_data.customer_email.strip().lower() if appointment_data.customer_email else None
+    email_clean = contacts.normalize_email(appointment_data.customer_email)
     name_clean = appointment_data.customer_name.strip()
 
-    clientes_ref = db.collection('cabeleireiros').document(salao_id).collection('clientes')
-    cliente_doc = None
-
-    if phone_clean:
-        query_phone = clientes_ref.where(filter=FieldFilter("whatsapp", "==", phone_clean)).limit(1).stream()
-        cliente_doc = next(query_phone, None)
-
-    if not cliente_doc and email_clean:
-        query_email = clientes_ref.where(filter=FieldFilter("email", "==", email_clean)).limit(1).stream()
-        cliente_doc = next(query_email, None)
+    # Telefone como veio: a busca antiga (antes do backfill) também tenta a forma só com dígitos
+    current_data, indexed = clientes.find_by_contact_indexed(salao_id, appointment_data.customer_phone, email_clean)
 
     now = firestore.SERVER_TIMESTAMP
 
-    if cliente_doc:
-        cliente_id = cliente_doc.id
+    if current_data:
+        cliente_id = current_data['id']
         update_data = {"ultima_visita": now}
-        current_data = cliente_doc.to_dict()
         if not current_data.get('email') and email_clean: update_data['email'] = email_clean
         if not current_data.get('nome') and name_clean: update_data['nome'] = name_clean
-        cliente_doc.reference.update(update_data)
-        return cliente_id
+        cliente_ref = clientes.ref(salao_id, cliente_id)
+        writes = [(cliente_ref, update_data)]
     else:
         new_client_data = {
             "nome": name_clean, "whatsapp": phone_clean, "email": email_clean,
             "data_cadastro": now, "ultima_visita": now, "total_gasto": 0.0, "total_visitas": 0
         }
-        new_ref = clientes_ref.document()
-        new_ref.set(new_client_data)
-        return new_ref.id
+        cliente_ref = clientes.ref(salao_id)
+        cliente_id = cliente_ref.id
+        writes = [(cliente_ref, new_client_data)]
+    # Só indexa o contato que ainda não aponta para um cliente (não rouba o de outro)
+    writes += contatos_index.entries(salao_id, cliente_id, phone_clean, email_clean, skip=indexed)
+    return cliente_id, writes
     
-# Função auxiliar para notificar profissional
-def notify_professional_if_assigned(salao_id: str, professional_id: str, appointment_data: dict, salon_name: str):
-    if not professional_id: return
-
-    try:
-        # Busca o profissional no banco para pegar o e-mail
-        pro_doc = db.collection('cabeleireiros').document(salao_id).collection('profissionais').document(professional_id).get()
-        
-        if pro_doc.exists:
-            pro_data = pro_doc.to_dict()
-            pro_email = pro_data.get('email')
-            pro_name = pro_data.get('nome', 'Profissional')
-            
-            if pro_email:
-                email_service.send_new_appointment_email_to_professional(
-                    pro_email=pro_email,
-                    pro_name=pro_name,
-                    customer_name=appointment_data['customerName'],
-                    customer_phone=appointment_data['customerPhone'],
-                    service_name=appointment_data['serviceName'],
-                    start_time_iso=appointment_data['startTime'].isoformat(),
-                    salon_name=salon_name
-                )
-    except Exception as e:
-        logging.error(f"Falha ao notificar profissional: {e}")
-
 # --- ROTAS ---
 
-# 🌟 ATUALIZADO: Agora busca a equipe junto com os serviços.
+# 🌟 ATUALIZADO: Uma leitura do perfil público pré-montado (services/public_profile.py).
 @router.get("/saloes/{salao_id}/servicos", response_model=SalonPublicDetails)
-def get_salon_services_and_details(salao_id: str):
-    logging.info(f"Buscando detalhes/serviços para: {salao_id}")
-    salon_data = get_hairdresser_data_from_db(salao_id) 
-    
-    if not salon_data:
+def get_salon_services_and_details(salao_id: str, request: Request):
+    # 0. Página em cache: 304 (If-None-Match) ou o JSON pronto, sem Firestore
+    if_none_match = request.headers.get("if-none-match")
+    cached_page = public_page_cache.get(salao_id)
+    if cached_page is not None:
+        headers = public_page_cache.cache_headers(cached_page.etag)
+        if public_page_cache.etag_matches(if_none_match, cached_page.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=cached_page.body, media_type="application/json", headers=headers)
+
+    logging.info(f"Buscando perfil público para: {salao_id}")
+    generation = public_page_cache.generation(salao_id)
+    # Perfil gravado conferido contra a versão do salão; ausente/defasado é montado na hora
+    profile = public_profile.get_current(salao_id)
+    if profile is None:
         raise HTTPException(status_code=404, detail="Salão não encontrado")
 
-    # 🌟 CORREÇÃO DE TELEFONE 🌟
-    # Prioriza 'telefone' (Painel/Personalização). 
-    # Se estiver vazio, usa 'numero_whatsapp' (Cadastro).
-    telefone_editado = salon_data.get('telefone')
-    whatsapp_original = salon_data.get('numero_whatsapp')
-    
-    # Define o telefone oficial para o microsite
-    salon_data['telefone'] = telefone_editado if telefone_editado else whatsapp_original
-
     # --- Validação de Assinatura (Mantida) ---
-    status_assinatura = salon_data.get("subscriptionStatus")
-    trial_ends_at = salon_data.get("trialEndsAt")
-    
-    is_active = False
-    
-    if status_assinatura == "active":
-        is_active = True
-    elif status_assinatura == "trialing":
-        if trial_ends_at:
-            if isinstance(trial_ends_at, str):
-                trial_ends_at = datetime.fromisoformat(trial_ends_at)
-            
-            if trial_ends_at.tzinfo is None:
-                trial_ends_at = trial_ends_at.replace(tzinfo=pytz.utc)
-            
-            if trial_ends_at > datetime.now(pytz.utc):
-                is_active = True
-
-    if not is_active:
-        logging.warning(f"Acesso público bloqueado para salão {salao_id}. Status: {status_assinatura}")
+    if not public_profile.is_active(profile):
+        logging.warning(f"Acesso público bloqueado para salão {salao_id}. Status: {profile.get('subscriptionStatus')}")
         raise HTTPException(
             status_code=403, 
             detail="Este estabelecimento está temporariamente indisponível."
         )
-    
-    # --- Formatação de Serviços (Mantida) ---
-    services_list_formatted = []
-    if salon_data.get("servicos_data"):
-        for service_id, service_info in salon_data["servicos_data"].items():
-            services_list_formatted.append(Service(id=service_id, **service_info)) 
-    
-    # 🌟 BUSCA EQUIPE (Mantida) 🌟
-    profissionais_list = []
-    try:
-        pros_ref = db.collection('cabeleireiros').document(salao_id).collection('profissionais')
-        docs = pros_ref.stream() 
-        for doc in docs:
-            profissionais_list.append(Professional(id=doc.id, **doc.to_dict()))
-    except Exception as e:
-        logging.error(f"Erro ao buscar equipe: {e}")
-    
-    response_data = SalonPublicDetails(
-        servicos=services_list_formatted,
-        profissionais=profissionais_list,
-        **salon_data
-    ) 
-    
-    return response_data
+
+    # --- ETag / Cache-Control ---
+    # Sem versão confiável (falha ao ler a equipe) a resposta sai sem ETag e não é cacheada
+    etag = profile.get("etag")
+    if not etag:
+        return JSONResponse(content=profile["payload"])
+
+    headers = public_page_cache.cache_headers(etag)
+    response = JSONResponse(content=profile["payload"], headers=headers)
+
+    # Trial: não guarda uma página que pode sobreviver ao fim do período de teste
+    ttl_limit = datetime.now(pytz.utc) + timedelta(seconds=public_page_cache.PUBLIC_PAGE_CACHE_TTL_SECONDS)
+    if public_profile.is_active(profile, now=ttl_limit):
+        public_page_cache.store(salao_id, public_page_cache.PublicPage(etag, response.body), generation)
+
+    if public_page_cache.etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return response
 
 # 🌟 ATUALIZADO: Aceita professional_id
 @router.get("/saloes/{salao_id}/horarios-disponiveis")
@@ -219,7 +134,7 @@ async def get_available_slots_endpoint(
 ):
     logging.info(f"Buscando horários para salão {salao_id} em {date} (Profissional: {professional_id})")
     try:
-        salon_data = get_hairdresser_data_from_db(salao_id)
+        salon_data = await get_salon_data(salao_id)
         if not salon_data: raise HTTPException(status_code=404, detail="Salão não encontrado")
         
         service_info = salon_data.get("servicos_data", {}).get(service_id)
@@ -229,7 +144,8 @@ async def get_available_slots_endpoint(
         if duration is None: raise HTTPException(status_code=500, detail="Duração do serviço não encontrada.")
         
         # 🌟 Passa o professional_id para o filtro
-        available_slots = calendar_service.find_available_slots(
+        available_slots = await run_blocking(
+            calendar_service.find_available_slots,
             salao_id=salao_id,
             salon_data=salon_data, 
             service_duration_minutes=duration,
@@ -241,16 +157,148 @@ async def get_available_slots_endpoint(
         logging.exception(f"Erro CRÍTICO no cálculo de slots (Híbrido):")
         raise HTTPException(status_code=500, detail="Erro interno ao calcular horários.")
 
+# 🌟 NOVO: Primeiro horário livre (uma chamada em vez de sondar data por data)
+@router.get("/saloes/{salao_id}/proximo-horario")
+async def get_next_available_slot_endpoint(
+    salao_id: str,
+    service_id: str,
+    professional_id: Optional[str] = Query(None),
+    a_partir_de: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    max_dias: int = Query(calendar_service.NEXT_SLOT_MAX_DAYS, ge=1, le=calendar_service.NEXT_SLOT_MAX_DAYS)
+):
+    """Retorna o primeiro horário livre para o serviço (e profissional, se informado)."""
+    logging.info(f"Buscando próximo horário para salão {salao_id} (Profissional: {professional_id})")
+    try:
+        salon_data = await get_salon_data(salao_id)
+        if not salon_data: raise HTTPException(status_code=404, detail="Salão não encontrado")
+
+        service_info = salon_data.get("servicos_data", {}).get(service_id)
+        if not service_info: raise HTTPException(status_code=404, detail="Serviço não encontrado.")
+
+        duration = service_info.get('duracao_minutos')
+        if duration is None: raise HTTPException(status_code=500, detail="Duração do serviço não encontrada.")
+
+        next_slot = await run_blocking(
+            calendar_service.find_next_available_slot,
+            salao_id=salao_id,
+            salon_data=salon_data,
+            service_duration_minutes=duration,
+            professional_id=professional_id,
+            start_date_str=a_partir_de,
+            max_days=max_dias
+        )
+        if not next_slot:
+            return {"proximo_horario": None, "data": None}
+        return {"proximo_horario": next_slot["horario"], "data": next_slot["data"]}
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logging.exception(f"Erro CRÍTICO na busca do próximo horário:")
+        raise HTTPException(status_code=500, detail="Erro interno ao calcular horários.")
+
+# 🌟 NOVO: Qualquer profissional disponível (uma chamada em vez de N)
+@router.get("/saloes/{salao_id}/horarios-disponiveis/qualquer-profissional")
+async def get_available_slots_any_professional_endpoint(
+    salao_id: str,
+    service_id: str,
+    date: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$")
+):
+    """Retorna cada horário livre com a lista de profissionais que podem atendê-lo."""
+    logging.info(f"Buscando horários (qualquer profissional) para salão {salao_id} em {date}")
+    try:
+        salon_data = await get_salon_data(salao_id)
+        if not salon_data: raise HTTPException(status_code=404, detail="Salão não encontrado")
+
+        service_info = salon_data.get("servicos_data", {}).get(service_id)
+        if not service_info: raise HTTPException(status_code=404, detail="Serviço não encontrado.")
+
+        duration = service_info.get('duracao_minutos')
+        if duration is None: raise HTTPException(status_code=500, detail="Duração do serviço não encontrada.")
+
+        slots = await run_blocking(
+            calendar_service.find_available_slots_any_professional,
+            salao_id=salao_id,
+            salon_data=salon_data,
+            service_duration_minutes=duration,
+            date_str=date,
+            service_id=service_id
+        )
+        return {"horarios_disponiveis": slots}
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logging.exception(f"Erro CRÍTICO no cálculo de slots (qualquer profissional):")
+        raise HTTPException(status_code=500, detail="Erro interno ao calcular horários.")
+
+# 🌟 NOVO: Vários dias (e profissionais) em uma única chamada
+@router.get("/saloes/{salao_id}/horarios-disponiveis/periodo")
+async def get_available_slots_range_endpoint(
+    salao_id: str,
+    service_id: str,
+    start_date: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    end_date: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    professional_ids: Optional[List[str]] = Query(None)
+):
+    """
+    Retorna os horários de um intervalo de datas, chaveados por data.
+    Carrega o salão uma vez e faz uma única query de agendamentos para a janela inteira.
+    """
+    logging.info(f"Buscando horários para salão {salao_id} de {start_date} a {end_date} (Profissionais: {professional_ids})")
+
+    start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+    end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+    if end_dt < start_dt:
+        raise HTTPException(status_code=400, detail="end_date deve ser igual ou posterior a start_date.")
+    if (end_dt - start_dt).days + 1 > calendar_service.MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Intervalo máximo de {calendar_service.MAX_RANGE_DAYS} dias.")
+
+    try:
+        salon_data = await get_salon_data(salao_id)
+        if not salon_data: raise HTTPException(status_code=404, detail="Salão não encontrado")
+
+        service_info = salon_data.get("servicos_data", {}).get(service_id)
+        if not service_info: raise HTTPException(status_code=404, detail="Serviço não encontrado.")
+
+        duration = service_info.get('duracao_minutos')
+        if duration is None: raise HTTPException(status_code=500, detail="Duração do serviço não encontrada.")
+
+        slots_by_date = await run_blocking(
+            calendar_service.find_available_slots_range,
+            salao_id=salao_id,
+            salon_data=salon_data,
+            service_duration_minutes=duration,
+            start_date_str=start_date,
+            end_date_str=end_date,
+            professional_ids=professional_ids
+        )
+        return {"horarios_por_data": slots_by_date}
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logging.exception(f"Erro CRÍTICO no cálculo de slots por período:")
+        raise HTTPException(status_code=500, detail="Erro interno ao calcular horários.")
+
 # 🌟 ATUALIZADO: Salva o professional_id
 @router.post("/agendamentos", status_code=status.HTTP_201_CREATED)
-async def create_appointment(appointment: Appointment):
+async def create_appointment(
+    appointment: Appointment,
+    idempotency_key: Optional[str] = Header(None, alias=idempotency.IDEMPOTENCY_HEADER),
+):
+    # Repetição com a mesma Idempotency-Key devolve a resposta original
+    return await idempotency.run(
+        appointment.salao_id, "agendamentos", idempotency_key, appointment,
+        lambda: _create_appointment(appointment),
+    )
+
+
+async def _create_appointment(appointment: Appointment):
     salao_id = appointment.salao_id
     service_id = appointment.service_id
     phone_clean = normalize_phone(appointment.customer_phone)
     
     try:
         # 1. Validações
-        salon_data = get_hairdresser_data_from_db(salao_id) 
+        salon_data = await get_salon_data(salao_id)
         if not salon_data: raise HTTPException(404, "Salão não encontrado")
         
         service_info = salon_data.get("servicos_data", {}).get(service_id)
@@ -260,8 +308,6 @@ async def create_appointment(appointment: Appointment):
         duration = service_info.get('duracao_minutos')
         service_name = service_info.get('nome_servico')
         service_price = float(service_info.get('preco', 0.0)) 
-        salon_name = salon_data.get('nome_salao')
-        salon_email_destino = salon_data.get('calendar_id') 
 
         if duration is None or service_name is None:
             raise HTTPException(status_code=500, detail="Dados do serviço incompletos.")
@@ -269,14 +315,15 @@ async def create_appointment(appointment: Appointment):
         # 3. Verificar Disponibilidade (passando o ID do profissional)
         start_dt = datetime.fromisoformat(appointment.start_time)
         
-        if not calendar_service.is_slot_available(salao_id, salon_data, start_dt, duration, professional_id=appointment.professional_id):
-            raise HTTPException(status_code=409, detail="Horário indisponível para este profissional.")
-            
-        if is_conflict_with_lunch(start_dt, duration, salon_data):
-            raise HTTPException(status_code=409, detail="Conflito com o horário de almoço.")
+        validation = await run_blocking(
+            calendar_service.validate_booking, salao_id, salon_data, start_dt, duration,
+            professional_id=appointment.professional_id
+        )
+        if not validation.ok:
+            raise HTTPException(status_code=409, detail=validation.message)
 
-        # 4. CRM: Vincular Cliente
-        cliente_id = check_and_update_cliente_profile(salao_id, appointment)
+        # 4. CRM: Vincular Cliente (gravado junto com o agendamento)
+        cliente_id, cliente_writes = await run_blocking(prepare_cliente_upsert, salao_id, appointment)
 
         # 5. Salvar Agendamento
         end_dt = start_dt + timedelta(minutes=duration)
@@ -305,47 +352,27 @@ async def create_appointment(appointment: Appointment):
             "channel": "site"
         }
         
-        ref = db.collection('cabeleireiros').document(salao_id).collection('agendamentos').document()
-        ref.set(agendamento_data)
-
-        # 6. Notificações e Google Calendar
+        # 6. Notificações e Google Calendar: itens do outbox gravados junto com o agendamento
+        agendamento_id = agendamentos.ref(salao_id).id
         svc_display = f"{service_name}" + (f" com {appointment.professional_name}" if appointment.professional_name else "")
-        try:
-            if salon_email_destino:
-                email_service.send_confirmation_email_to_salon(salon_email_destino, salon_name, appointment.customer_name, appointment.customer_phone, svc_display, appointment.start_time)
-            if appointment.customer_email:
-                email_service.send_confirmation_email_to_customer(appointment.customer_email, appointment.customer_name, svc_display, appointment.start_time, salon_name, salao_id)
-                
-            if appointment.professional_id: # ou payload.professional_id na rota com pagamento
-             # No caso da rota com pagamento, certifique-se que o status é 'confirmado' ou 'approved'
-             notify_professional_if_assigned(
-                 salao_id, 
-                 appointment.professional_id, # ou payload.professional_id 
-                 agendamento_data, 
-                 salon_name
-             )
-        except Exception as e:
-            logging.error(f"Erro ao enviar e-mails: {e}")
-
-        # Sync Google
-        if salon_data.get("google_sync_enabled") and salon_data.get("google_refresh_token"):
-            try:
-                google_event_data = {
-                    "summary": f"{svc_display} - {appointment.customer_name}",
-                    "description": f"Agendamento via Horalis.\nCliente: {appointment.customer_name}\nTelefone: {appointment.customer_phone}\nServiço: {svc_display}",
-                    "start_time_iso": start_dt.isoformat(),
-                    "end_time_iso": end_dt.isoformat(),
-                }
-                google_event_id = calendar_service.create_google_event_with_oauth(
-                    refresh_token=salon_data.get("google_refresh_token"),
-                    event_data=google_event_data
-                )
-                if google_event_id:
-                    ref.update({"googleEventId": google_event_id})
-            except Exception as e:
-                logging.error(f"Falha na sync Google: {e}")
+        outbox_items = outbox.prepare(salao_id, booking_effects.confirmation_effects(
+            salon_data, agendamento_id, agendamento_data, appointment.start_time, appointment.customer_phone, svc_display
+        ), agendamento_id)
+
+        # Validação + gravação atômicas (agendamento + cliente + outbox): um pedido
+        # concorrente no mesmo horário recebe 409
+        stored_id = await run_blocking(
+            reservations.reserve_and_create, salao_id, agendamento_data, appointment.professional_id,
+            agendamento_id, cliente_writes + outbox_items
+        )
+        if not stored_id:
+            raise HTTPException(status_code=409, detail=calendar_service.BOOKING_REASON_MESSAGES[calendar_service.BOOKING_REASON_CONFLICT])
+        availability_cache.invalidate_for_datetimes(salao_id, start_dt)
+
+        # E-mails e Google rodam no pool do outbox: a resposta não espera o provedor
+        outbox.dispatch(outbox_items)
 
-        return {"message": "Agendamento confirmado!", "id": ref.id}
+        return {"message": "Agendamento confirmado!", "id": agendamento_id}
 
     except HTTPException as he:
         raise he
@@ -356,7 +383,18 @@ async def create_appointment(appointment: Appointment):
 
 # 🌟 ATUALIZADO: Salva o professional_id
 @router.post("/agendamentos/iniciar-pagamento-sinal", status_code=status.HTTP_201_CREATED)
-async def create_appointment_with_payment(payload: AppointmentPaymentPayload):
+async def create_appointment_with_payment(
+    payload: AppointmentPaymentPayload,
+    idempotency_key: Optional[str] = Header(None, alias=idempotency.IDEMPOTENCY_HEADER),
+):
+    # Repetição com a mesma Idempotency-Key não gera nova cobrança nem novo agendamento
+    return await idempotency.run(
+        payload.salao_id, "iniciar-pagamento-sinal", idempotency_key, payload,
+        lambda: _create_appointment_with_payment(payload, idempotency_key),
+    )
+
+
+async def _create_appointment_with_payment(payload: AppointmentPaymentPayload, idempotency_key: Optional[str] = None):
     
     salao_id = payload.salao_id
     service_id = payload.service_id
@@ -365,7 +403,7 @@ async def create_appointment_with_payment(payload: AppointmentPaymentPayload):
 
     try:
         # 1. Validações e Dados
-        salon_data = get_hairdresser_data_from_db(salao_id) 
+        salon_data = await get_salon_data(salao_id)
         if not salon_data: raise HTTPException(404, "Salão não encontrado")
             
         salon_access_token = salon_data.get('mp_access_token')
@@ -381,7 +419,6 @@ async def create_appointment_with_payment(payload: AppointmentPaymentPayload):
         duration = service_info.get('duracao_minutos')
         service_name = service_info.get('nome_servico')
         salon_name = salon_data.get('nome_salao')
-        salon_email_destino = salon_data.get('calendar_id') 
         service_price = float(service_info.get('preco', 0.0))
         
         sinal_valor_backend = float(salon_data.get('sinal_valor', 0.0))
@@ -393,14 +430,16 @@ async def create_appointment_with_payment(payload: AppointmentPaymentPayload):
         start_time_dt = datetime.fromisoformat(payload.start_time)
         
         # 3. Verificação de Horário (passando o ID do profissional)
-        if not calendar_service.is_slot_available(salao_id, salon_data, start_time_dt, duration, professional_id=payload.professional_id):
-            raise HTTPException(409, "Horário indisponível para este profissional.")
-            
-        if is_conflict_with_lunch(start_time_dt, duration, salon_data):
-            raise HTTPException(409, "Conflito com o horário de almoço.")
+        validation = await run_blocking(
+            calendar_service.validate_booking, salao_id, salon_data, start_time_dt, duration,
+            professional_id=payload.professional_id
+        )
+        if not validation.ok:
+            raise HTTPException(409, validation.message)
 
-        # 4. CRM
-        cliente_id = check_and_update_cliente_profile(salao_id, payload)
+        # 4. CRM: o cliente e o índice de contatos só são gravados junto com o PIX gerado
+        #    ou o cartão aprovado (falha na reserva/cobrança não deixa cadastro para trás)
+        cliente_id, cliente_writes = await run_blocking(prepare_cliente_upsert, salao_id, payload)
 
         # 5. Lógica de Salvamento (Pendente)
         end_time_dt = start_time_dt + timedelta(minutes=duration)
@@ -427,8 +466,11 @@ async def create_appointment_with_payment(payload: AppointmentPaymentPayload):
             "paymentStatus": "pending"
         }
         
-        agendamento_ref = db.collection('cabeleireiros').document(salao_id).collection('agendamentos').document()
-        agendamento_ref.set(agendamento_data)
+        agendamento_id = await run_blocking(reservations.reserve_and_create, salao_id, agendamento_data, payload.professional_id)
+        if not agendamento_id:
+            raise HTTPException(409, calendar_service.BOOKING_REASON_MESSAGES[calendar_service.BOOKING_REASON_CONFLICT])
+        agendamento_ref = db.collection('cabeleireiros').document(salao_id).collection('agendamentos').document(agendamento_id)
+        availability_cache.invalidate_for_datetimes(salao_id, start_time_dt)
         logging.info(f"Agendamento 'pending_payment' salvo (Prof: {payload.professional_id}): {agendamento_ref.id}")
 
         # 6. Processar o Pagamento (Lógica MP Mantida)
@@ -443,6 +485,9 @@ async def create_appointment_with_payment(payload: AppointmentPaymentPayload):
         custom_headers = {}
         if device_id_value:
             custom_headers["X-Meli-Session-Id"] = device_id_value
+        if idempotency_key:
+            # O Mercado Pago também deduplica a cobrança pela chave
+            custom_headers["X-Idempotency-Key"] = f"{salao_id}:{idempotency_key.strip()}"
         ro_obj = RequestOptions(custom_headers=custom_headers)
 
         nome_completo = payload.customer_name.strip().split()
@@ -466,10 +511,11 @@ async def create_appointment_with_payment(payload: AppointmentPaymentPayload):
                 "external_reference": external_reference, "notification_url": notification_url, 
                 "additional_info": additional_info, "statement_descriptor": statement_descriptor
             }
-            payment_response = mp_client_do_salao_payment.create(payment_data, request_options=ro_obj)
+            # Chamada HTTP ao Mercado Pago fora do event loop
+            payment_response = await run_blocking(mp_client_do_salao_payment.create, payment_data, request_options=ro_obj)
             
             if payment_response["status"] not in [200, 201]:
-                if agendamento_ref: agendamento_ref.delete()
+                if agendamento_ref: await run_blocking(agendamento_ref.delete)
                 raise Exception(f"Erro MP (PIX): {payment_response.get('response', {}).get('message', 'Erro')}")
 
             payment_result = payment_response["response"]
@@ -477,7 +523,11 @@ async def create_appointment_with_payment(payload: AppointmentPaymentPayload):
 
             if payment_status in ["pending", "in_process"]:
                 qr_code_data = payment_result.get("point_of_interaction", {}).get("transaction_data", {})
-                agendamento_ref.update({"mercadopagoPaymentId": str(payment_result.get("id"))})
+                batch = db.batch()
+                batch.update(agendamento_ref, {"mercadopagoPaymentId": str(payment_result.get("id"))})
+                for cliente_ref, cliente_data in cliente_writes:
+                    batch.set(cliente_ref, cliente_data, merge=True)
+                await run_blocking(batch.commit)
                 
                 return {
                     "status": "pending_pix", "message": "PIX gerado.",
@@ -487,7 +537,7 @@ async def create_appointment_with_payment(payload: AppointmentPaymentPayload):
                     }
                 }
             else:
-                if agendamento_ref: agendamento_ref.delete()
+                if agendamento_ref: await run_blocking(agendamento_ref.delete)
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Falha ao gerar o PIX.")
 
         # --- CASO 2: CARTÃO ---
@@ -501,10 +551,11 @@ async def create_appointment_with_payment(payload: AppointmentPaymentPayload):
                 "external_reference": external_reference, "notification_url": notification_url,
                 "additional_info": additional_info, "statement_descriptor": statement_descriptor
             }
-            payment_response = mp_client_do_salao_payment.create(payment_data, request_options=ro_obj)
+            # Chamada HTTP ao Mercado Pago fora do event loop
+            payment_response = await run_blocking(mp_client_do_salao_payment.create, payment_data, request_options=ro_obj)
 
             if payment_response["status"] not in [200, 201]:
-                if agendamento_ref: agendamento_ref.delete()
+                if agendamento_ref: await run_blocking(agendamento_ref.delete)
                 error_msg = payment_response.get('response', {}).get('message', 'Erro ao processar cartão.')
                 raise Exception(f"Erro MP (Cartão): {error_msg}")
 
@@ -512,53 +563,41 @@ async def create_appointment_with_payment(payload: AppointmentPaymentPayload):
             payment_status = payment_result.get("status")
             
             if payment_status == "approved":
-                agendamento_ref.update({
+                # Confirmação + itens do outbox (e-mails) na mesma escrita
+                svc_display = f"{service_name}" + (f" com {payload.professional_name}" if payload.professional_name else "")
+                outbox_items = outbox.prepare(salao_id, booking_effects.confirmation_effects(
+                    salon_data, agendamento_ref.id, agendamento_data, payload.start_time, payload.customer_phone,
+                    svc_display, include_google=False
+                ), agendamento_ref.id)
+                batch = db.batch()
+                batch.update(agendamento_ref, {
                     "status": "confirmado", 
                     "paymentStatus": "paid_signal",
                     "mercadopagoPaymentId": str(payment_result.get("id"))
                 })
-                
-                # Dispara e-mails e Sync Google
-                svc_display = f"{service_name}" + (f" com {payload.professional_name}" if payload.professional_name else "")
-                try:
-                    if salon_email_destino:
-                        email_service.send_confirmation_email_to_salon(salon_email_destino, salon_name, payload.customer_name, payload.customer_phone, svc_display, payload.start_time)
-                    if payload.customer_email:
-                        email_service.send_confirmation_email_to_customer(payload.customer_email, payload.customer_name, svc_display, payload.start_time, salon_name, salao_id)
-                    
-                    if salon_data.get("google_sync_enabled") and salon_data.get("google_refresh_token"):
-                        # ... (lógica do google sync mantida) ...
-                        pass
-                    
-                    if payload.professional_id: # ou payload.professional_id na rota com pagamento
-                    # No caso da rota com pagamento, certifique-se que o status é 'confirmado' ou 'approved'
-                        notify_professional_if_assigned(
-                            salao_id, 
-                            payload.professional_id, # ou payload.professional_id 
-                            agendamento_data, 
-                            salon_name
-                        )
-                    
-
-                except Exception as e:
-                    logging.error(f"Sinal pago, mas falha nas integrações: {e}")
-                    
-                    
-                    
+                for item_ref, item_data in outbox_items:
+                    batch.set(item_ref, item_data)
+                for cliente_ref, cliente_data in cliente_writes:
+                    batch.set(cliente_ref, cliente_data, merge=True)
+                await run_blocking(batch.commit)
+                outbox.dispatch(outbox_items)
                 
                 return {"status": "approved", "message": "Pagamento aprovado e agendamento confirmado!"}
             
             else:
                 error_detail = payment_response["response"].get("status_detail", "Pagamento rejeitado.")
-                if agendamento_ref: agendamento_ref.delete()
+                if agendamento_ref: await run_blocking(agendamento_ref.delete)
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error_detail)
 
     except HTTPException as httpe: 
-        if agendamento_ref: agendamento_ref.delete()
+        if agendamento_ref:
+            await run_blocking(agendamento_ref.delete)
+            availability_cache.invalidate(salao_id)
         raise httpe
     except Exception as e:
         logging.exception(f"Erro CRÍTICO ao criar agendamento com sinal: {e}")
         if agendamento_ref:
-            try: agendamento_ref.delete()
+            try: await run_blocking(agendamento_ref.delete)
             except Exception: pass
+            availability_cache.invalidate(salao_id)
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,9 +1,8 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from google.cloud.firestore import FieldFilter
-from core.db import db
-from core.auth import get_current_user
+from core.repositories import produtos
+from core.auth import get_current_salao_id
 from datetime import datetime
 
 router = APIRouter(prefix="/admin/estoque", tags=["Estoque"])
@@ -41,44 +40,25 @@ def get_stock_status(qty, min_qty):
 # --- Rotas ---
 
 @router.post("/produtos", status_code=status.HTTP_201_CREATED)
-def create_product(product: ProductCreate, current_user: dict = Depends(get_current_user)):
-    uid = current_user['uid']
-    
-    # Busca ID do Salão
-    query = db.collection('cabeleireiros').where(filter=FieldFilter('ownerUID', '==', uid)).limit(1)
-    docs = list(query.stream())
-    if not docs: raise HTTPException(404, "Salão não encontrado")
-    salao_id = docs[0].id
-
+def create_product(product: ProductCreate, salao_id: str = Depends(get_current_salao_id)):
     try:
         new_prod = product.dict()
         new_prod['createdAt'] = datetime.utcnow()
         
-        doc_ref = db.collection('cabeleireiros').document(salao_id).collection('produtos').document()
-        doc_ref.set(new_prod)
+        prod_id = produtos.create(salao_id, new_prod)
         
-        return {"message": "Produto cadastrado", "id": doc_ref.id}
+        return {"message": "Produto cadastrado", "id": prod_id}
     except Exception as e:
         print(e)
         raise HTTPException(500, "Erro ao salvar produto")
 
 @router.get("/produtos", response_model=List[ProductResponse])
-def list_products(current_user: dict = Depends(get_current_user)):
-    uid = current_user['uid']
-    query = db.collection('cabeleireiros').where(filter=FieldFilter('ownerUID', '==', uid)).limit(1)
-    docs = list(query.stream())
-    if not docs: raise HTTPException(404, "Salão não encontrado")
-    salao_id = docs[0].id
-
+def list_products(salao_id: str = Depends(get_current_salao_id)):
     try:
-        products_ref = db.collection('cabeleireiros').document(salao_id).collection('produtos')
-        docs = products_ref.stream()
-        
         result = []
-        for doc in docs:
-            data = doc.to_dict()
+        for data in produtos.list(salao_id):
             status_stock = get_stock_status(data.get('quantidade_atual', 0), data.get('quantidade_minima', 5))
-            result.append({**data, "id": doc.id, "status": status_stock})
+            result.append({**data, "status": status_stock})
             
         # Ordena: Críticos primeiro, depois Baixos, depois OK
         status_order = {'critical': 0, 'low': 1, 'ok': 2}
@@ -90,48 +70,30 @@ def list_products(current_user: dict = Depends(get_current_user)):
         raise HTTPException(500, "Erro ao listar produtos")
 
 @router.put("/produtos/{prod_id}")
-def update_product(prod_id: str, update: ProductUpdate, current_user: dict = Depends(get_current_user)):
-    uid = current_user['uid']
-    query = db.collection('cabeleireiros').where(filter=FieldFilter('ownerUID', '==', uid)).limit(1)
-    docs = list(query.stream())
-    if not docs: raise HTTPException(404, "Salão não encontrado")
-    salao_id = docs[0].id
-
+def update_product(prod_id: str, update: ProductUpdate, salao_id: str = Depends(get_current_salao_id)):
     try:
-        ref = db.collection('cabeleireiros').document(salao_id).collection('produtos').document(prod_id)
         # Exclude unset para atualizar apenas o que foi enviado
-        ref.update(update.dict(exclude_unset=True))
+        produtos.update(salao_id, prod_id, update.dict(exclude_unset=True))
         return {"message": "Produto atualizado"}
     except Exception as e:
         raise HTTPException(500, "Erro ao atualizar")
 
 @router.delete("/produtos/{prod_id}")
-def delete_product(prod_id: str, current_user: dict = Depends(get_current_user)):
-    uid = current_user['uid']
-    query = db.collection('cabeleireiros').where(filter=FieldFilter('ownerUID', '==', uid)).limit(1)
-    docs = list(query.stream())
-    salao_id = docs[0].id
-    
-    db.collection('cabeleireiros').document(salao_id).collection('produtos').document(prod_id).delete()
+def delete_product(prod_id: str, salao_id: str = Depends(get_current_salao_id)):
+    produtos.delete(salao_id, prod_id)
     return {"message": "Produto removido"}
 
 @router.patch("/produtos/{prod_id}/ajuste")
-def quick_adjust_stock(prod_id: str, amount: int, current_user: dict = Depends(get_current_user)):
+def quick_adjust_stock(prod_id: str, amount: int, salao_id: str = Depends(get_current_salao_id)):
     """
     Rota rápida para +1 ou -1.
     amount pode ser positivo ou negativo.
     """
-    uid = current_user['uid']
-    query = db.collection('cabeleireiros').where(filter=FieldFilter('ownerUID', '==', uid)).limit(1)
-    docs = list(query.stream())
-    salao_id = docs[0].id
-
-    ref = db.collection('cabeleireiros').document(salao_id).collection('produtos').document(prod_id)
-    doc = ref.get()
-    if not doc.exists: raise HTTPException(404, "Produto não encontrado")
+    produto = produtos.get(salao_id, prod_id)
+    if not produto: raise HTTPException(404, "Produto não encontrado")
     
-    current_qty = doc.to_dict().get('quantidade_atual', 0)
+    current_qty = produto.get('quantidade_atual', 0)
     new_qty = max(0, current_qty + amount) # Não permite negativo
     
-    ref.update({'quantidade_atual': new_qty})
+    produtos.update(salao_id, prod_id, {'quantidade_atual': new_qty})
     return {"new_quantity": new_qty}
\ No newline at end of file
@@ -20,27 +20,42 @@ QUERY_INTERVAL_MINUTES = 10
 # (Configuração do fuso, movida para dentro da inicialização do Firebase)
 
 # --- INICIALIZAÇÃO DO FIREBASE (Standalone) ---
-try:
-    if not firebase_admin._apps:
-        cred_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS", "credentials.json")
-        if not os.path.exists(cred_path) and os.path.exists("../credentials.json"):
-             cred_path = "../credentials.json"
-        elif not os.path.exists(cred_path) and os.path.exists("backend/credentials.json"):
-             cred_path = "backend/credentials.json"
-
-        if not os.path.exists(cred_path):
-            raise FileNotFoundError(f"Credencial Firebase não encontrada: {cred_path}")
-
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-        logging.info(f"[Scheduler] Firebase Admin SDK inicializado com: {cred_path}")
-    
-    db = firestore.client()
+# HORALIS_DATA_BACKEND=memory: roda contra o store em memória (mesma interface do
+# Firestore), populado por HORALIS_MEMORY_FIXTURE e/ou HORALIS_MEMORY_DEMO_SALOES
+DATA_BACKEND = os.environ.get("HORALIS_DATA_BACKEND", "firestore").strip().lower()
+
+if DATA_BACKEND == "memory":
+    from backend.core.memory_store import MemoryClient, load_fixture, seed_demo_data
+
+    db = MemoryClient()
+    if os.environ.get("HORALIS_MEMORY_FIXTURE"):
+        load_fixture(db, os.environ["HORALIS_MEMORY_FIXTURE"])
+    if int(os.environ.get("HORALIS_MEMORY_DEMO_SALOES", 0)):
+        seed_demo_data(db, saloes=int(os.environ["HORALIS_MEMORY_DEMO_SALOES"]))
     TARGET_TZ = pytz.timezone("America/Sao_Paulo")
-except Exception as e:
-    logging.error(f"[Scheduler] Falha CRÍTICA ao inicializar Firebase: {e}")
-    db = None
-    TARGET_TZ = None
+    logging.warning("[Scheduler] HORALIS_DATA_BACKEND=memory: usando o store em memória.")
+else:
+    try:
+        if not firebase_admin._apps:
+            cred_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS", "credentials.json")
+            if not os.path.exists(cred_path) and os.path.exists("../credentials.json"):
+                 cred_path = "../credentials.json"
+            elif not os.path.exists(cred_path) and os.path.exists("backend/credentials.json"):
+                 cred_path = "backend/credentials.json"
+
+            if not os.path.exists(cred_path):
+                raise FileNotFoundError(f"Credencial Firebase não encontrada: {cred_path}")
+
+            cred = credentials.Certificate(cred_path)
+            firebase_admin.initialize_app(cred)
+            logging.info(f"[Scheduler] Firebase Admin SDK inicializado com: {cred_path}")
+    
+        db = firestore.client()
+        TARGET_TZ = pytz.timezone("America/Sao_Paulo")
+    except Exception as e:
+        logging.error(f"[Scheduler] Falha CRÍTICA ao inicializar Firebase: {e}")
+        db = None
+        TARGET_TZ = None
 # --- FIM DA INICIALIZAÇÃO ---
 
 
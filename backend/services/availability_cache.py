@@ -0,0 +1,74 @@
+# backend/services/availability_cache.py
+# Cache dos horários disponíveis por (salao_id, data, profissional, duração).
+# As rotas de escrita (criar, cancelar, reagendar, webhook) invalidam
+# explicitamente o salão/dia afetado; mudanças no salão, serviços ou equipe
+# (inclusive de outro worker, via listener do core/db) limpam o salão inteiro.
+# O TTL curto cobre o "hoje" (os slots passados somem com o relógio) e os
+# agendamentos gravados por outros workers.
+import logging
+import os
+from datetime import datetime
+from typing import Any, List, Optional
+
+import pytz
+
+from core.cache import StatsTTLCache
+from core.db import on_salon_invalidated
+from services import google_busy_service
+
+LOCAL_TIMEZONE = 'America/Sao_Paulo'
+AVAILABILITY_CACHE_TTL_SECONDS = int(os.environ.get("AVAILABILITY_CACHE_TTL_SECONDS", 60))
+AVAILABILITY_CACHE_MAXSIZE = int(os.environ.get("AVAILABILITY_CACHE_MAXSIZE", 4096))
+
+_cache = StatsTTLCache(
+    name="availability",
+    maxsize=AVAILABILITY_CACHE_MAXSIZE,
+    ttl=AVAILABILITY_CACHE_TTL_SECONDS,
+)
+
+
+def _key(salao_id: str, date_str: str, professional_id: Optional[str], duration: int):
+    return (salao_id, date_str, professional_id or None, int(duration))
+
+
+def get_slots(salao_id: str, date_str: str, professional_id: Optional[str], duration: int) -> Optional[List[str]]:
+    """Retorna a lista em cache (cópia) ou None em caso de miss."""
+    slots = _cache.get(_key(salao_id, date_str, professional_id, duration))
+    return list(slots) if slots is not None else None
+
+
+def set_slots(salao_id: str, date_str: str, professional_id: Optional[str], duration: int, slots: List[str]) -> None:
+    _cache.set(_key(salao_id, date_str, professional_id, duration), tuple(slots))
+
+
+def invalidate(salao_id: str, date_str: Optional[str] = None) -> int:
+    """Invalida um dia do salão (ou o salão inteiro se date_str for None)."""
+    removed = _cache.invalidate_where(
+        lambda key: key[0] == salao_id and (date_str is None or key[1] == date_str)
+    )
+    # O evento criado/removido no Google também muda o freeBusy do dia
+    google_busy_service.invalidate(salao_id, date_str)
+    if removed:
+        logging.info(f"Cache de disponibilidade: {removed} entradas invalidadas ({salao_id}, {date_str or 'todas as datas'}).")
+    return removed
+
+
+def invalidate_for_datetimes(salao_id: str, *datetimes: Any) -> None:
+    """
+    Invalida os dias (no fuso local) dos datetimes informados. Ignora valores vazios.
+    Datetimes sem fuso são tratados como UTC (mesma regra do is_slot_available).
+    """
+    local_tz = pytz.timezone(LOCAL_TIMEZONE)
+    for dt in datetimes:
+        if not isinstance(dt, datetime):
+            continue
+        if dt.tzinfo is None:
+            dt = pytz.utc.localize(dt)
+        invalidate(salao_id, dt.astimezone(local_tz).date().isoformat())
+
+
+def stats():
+    return _cache.stats()
+
+
+on_salon_invalidated(invalidate)
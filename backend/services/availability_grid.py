@@ -0,0 +1,122 @@
+# backend/services/availability_grid.py
+# Grade de disponibilidade (profissional × dia) em bitmaps de minutos.
+# Cada linha é um inteiro Python em que o bit m = 1 significa "minuto m do dia
+# livre". Ocupações e almoço viram máscaras e saem com um AND; os inícios
+# possíveis para uma duração D saem com O(log D) deslocamentos + AND sobre a
+# linha inteira, sem percorrer minuto a minuto. A mesma grade atende qualquer
+# duração de serviço.
+from dataclasses import dataclass, field
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.slot_engine import MINUTES_PER_DAY, Interval
+
+# Ocupações podem atravessar a meia-noite; a linha cobre um dia e meio para
+# que um serviço que termina depois das 23:59 continue sendo rejeitado.
+ROW_BITS = MINUTES_PER_DAY + MINUTES_PER_DAY // 2
+
+
+def _range_mask(start: int, end: int) -> int:
+    start, end = max(start, 0), min(end, ROW_BITS)
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+def free_mask(window_start: int, window_end: int, busy: Iterable[Interval]) -> int:
+    """Bitmap dos minutos livres: janela de trabalho menos os períodos ocupados."""
+    mask = _range_mask(window_start, window_end)
+    for start, end in busy:
+        mask &= ~_range_mask(start, end)
+    return mask
+
+
+def feasible_mask(free: int, duration: int) -> int:
+    """
+    Bit s = 1 se os minutos [s, s + duration) estão todos livres.
+    Duplica o tamanho da sequência a cada passo (AND com a própria máscara deslocada).
+    """
+    if duration <= 0:
+        return free
+    result, span = free, 1
+    while span * 2 <= duration:
+        result &= result >> span
+        span *= 2
+    if span < duration:
+        result &= result >> (duration - span)
+    return result
+
+
+@lru_cache(maxsize=256)
+def _candidate_mask(first: int, step: int) -> int:
+    """Bits first, first + step, first + 2*step... até o fim da linha."""
+    mask = 0
+    for minute in range(first, ROW_BITS, step):
+        mask |= 1 << minute
+    return mask
+
+
+def _bits(mask: int) -> List[int]:
+    positions = []
+    while mask:
+        low = mask & -mask
+        positions.append(low.bit_length() - 1)
+        mask ^= low
+    return positions
+
+
+def aligned_starts(free: int, cursor: int, duration: int, step: int) -> List[int]:
+    """
+    Inícios livres com a MESMA regra de alinhamento do slot_engine.free_starts:
+    os candidatos seguem a fase do cursor até o primeiro conflito; daí em diante
+    a busca pula para múltiplos de 'step' (fase 0).
+    """
+    feasible = feasible_mask(free, duration)
+    cursor_candidates = _candidate_mask(cursor, step)
+    phase = cursor % step
+    if phase == 0:
+        return _bits(feasible & cursor_candidates)
+
+    blocked = cursor_candidates & ~feasible
+    if not blocked:
+        return _bits(feasible & cursor_candidates)
+    first_conflict = (blocked & -blocked).bit_length() - 1
+    before = feasible & cursor_candidates & ((1 << first_conflict) - 1)
+    after = feasible & _candidate_mask(cursor - phase + step, step) & ~((1 << first_conflict) - 1)
+    return _bits(before | after)
+
+
+@dataclass
+class GridRow:
+    """Uma linha (profissional, dia): bitmap livre e o início da busca (abertura ou 'agora')."""
+    free: int
+    cursor: int
+
+
+@dataclass
+class AvailabilityGrid:
+    """
+    Grade montada uma vez a partir da agenda compilada e dos períodos ocupados.
+    Chave das linhas: (professional_id ou None, dia).
+    """
+    step: int
+    rows: Dict[Tuple[Optional[str], date], GridRow] = field(default_factory=dict)
+
+    def add_row(self, professional_id: Optional[str], day: date, window_start: int, window_end: int,
+                busy: Iterable[Interval], not_before: Optional[int] = None) -> None:
+        cursor = window_start if not_before is None else max(window_start, not_before)
+        self.rows[(professional_id, day)] = GridRow(free_mask(window_start, window_end, busy), cursor)
+
+    def starts(self, professional_id: Optional[str], day: date, duration: int) -> List[int]:
+        row = self.rows.get((professional_id, day))
+        if row is None or not row.free:
+            return []
+        return aligned_starts(row.free, row.cursor, duration, self.step)
+
+    def starts_by_row(self, duration: int) -> Dict[Tuple[Optional[str], date], List[int]]:
+        return {key: self.starts(key[0], key[1], duration) for key in self.rows}
+
+    def free_minutes(self, professional_id: Optional[str], day: date) -> int:
+        row = self.rows.get((professional_id, day))
+        return bin(row.free).count('1') if row else 0
@@ -0,0 +1,106 @@
+# backend/services/booking_effects.py
+# Efeitos de um agendamento confirmado, executados pelo outbox (services/outbox.py):
+# e-mail ao salão, e-mail ao cliente, e-mail ao profissional e evento no Google Calendar.
+# confirmation_effects() monta os itens na rota; os executores abaixo rodam no pool.
+# Os payloads levam só texto (datas em ISO) para caber no documento do outbox.
+# Cada executor levanta exceção quando o envio falha, para o outbox tentar de novo.
+import logging
+from typing import Any, Dict, List
+
+from core.db import get_hairdresser_data_from_db
+from core.repositories import agendamentos, profissionais
+from services import calendar_service, email_service, outbox
+from services.calendar_service import CANCELLED_STATUSES
+
+EMAIL_SALON = "email_confirmacao_salao"
+EMAIL_CUSTOMER = "email_confirmacao_cliente"
+EMAIL_PROFESSIONAL = "email_profissional"
+GOOGLE_EVENT = "google_evento"
+
+
+def confirmation_effects(
+    salon_data: Dict[str, Any],
+    agendamento_id: str,
+    agendamento_data: Dict[str, Any],
+    start_time_iso: str,
+    customer_phone: str,
+    service_display: str,
+    include_google: bool = True,
+) -> List[outbox.Effect]:
+    """Itens do outbox para um agendamento confirmado (mesmas regras do envio inline antigo)."""
+    salon_name = salon_data.get('nome_salao')
+    customer_name = agendamento_data['customerName']
+    effects = []
+    if salon_data.get('calendar_id'):
+        effects.append((EMAIL_SALON, {
+            "salon_email": salon_data['calendar_id'], "salon_name": salon_name,
+            "customer_name": customer_name, "client_phone": customer_phone,
+            "service_name": service_display, "start_time_iso": start_time_iso,
+        }))
+    if agendamento_data.get('customerEmail'):
+        effects.append((EMAIL_CUSTOMER, {
+            "customer_email": agendamento_data['customerEmail'], "customer_name": customer_name,
+            "service_name": service_display, "start_time_iso": start_time_iso, "salon_name": salon_name,
+        }))
+    if agendamento_data.get('professionalId'):
+        effects.append((EMAIL_PROFESSIONAL, {
+            "professional_id": agendamento_data['professionalId'],
+            "customer_name": customer_name, "customer_phone": agendamento_data['customerPhone'],
+            "service_name": agendamento_data['serviceName'],
+            "start_time_iso": agendamento_data['startTime'].isoformat(), "salon_name": salon_name,
+        }))
+    if include_google and salon_data.get("google_sync_enabled") and salon_data.get("google_refresh_token"):
+        effects.append((GOOGLE_EVENT, {
+            "agendamento_id": agendamento_id,
+            "summary": f"{service_display} - {customer_name}",
+            "description": f"Agendamento via Horalis.\nCliente: {customer_name}\nTelefone: {customer_phone}\nServiço: {service_display}",
+            "start_time_iso": agendamento_data['startTime'].isoformat(),
+            "end_time_iso": agendamento_data['endTime'].isoformat(),
+        }))
+    return effects
+
+
+def _require(sent: bool, what: str) -> None:
+    if not sent:
+        raise RuntimeError(f"Falha ao enviar {what}")
+
+
+@outbox.register(EMAIL_SALON)
+def _send_salon_email(salao_id: str, payload: Dict[str, Any]) -> None:
+    _require(email_service.send_confirmation_email_to_salon(**payload), "e-mail ao salão")
+
+
+@outbox.register(EMAIL_CUSTOMER)
+def _send_customer_email(salao_id: str, payload: Dict[str, Any]) -> None:
+    _require(email_service.send_confirmation_email_to_customer(**payload, salao_id=salao_id), "e-mail ao cliente")
+
+
+@outbox.register(EMAIL_PROFESSIONAL)
+def _send_professional_email(salao_id: str, payload: Dict[str, Any]) -> None:
+    payload = dict(payload)
+    pro_data = profissionais.get(salao_id, payload.pop("professional_id"))
+    if not pro_data or not pro_data.get('email'):
+        return  # Sem e-mail cadastrado: nada a enviar
+    _require(email_service.send_new_appointment_email_to_professional(
+        pro_email=pro_data['email'], pro_name=pro_data.get('nome', 'Profissional'), **payload
+    ), "e-mail ao profissional")
+
+
+@outbox.register(GOOGLE_EVENT)
+def _create_google_event(salao_id: str, payload: Dict[str, Any]) -> None:
+    agendamento_id = payload["agendamento_id"]
+    agendamento = agendamentos.get(salao_id, agendamento_id)
+    if agendamento is None or agendamento.get('status') in CANCELLED_STATUSES:
+        return  # Cancelado/removido antes da sincronização
+    if agendamento.get('googleEventId'):
+        return  # Tentativa anterior já criou o evento
+    salon_data = get_hairdresser_data_from_db(salao_id) or {}
+    refresh_token = salon_data.get("google_refresh_token")
+    if not (salon_data.get("google_sync_enabled") and refresh_token):
+        return  # Sincronização desligada depois do agendamento
+    event_data = {key: payload[key] for key in ("summary", "description", "start_time_iso", "end_time_iso")}
+    google_event_id = calendar_service.create_google_event_with_oauth(refresh_token=refresh_token, event_data=event_data)
+    if not google_event_id:
+        raise RuntimeError("Google Calendar não criou o evento")
+    agendamentos.update(salao_id, agendamento_id, {"googleEventId": google_event_id})
+    logging.info(f"Evento Google {google_event_id} vinculado ao agendamento {agendamento_id}.")
@@ -1,15 +1,17 @@
 import logging
 import pytz
 import os
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional 
-from google.cloud.firestore import FieldFilter
+from typing import List, Dict, Any, Optional, Tuple
 
 from core.db import db # Firestore DB
+from core.repositories import agendamentos, profissionais
+from core.schedule import DaySchedule, WeeklySchedule, get_schedule_book
+from services import slot_engine, availability_cache, google_busy_service, google_client_pool
+from services.availability_grid import AvailabilityGrid
 
 # --- IMPORTS PARA GOOGLE OAUTH ---
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 logging.basicConfig(level=logging.INFO)
@@ -22,10 +24,6 @@ WEEKDAY_MAP_DB = {
 }
 SLOT_INTERVAL_MINUTES = 30
 
-GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_OAUTH_CLIENT_ID")
-GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_OAUTH_CLIENT_SECRET")
-SCOPES = ['https://www.googleapis.com/auth/calendar'] 
-
 
 # ----------------------------------------------------
 # >>> FUNÇÃO DE VALIDAÇÃO CRÍTICA (ALMOÇO) <<<
@@ -34,10 +32,11 @@ SCOPES = ['https://www.googleapis.com/auth/calendar']
 def is_conflict_with_lunch(
     booking_start_dt: datetime, 
     service_duration_minutes: int, 
-    salon_data: Dict[str, Any]
+    schedule: WeeklySchedule
 ) -> bool:
     """
-    Verifica se um agendamento entra em conflito com o horário de almoço do salão.
+    Verifica se um agendamento entra em conflito com o horário de almoço,
+    usando a agenda compilada (do salão ou do profissional).
     """
     try:
         timezone = pytz.timezone(LOCAL_TIMEZONE)
@@ -49,37 +48,12 @@ def is_conflict_with_lunch(
             booking_local = booking_start_dt.astimezone(timezone)
 
         # 2. Pega a configuração do dia
-        day_name = booking_local.strftime('%A').lower()
-        daily_schedule = salon_data.get('horario_trabalho_detalhado', {}).get(day_name)
-
-        if not daily_schedule: return False
-        
-        # 3. Verifica se almoço existe e está configurado
-        if not daily_schedule.get('hasLunch'): return False
-        
-        lunch_start_str = daily_schedule.get('lunchStart')
-        lunch_end_str = daily_schedule.get('lunchEnd')
-        
-        if not lunch_start_str or not lunch_end_str: return False
+        day_schedule = schedule.for_date(booking_local.date())
+        if not day_schedule or not day_schedule.lunch: return False
 
-        # 4. Monta os objetos de data do almoço com FUSO HORÁRIO
-        date_local = booking_local.date()
-        
-        lunch_start_time = datetime.strptime(lunch_start_str, '%H:%M').time()
-        lunch_end_time = datetime.strptime(lunch_end_str, '%H:%M').time()
-
-        lunch_start_dt = timezone.localize(datetime.combine(date_local, lunch_start_time))
-        lunch_end_dt = timezone.localize(datetime.combine(date_local, lunch_end_time))
-        
-        # 5. Calcula fim do agendamento
-        booking_end_local = booking_local + timedelta(minutes=service_duration_minutes)
-
-        # 6. Verifica sobreposição
-        if (booking_local < lunch_end_dt) and (booking_end_local > lunch_start_dt):
-            # logging.info(f"CONFLITO DE ALMOÇO: {booking_local.time()} colide com {lunch_start_str}-{lunch_end_str}")
-            return True
-            
-        return False
+        # 3. Verifica sobreposição (minutos do dia)
+        start_minute = booking_local.hour * 60 + booking_local.minute
+        return day_schedule.lunch_overlaps(start_minute, start_minute + service_duration_minutes)
 
     except Exception as e:
         logging.error(f"Erro ao verificar almoço: {e}")
@@ -90,26 +64,8 @@ def is_conflict_with_lunch(
 # ----------------------------------------------------
 
 def get_google_calendar_service(refresh_token: str):
-    if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
-        logging.error("Credenciais OAuth (Client ID/Secret) não configuradas no ambiente.")
-        return None
-    
-    try:
-        creds = Credentials.from_authorized_user_info(
-            info={
-                "refresh_token": refresh_token,
-                "client_id": GOOGLE_CLIENT_ID,
-                "client_secret": GOOGLE_CLIENT_SECRET,
-                "token_uri": "https://oauth2.googleapis.com/token" 
-            },
-            scopes=SCOPES 
-        )
-        service = build('calendar', 'v3', credentials=creds, cache_discovery=False)
-        return service
-        
-    except Exception:
-        logging.exception(f"Falha CRÍTICA ao criar serviço Google Calendar com refresh_token.")
-        return None
+    """Cliente do Google Calendar do pool (reaproveita o access_token até expirar)."""
+    return google_client_pool.get_service(refresh_token)
 
 def create_google_event_with_oauth(refresh_token: str, event_data: Dict[str, Any]) -> Optional[str]:
     google_service = get_google_calendar_service(refresh_token)
@@ -143,6 +99,104 @@ def delete_google_event(refresh_token: str, event_id: str) -> bool:
         logging.exception(f"Erro inesperado ao DELETAR evento {event_id}:")
         return False
 
+# ----------------------------------------------------
+# --- HELPERS DE DISPONIBILIDADE (Compartilhados) ---
+# ----------------------------------------------------
+
+CANCELLED_STATUSES = ['cancelado', 'rejeitado', 'canceled', 'rejected']
+MAX_RANGE_DAYS = 31
+
+def _load_professionals(salao_id: str, professional_ids: List[str]) -> Dict[str, dict]:
+    """Carrega vários profissionais em UMA ida ao banco (get_all). Retorna {id: dados}."""
+    return profissionais.get_many(salao_id, professional_ids)
+
+def _query_busy_periods(
+    salao_id: str,
+    start_utc: datetime,
+    end_utc: datetime,
+    professional_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Busca os agendamentos ativos de uma janela em UMA query e devolve
+    os períodos ocupados já no fuso local ({'start', 'end', 'professionalId'}).
+    """
+    local_tz = pytz.timezone(LOCAL_TIMEZONE)
+
+    # 🌟 FILTRO DE PROFISSIONAL NO BANCO 🌟
+    # (Sem profissional selecionado, assumimos que sem profissional = olha tudo)
+    busy_periods = []
+    for data in agendamentos.in_range(salao_id, start_utc, end_utc, professional_id=professional_id):
+        # Ignora cancelados
+        if data.get('status') in CANCELLED_STATUSES: continue
+
+        appt_start = data.get('startTime')
+        appt_end = data.get('endTime')
+        if appt_start and appt_end:
+            if appt_start.tzinfo is None: appt_start = pytz.utc.localize(appt_start)
+            if appt_end.tzinfo is None: appt_end = pytz.utc.localize(appt_end)
+
+            busy_periods.append({
+                'start': appt_start.astimezone(local_tz),
+                'end': appt_end.astimezone(local_tz),
+                'professionalId': data.get('professionalId'),
+                'id': data['id'],
+            })
+    return busy_periods
+
+def _search_start_minute(target_date_local) -> Optional[int]:
+    """Para hoje, a busca começa no próximo intervalo depois de agora; nos outros dias, na abertura."""
+    now_local = datetime.now(pytz.timezone(LOCAL_TIMEZONE))
+    if target_date_local != now_local.date():
+        return None
+    now_minutes = now_local.hour * 60 + now_local.minute
+    return now_minutes - (now_minutes % SLOT_INTERVAL_MINUTES) + SLOT_INTERVAL_MINUTES
+
+def _busy_minutes(target_date_local, day_schedule: DaySchedule, busy_periods: List[Dict[str, Any]]) -> List[tuple]:
+    """Períodos ocupados (agendamentos + almoço) em minutos do dia."""
+    busy = [
+        (slot_engine.datetime_to_day_minutes(p['start'], target_date_local),
+         slot_engine.datetime_to_day_minutes(p['end'], target_date_local))
+        for p in busy_periods
+    ]
+    if day_schedule.lunch:
+        busy.append(day_schedule.lunch)
+    return busy
+
+def _compute_day_starts(
+    target_date_local,
+    day_schedule: DaySchedule,
+    busy_periods: List[Dict[str, Any]],
+    service_duration_minutes: int
+) -> List[int]:
+    """
+    Calcula os inícios livres (minutos do dia) de UM dia a partir da agenda
+    compilada do dia e dos períodos ocupados.
+    """
+    # 5. Ponto de Partida da Busca (hoje: próximo intervalo depois de agora)
+    not_before = _search_start_minute(target_date_local)
+
+    # 6/7. Ocupados (agendamentos + almoço) em minutos
+    busy = _busy_minutes(target_date_local, day_schedule, busy_periods)
+
+    # 8. Varredura dos vãos
+    return slot_engine.free_starts(
+        day_schedule.open_minute, day_schedule.close_minute, busy, service_duration_minutes,
+        SLOT_INTERVAL_MINUTES, not_before=not_before
+    )
+
+def _compute_day_slots(
+    target_date_local,
+    day_schedule: DaySchedule,
+    busy_periods: List[Dict[str, Any]],
+    service_duration_minutes: int
+) -> List[str]:
+    """
+    Calcula os slots livres de UM dia a partir da agenda compilada e dos períodos ocupados.
+    O cálculo roda no slot_engine (minutos inteiros); o ISO só é gerado no final.
+    """
+    starts = _compute_day_starts(target_date_local, day_schedule, busy_periods, service_duration_minutes)
+    return slot_engine.starts_to_iso(target_date_local, starts, LOCAL_TIMEZONE)
+
 # ----------------------------------------------------
 # >>> FUNÇÃO PRINCIPAL: ENCONTRAR SLOTS DISPONÍVEIS <<<
 # ----------------------------------------------------
@@ -163,265 +217,553 @@ def find_available_slots(
     """
     if db is None: return []
 
-    available_slots_iso = [] 
-    
+    cached = availability_cache.get_slots(salao_id, date_str, professional_id, service_duration_minutes)
+    if cached is not None:
+        return cached
+
     try:
         # 1. Configuração de Fuso e Datas
         local_tz = pytz.timezone(LOCAL_TIMEZONE)
         target_date_local = datetime.strptime(date_str, '%Y-%m-%d').date()
-        day_of_week_name = WEEKDAY_MAP_DB.get(target_date_local.weekday())
         
-        # 2. Obter Configuração Base do Salão
-        salon_daily = salon_data.get('horario_trabalho_detalhado', {}).get(day_of_week_name)
+        # 2. Agenda compilada do Salão
+        book = get_schedule_book(salon_data)
 
-        # Se o salão está fechado, ninguém atende
-        if not salon_daily or not salon_daily.get('isOpen'):
-            return []
-        
-        # Definições Iniciais (Base Salão)
-        start_hour_str = salon_daily.get('openTime', '09:00')
-        end_hour_str = salon_daily.get('closeTime', '18:00')
-        
-        has_lunch = salon_daily.get('hasLunch', False)
-        lunch_start_str = salon_daily.get('lunchStart')
-        lunch_end_str = salon_daily.get('lunchEnd')
-
-        # 3. SOBRESCRITA PELO PROFISSIONAL (Lógica de Interseção)
-        if professional_id:
+        # Se o salão está fechado, ninguém atende (evita a leitura do profissional)
+        day_schedule = book.salon.for_date(target_date_local)
+        if day_schedule and professional_id:
+            # 3. Interseção com a agenda do profissional (compilada e guardada no book)
             try:
-                # Busca configurações do profissional
-                pro_ref = db.collection('cabeleireiros').document(salao_id).collection('profissionais').document(professional_id)
-                pro_doc = pro_ref.get()
-                
-                if pro_doc.exists:
-                    pro_data = pro_doc.to_dict()
-                    # Verifica se o profissional tem configuração específica para este dia
-                    pro_daily = pro_data.get('horario_trabalho', {}).get(day_of_week_name)
-                    
-                    if pro_daily:
-                        # Se o profissional folga neste dia, não há horários
-                        if not pro_daily.get('isOpen', True):
-                            return []
-                        
-                        # Pega horários do profissional (ou usa o do salão se vazio)
-                        pro_start = pro_daily.get('openTime')
-                        pro_end = pro_daily.get('closeTime')
-                        
-                        # Lógica de Interseção (O "Mais Restritivo" ganha)
-                        # Início: O mais tarde entre Salão e Profissional
-                        if pro_start and pro_start > start_hour_str:
-                            start_hour_str = pro_start
-                        
-                        # Fim: O mais cedo entre Salão e Profissional
-                        if pro_end and pro_end < end_hour_str:
-                            end_hour_str = pro_end
-                            
-                        # Se após a interseção o início for depois do fim, dia inválido
-                        if start_hour_str >= end_hour_str:
-                            return []
-
-                        # Sobrescreve almoço se o profissional tiver o dele configurado
-                        if 'hasLunch' in pro_daily:
-                            has_lunch = pro_daily['hasLunch']
-                            if has_lunch:
-                                lunch_start_str = pro_daily.get('lunchStart', lunch_start_str)
-                                lunch_end_str = pro_daily.get('lunchEnd', lunch_end_str)
-
+                pro_data = _load_professionals(salao_id, [professional_id]).get(professional_id)
+                if pro_data:
+                    day_schedule = book.for_professional(professional_id, pro_data.get('horario_trabalho')).for_date(target_date_local)
             except Exception as e:
                 logging.error(f"Erro ao carregar agenda do profissional: {e}")
                 # Em caso de erro, segue com a agenda do salão (fallback)
 
-        # 4. Converte Strings Finais para Datetime
-        start_work_time = datetime.strptime(start_hour_str, '%H:%M').time()
-        end_work_time = datetime.strptime(end_hour_str, '%H:%M').time()
+        if not day_schedule:
+            availability_cache.set_slots(salao_id, date_str, professional_id, service_duration_minutes, [])
+            return []
 
-        day_start_dt = local_tz.localize(datetime.combine(target_date_local, start_work_time))
-        day_end_dt = local_tz.localize(datetime.combine(target_date_local, end_work_time))
+        # 6. COLETA DE HORÁRIOS OCUPADOS (FIRESTORE)
+        midnight = local_tz.localize(datetime.combine(target_date_local, datetime.min.time()))
+        day_start_utc = (midnight + timedelta(minutes=day_schedule.open_minute)).astimezone(pytz.utc)
+        day_end_utc = (midnight + timedelta(minutes=day_schedule.close_minute)).astimezone(pytz.utc) + timedelta(hours=3)
 
-        # 5. Ponto de Partida da Busca
-        now_local = datetime.now(local_tz)
-        if target_date_local == now_local.date():
-            minutes_to_next_interval = SLOT_INTERVAL_MINUTES - (now_local.minute % SLOT_INTERVAL_MINUTES)
-            start_search_today = now_local.replace(second=0, microsecond=0) + timedelta(minutes=minutes_to_next_interval)
-            search_from = max(start_search_today, day_start_dt)
-        else:
-            search_from = day_start_dt
+        busy_periods = _query_busy_periods(salao_id, day_start_utc, day_end_utc, professional_id)
+        # Eventos do Google (agenda do dono) bloqueiam o salão inteiro
+        busy_periods += google_busy_service.get_busy_periods(salao_id, salon_data, target_date_local)
 
-        if search_from >= day_end_dt: return []
+        slots = _compute_day_slots(target_date_local, day_schedule, busy_periods, service_duration_minutes)
+        availability_cache.set_slots(salao_id, date_str, professional_id, service_duration_minutes, slots)
+        return slots
 
-        # 6. COLETA DE HORÁRIOS OCUPADOS (FIRESTORE)
-        busy_periods = [] 
-        
-        day_start_utc = day_start_dt.astimezone(pytz.utc)
-        day_end_utc = day_end_dt.astimezone(pytz.utc) + timedelta(hours=3) 
+    except Exception as e:
+        logging.exception(f"Erro no cálculo de slots: {e}")
+        return []
 
-        agendamentos_ref = db.collection('cabeleireiros').document(salao_id).collection('agendamentos')
-        
-        # Query Base
-        query = agendamentos_ref.where(filter=FieldFilter("startTime", ">=", day_start_utc))\
-                                .where(filter=FieldFilter("startTime", "<=", day_end_utc))
-        
-        # 🌟 FILTRO DE PROFISSIONAL NO BANCO 🌟
-        if professional_id:
-            # Se tem profissional, traz os agendamentos DELE
-            query = query.where(filter=FieldFilter("professionalId", "==", professional_id))
+def find_available_slots_range(
+    salao_id: str,
+    salon_data: dict,
+    service_duration_minutes: int,
+    start_date_str: str,
+    end_date_str: str,
+    professional_ids: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Versão em lote de find_available_slots para vários dias (e opcionalmente vários profissionais).
+    Faz UMA query de agendamentos para toda a janela e agrupa os resultados em memória.
+
+    Retorno (chaveado por data 'YYYY-MM-DD'):
+    - Sem profissionais: {data: [slots]}
+    - Com profissionais: {data: {professional_id: [slots]}}
+    """
+    if db is None: return {}
+
+    local_tz = pytz.timezone(LOCAL_TIMEZONE)
+    start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+    end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+    # 0. Cache: se todos os (dia, profissional) já estão em cache, não vai ao banco
+    cached_result: Dict[str, Any] = {}
+    for day in days:
+        day_str = day.isoformat()
+        if not professional_ids:
+            slots = availability_cache.get_slots(salao_id, day_str, None, service_duration_minutes)
+            if slots is None: break
+            cached_result[day_str] = slots
         else:
-            # Se NÃO tem profissional selecionado (ou é agendamento geral), 
-            # buscamos agendamentos que também não têm profissional ou bloqueiam a agenda geral.
-            # (Esta lógica pode variar dependendo da regra de negócio, aqui assumimos que sem profissional = olha tudo)
-            pass
-        
-        docs = query.stream()
-
-        for doc in docs:
-            data = doc.to_dict()
-            # Ignora cancelados
-            if data.get('status') in ['cancelado', 'rejeitado', 'canceled', 'rejected']: continue
-                
-            appt_start = data.get('startTime')
-            appt_end = data.get('endTime')
-            
-            if appt_start and appt_end:
-                if appt_start.tzinfo is None: appt_start = pytz.utc.localize(appt_start)
-                if appt_end.tzinfo is None: appt_end = pytz.utc.localize(appt_end)
-                
-                busy_periods.append({
-                    'start': appt_start.astimezone(local_tz),
-                    'end': appt_end.astimezone(local_tz)
-                })
+            per_pro = {}
+            for pro_id in professional_ids:
+                slots = availability_cache.get_slots(salao_id, day_str, pro_id, service_duration_minutes)
+                if slots is None: break
+                per_pro[pro_id] = slots
+            if len(per_pro) != len(professional_ids): break
+            cached_result[day_str] = per_pro
+    else:
+        return cached_result
+
+    # 1. Profissionais (uma leitura em lote)
+    pros_data = {}
+    if professional_ids:
+        try:
+            pros_data = _load_professionals(salao_id, professional_ids)
+        except Exception as e:
+            logging.error(f"Erro ao carregar agenda dos profissionais: {e}")
+
+    # 2. UMA query para a janela inteira (meia-noite local do 1º dia até a meia-noite após o último)
+    window_start_utc = local_tz.localize(datetime.combine(start_date, datetime.min.time())).astimezone(pytz.utc)
+    window_end_utc = local_tz.localize(datetime.combine(end_date + timedelta(days=1), datetime.min.time())).astimezone(pytz.utc)
+    try:
+        busy_periods = _query_busy_periods(salao_id, window_start_utc, window_end_utc)
+    except Exception as e:
+        logging.exception(f"Erro ao buscar agendamentos do período: {e}")
+        return {}
+
+    # 3. Agrupa por dia local (e por profissional, quando aplicável)
+    busy_by_day: Dict[Any, List[Dict[str, Any]]] = {}
+    for period in busy_periods:
+        busy_by_day.setdefault(period['start'].date(), []).append(period)
+    google_by_day = google_busy_service.get_busy_periods_for_days(salao_id, salon_data, days)
+
+    book = get_schedule_book(salon_data)
+    pro_schedules: Dict[str, WeeklySchedule] = {
+        pro_id: book.for_professional(pro_id, (pros_data.get(pro_id) or {}).get('horario_trabalho'))
+        for pro_id in (professional_ids or [])
+    }
+    result: Dict[str, Any] = {}
+
+    for day in days:
+        day_busy = busy_by_day.get(day, [])
+        google_busy = google_by_day.get(day, [])
+
+        if not professional_ids:
+            day_busy = day_busy + google_busy
+            day_schedule = book.salon.for_date(day)
+            slots = _compute_day_slots(day, day_schedule, day_busy, service_duration_minutes) if day_schedule else []
+            availability_cache.set_slots(salao_id, day.isoformat(), None, service_duration_minutes, slots)
+            result[day.isoformat()] = slots
+            continue
+
+        per_pro = {}
+        for pro_id in professional_ids:
+            day_schedule = pro_schedules[pro_id].for_date(day)
+            if not day_schedule:
+                per_pro[pro_id] = []
+                continue
+            pro_busy = [p for p in day_busy if p.get('professionalId') == pro_id] + google_busy
+            per_pro[pro_id] = _compute_day_slots(day, day_schedule, pro_busy, service_duration_minutes)
+        for pro_id, slots in per_pro.items():
+            availability_cache.set_slots(salao_id, day.isoformat(), pro_id, service_duration_minutes, slots)
+        result[day.isoformat()] = per_pro
+
+    return result
 
-        # 7. Adiciona Almoço (Calculado acima)
-        if has_lunch and lunch_start_str and lunch_end_str:
-            try:
-                l_start_time = datetime.strptime(lunch_start_str, '%H:%M').time()
-                l_end_time = datetime.strptime(lunch_end_str, '%H:%M').time()
-                l_start_dt = local_tz.localize(datetime.combine(target_date_local, l_start_time))
-                l_end_dt = local_tz.localize(datetime.combine(target_date_local, l_end_time))
-                busy_periods.append({'start': l_start_dt, 'end': l_end_dt})
-            except: pass
-
-        busy_periods.sort(key=lambda x: x['start'])
-
-        # 8. Calcular Vãos (Loop Final)
-        current_slot = search_from 
-        while current_slot < day_end_dt:
-            slot_end = current_slot + timedelta(minutes=service_duration_minutes)
-            if slot_end > day_end_dt: break 
-            
-            is_conflict = False
-            for event in busy_periods:
-                if current_slot < event['end'] and slot_end > event['start']:
-                    is_conflict = True
-                    # Otimização de pulo
-                    next_possible_start = event['end']
-                    minute_offset = next_possible_start.minute % SLOT_INTERVAL_MINUTES
-                    if minute_offset != 0: next_possible_start += timedelta(minutes=SLOT_INTERVAL_MINUTES - minute_offset)
-                    
-                    if next_possible_start > current_slot: current_slot = next_possible_start
-                    else: current_slot += timedelta(minutes=SLOT_INTERVAL_MINUTES)
-                    break 
-            
-            if not is_conflict:
-                available_slots_iso.append(current_slot.isoformat())
-                current_slot += timedelta(minutes=SLOT_INTERVAL_MINUTES)
-        
-        final_slots = sorted(list(set(available_slots_iso)))
-        return final_slots
+# ----------------------------------------------------
+# >>> PRÓXIMO HORÁRIO DISPONÍVEL <<<
+# ----------------------------------------------------
+
+NEXT_SLOT_MAX_DAYS = int(os.environ.get("NEXT_SLOT_MAX_DAYS", 60))
+
+def find_next_available_slot(
+    salao_id: str,
+    salon_data: dict,
+    service_duration_minutes: int,
+    professional_id: Optional[str] = None,
+    start_date_str: Optional[str] = None,
+    max_days: int = NEXT_SLOT_MAX_DAYS
+) -> Optional[Dict[str, str]]:
+    """
+    Primeiro horário livre a partir de start_date_str (padrão: hoje), dia a dia.
+    Os agendamentos são lidos em janelas crescentes (1, 2, 4, 8... dias) e a busca
+    para no primeiro slot encontrado, sem passar de max_days.
+    Dias já em cache (availability_cache) não vão ao banco.
+    Retorno: {"data": 'YYYY-MM-DD', "horario": iso} ou None.
+    """
+    if db is None: return None
+
+    local_tz = pytz.timezone(LOCAL_TIMEZONE)
+    if start_date_str:
+        day = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+    else:
+        day = datetime.now(local_tz).date()
+
+    # Agenda compilada (salão ou salão ∩ profissional)
+    book = get_schedule_book(salon_data)
+    schedule = book.salon
+    if professional_id:
+        pro_data = _load_professionals(salao_id, [professional_id]).get(professional_id)
+        if pro_data:
+            schedule = book.for_professional(professional_id, pro_data.get('horario_trabalho'))
+
+    searched, window = 0, 1
+    while searched < max_days:
+        window_days = [day + timedelta(days=i) for i in range(min(window, max_days - searched))]
+        busy_by_day = None
+
+        for current in window_days:
+            day_schedule = schedule.for_date(current)
+            if not day_schedule: continue
+
+            day_str = current.isoformat()
+            slots = availability_cache.get_slots(salao_id, day_str, professional_id, service_duration_minutes)
+            if slots is None:
+                if busy_by_day is None:
+                    # UMA query do dia atual até o fim da janela
+                    window_start_utc = local_tz.localize(datetime.combine(current, datetime.min.time())).astimezone(pytz.utc)
+                    window_end_utc = local_tz.localize(datetime.combine(window_days[-1] + timedelta(days=1), datetime.min.time())).astimezone(pytz.utc)
+                    busy_by_day = {}
+                    for period in _query_busy_periods(salao_id, window_start_utc, window_end_utc, professional_id):
+                        busy_by_day.setdefault(period['start'].date(), []).append(period)
+                    remaining = [d for d in window_days if d >= current]
+                    for google_day, periods in google_busy_service.get_busy_periods_for_days(salao_id, salon_data, remaining).items():
+                        busy_by_day.setdefault(google_day, []).extend(periods)
+
+                slots = _compute_day_slots(current, day_schedule, busy_by_day.get(current, []), service_duration_minutes)
+                availability_cache.set_slots(salao_id, day_str, professional_id, service_duration_minutes, slots)
+
+            if slots:
+                return {"data": day_str, "horario": slots[0]}
+
+        searched += len(window_days)
+        day = window_days[-1] + timedelta(days=1)
+        window *= 2
+
+    return None
+
+# ----------------------------------------------------
+# >>> MODO "QUALQUER PROFISSIONAL" <<<
+# ----------------------------------------------------
+
+ANY_PROFESSIONAL_KEY = '*'
+
+def _load_active_professionals(salao_id: str, service_id: Optional[str] = None) -> Dict[str, dict]:
+    """
+    Carrega TODA a equipe ativa em uma leitura (stream).
+    Se service_id vier, mantém só quem executa o serviço (lista 'servicos' vazia = executa todos).
+    """
+    return profissionais.list_active(salao_id, service_id)
+
+def find_available_slots_any_professional(
+    salao_id: str,
+    salon_data: dict,
+    service_duration_minutes: int,
+    date_str: str,
+    service_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Horários em que PELO MENOS UM profissional está livre, com a lista de quem atende cada um.
+    Lê a equipe uma vez, faz UMA query de agendamentos do dia e agrupa por professionalId.
+
+    Agendamentos sem professionalId (ex: manuais do painel) bloqueiam toda a equipe,
+    já que não sabemos quem vai atendê-los.
+    Retorno: [{"horario": iso, "profissionais": [{"id", "nome"}]}]
+    """
+    if db is None: return []
+
+    cache_key = f"{ANY_PROFESSIONAL_KEY}:{service_id or ''}"
+    cached = availability_cache.get_slots(salao_id, date_str, cache_key, service_duration_minutes)
+    if cached is not None:
+        return cached
+
+    try:
+        local_tz = pytz.timezone(LOCAL_TIMEZONE)
+        target_date_local = datetime.strptime(date_str, '%Y-%m-%d').date()
+        book = get_schedule_book(salon_data)
+        salon_day = book.salon.for_date(target_date_local)
+
+        result: List[Dict[str, Any]] = []
+        if salon_day:
+            pros = _load_active_professionals(salao_id, service_id)
+
+            # UMA query para o dia inteiro (todos os profissionais)
+            day_start_utc = local_tz.localize(datetime.combine(target_date_local, datetime.min.time())).astimezone(pytz.utc)
+            day_end_utc = day_start_utc + timedelta(days=1)
+            busy_periods = _query_busy_periods(salao_id, day_start_utc, day_end_utc)
+            # Eventos do Google não têm profissional: bloqueiam toda a equipe
+            busy_periods += google_busy_service.get_busy_periods(salao_id, salon_data, target_date_local)
+
+            busy_by_pro: Dict[Optional[str], List[Dict[str, Any]]] = {}
+            for period in busy_periods:
+                busy_by_pro.setdefault(period.get('professionalId'), []).append(period)
+            unassigned = busy_by_pro.get(None, [])
+
+            # minuto de início -> profissionais livres
+            free_by_start: Dict[int, List[Dict[str, str]]] = {}
+            if not pros:
+                # Salão sem equipe cadastrada: a agenda do salão é a única agenda
+                for start in _compute_day_starts(target_date_local, salon_day, busy_periods, service_duration_minutes):
+                    free_by_start[start] = []
+            for pro_id, pro_data in pros.items():
+                day_schedule = book.for_professional(pro_id, pro_data.get('horario_trabalho')).for_date(target_date_local)
+                if not day_schedule: continue
+                pro_busy = busy_by_pro.get(pro_id, []) + unassigned
+                for start in _compute_day_starts(target_date_local, day_schedule, pro_busy, service_duration_minutes):
+                    free_by_start.setdefault(start, []).append({"id": pro_id, "nome": pro_data.get('nome')})
+
+            starts = sorted(free_by_start)
+            isos = slot_engine.starts_to_iso(target_date_local, starts, LOCAL_TIMEZONE)
+            result = [{"horario": iso, "profissionais": free_by_start[start]} for start, iso in zip(starts, isos)]
+
+        availability_cache.set_slots(salao_id, date_str, cache_key, service_duration_minutes, result)
+        return result
 
     except Exception as e:
-        logging.exception(f"Erro no cálculo de slots: {e}")
+        logging.exception(f"Erro no cálculo de slots (qualquer profissional): {e}")
         return []
 
 # ----------------------------------------------------
-# --- FUNÇÃO DE VERIFICAÇÃO UNITÁRIA (is_slot_available) ---
+# >>> GRADE DE DISPONIBILIDADE (PROFISSIONAIS × DIAS) <<<
 # ----------------------------------------------------
 
-def is_slot_available(
+def build_availability_grid(
     salao_id: str,
     salon_data: dict,
-    new_start_dt: datetime, 
+    start_date_str: str,
+    days_count: int,
+    professional_ids: Optional[List[str]] = None,
+    service_id: Optional[str] = None
+) -> Tuple[AvailabilityGrid, Dict[Optional[str], dict], List[Any]]:
+    """
+    Monta a grade de bitmaps de toda a equipe (ou dos profissionais pedidos) para
+    'days_count' dias, com UMA leitura da equipe e UMA query de agendamentos.
+    A grade resultante responde qualquer duração (AvailabilityGrid.starts).
+
+    Retorno: (grade, {professional_id: dados}, dias). Salão sem equipe usa a linha None.
+    """
+    local_tz = pytz.timezone(LOCAL_TIMEZONE)
+    start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+    days = [start_date + timedelta(days=i) for i in range(days_count)]
+    grid = AvailabilityGrid(step=SLOT_INTERVAL_MINUTES)
+    if db is None: return grid, {}, days
+
+    # 1. Equipe (uma leitura)
+    if professional_ids:
+        pros = _load_professionals(salao_id, professional_ids)
+    else:
+        pros = _load_active_professionals(salao_id, service_id)
+
+    # 2. UMA query para a janela inteira + Google (bloqueia todos)
+    window_start_utc = local_tz.localize(datetime.combine(days[0], datetime.min.time())).astimezone(pytz.utc)
+    window_end_utc = local_tz.localize(datetime.combine(days[-1] + timedelta(days=1), datetime.min.time())).astimezone(pytz.utc)
+    busy_by_day_pro: Dict[Any, Dict[Optional[str], List[Dict[str, Any]]]] = {}
+    for period in _query_busy_periods(salao_id, window_start_utc, window_end_utc):
+        busy_by_day_pro.setdefault(period['start'].date(), {}).setdefault(period.get('professionalId'), []).append(period)
+    google_by_day = google_busy_service.get_busy_periods_for_days(salao_id, salon_data, days)
+
+    # 3. Uma linha de bitmap por (profissional, dia)
+    book = get_schedule_book(salon_data)
+    for day in days:
+        if not book.salon.for_date(day): continue
+        day_busy = busy_by_day_pro.get(day, {})
+        shared_busy = day_busy.get(None, []) + google_by_day.get(day, [])
+        not_before = _search_start_minute(day)
+
+        if not pros:
+            day_schedule = book.salon.for_date(day)
+            all_busy = [p for periods in day_busy.values() for p in periods] + google_by_day.get(day, [])
+            grid.add_row(None, day, day_schedule.open_minute, day_schedule.close_minute,
+                         _busy_minutes(day, day_schedule, all_busy), not_before)
+            continue
+
+        for pro_id, pro_data in pros.items():
+            day_schedule = book.for_professional(pro_id, pro_data.get('horario_trabalho')).for_date(day)
+            if not day_schedule: continue
+            pro_busy = day_busy.get(pro_id, []) + shared_busy
+            grid.add_row(pro_id, day, day_schedule.open_minute, day_schedule.close_minute,
+                         _busy_minutes(day, day_schedule, pro_busy), not_before)
+
+    return grid, pros, days
+
+# ----------------------------------------------------
+# --- VALIDAÇÃO DE AGENDAMENTO (validate_booking) ---
+# ----------------------------------------------------
+
+# Códigos de motivo devolvidos pelo validador
+BOOKING_REASON_CLOSED = 'closed'
+BOOKING_REASON_OUTSIDE_HOURS = 'outside_hours'
+BOOKING_REASON_LUNCH = 'lunch'
+BOOKING_REASON_CONFLICT = 'conflict'
+
+BOOKING_REASON_MESSAGES = {
+    BOOKING_REASON_CLOSED: "O salão (ou o profissional) não atende neste dia.",
+    BOOKING_REASON_OUTSIDE_HOURS: "Horário fora do expediente.",
+    BOOKING_REASON_LUNCH: "Conflito com o horário de almoço.",
+    BOOKING_REASON_CONFLICT: "Horário indisponível. Conflito com outro agendamento ou evento pessoal.",
+}
+
+
+@dataclass(frozen=True)
+class BookingValidation:
+    """Resultado do validate_booking. 'reason' é None quando o horário está livre."""
+    reason: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.reason is None
+
+    @property
+    def message(self) -> Optional[str]:
+        return BOOKING_REASON_MESSAGES.get(self.reason)
+
+
+def evaluate_booking(
+    day_schedule: Optional[DaySchedule],
+    start_minute: int,
+    end_minute: int,
+    busy: List[tuple],
+    check_hours: bool = True
+) -> Optional[str]:
+    """
+    Avaliação pura (sem I/O) de um horário: recebe a agenda compilada do dia
+    e os intervalos ocupados em minutos do dia e devolve o código do motivo
+    (ou None se estiver livre). Pode ser reaproveitada por rotas assíncronas
+    que buscam os dados por conta própria.
+    """
+    if check_hours:
+        if not day_schedule:
+            return BOOKING_REASON_CLOSED
+        if not day_schedule.contains(start_minute, end_minute):
+            return BOOKING_REASON_OUTSIDE_HOURS
+        if day_schedule.lunch_overlaps(start_minute, end_minute):
+            return BOOKING_REASON_LUNCH
+
+    for busy_start, busy_end in busy:
+        if start_minute < busy_end and end_minute > busy_start:
+            return BOOKING_REASON_CONFLICT
+    return None
+
+
+def _google_busy_periods(
+    salon_data: dict,
+    day_start_dt: datetime,
+    day_end_dt: datetime,
+    ignore_google_event_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Eventos ocupados do Google Calendar do salão (se a sincronização estiver ativa)."""
+    # Nota: O Google Calendar geralmente é vinculado ao Dono (Geral) e bloqueia a agenda do salão como um todo.
+    refresh_token = salon_data.get("google_refresh_token")
+    if not (salon_data.get("google_sync_enabled") and refresh_token):
+        return []
+
+    google_service = get_google_calendar_service(refresh_token)
+    if not google_service:
+        return []
+
+    local_tz = pytz.timezone(LOCAL_TIMEZONE)
+    busy_periods = []
+    try:
+        events_result = google_service.events().list(
+            calendarId='primary', timeMin=day_start_dt.isoformat(), timeMax=day_end_dt.isoformat(),
+            singleEvents=True, timeZone=LOCAL_TIMEZONE
+        ).execute()
+        for event in events_result.get('items', []):
+            if ignore_google_event_id and event.get('id') == ignore_google_event_id: continue
+            start_str = event['start'].get('dateTime')
+            end_str = event['end'].get('dateTime')
+            if start_str and end_str and event.get('transparency') != 'transparent':
+                busy_periods.append({
+                    "start": datetime.fromisoformat(start_str).astimezone(local_tz),
+                    "end": datetime.fromisoformat(end_str).astimezone(local_tz)
+                })
+    except Exception as e:
+        logging.error(f"Erro ao buscar eventos do Google Calendar: {e}")
+    return busy_periods
+
+
+def validate_booking(
+    salao_id: str,
+    salon_data: dict,
+    new_start_dt: datetime,
     duration_minutes: int,
+    professional_id: Optional[str] = None,
     ignore_firestore_id: Optional[str] = None,
     ignore_google_event_id: Optional[str] = None,
-    professional_id: Optional[str] = None # 🌟 NOVO PARÂMETRO
-) -> bool:
+    check_hours: bool = True
+) -> BookingValidation:
     """
-    Verifica se um slot específico está livre, filtrando por profissional.
+    Ponto único de validação de um agendamento: expediente, almoço, agenda do
+    profissional, agendamentos existentes e eventos do Google — tudo sobre UMA
+    query de agendamentos do dia.
     """
-    if db is None: return False
+    if db is None: return BookingValidation(BOOKING_REASON_CONFLICT)
 
     try:
         local_tz = pytz.timezone(LOCAL_TIMEZONE)
-        # Garante timezone
+        # Garante timezone (sem fuso = UTC)
         if new_start_dt.tzinfo is None:
             new_start_dt = pytz.utc.localize(new_start_dt).astimezone(local_tz)
         else:
             new_start_dt = new_start_dt.astimezone(local_tz)
-            
-        new_end_dt = new_start_dt + timedelta(minutes=duration_minutes)
 
-        # 1. Coletar períodos ocupados
-        busy_periods = []
-        
-        day_start_dt = new_start_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        target_date_local = new_start_dt.date()
+        start_minute = new_start_dt.hour * 60 + new_start_dt.minute
+        end_minute = start_minute + duration_minutes
+
+        # 1. Agenda compilada (salão ou salão ∩ profissional)
+        day_schedule = None
+        if check_hours:
+            book = get_schedule_book(salon_data)
+            schedule = book.salon
+            if professional_id and schedule.for_date(target_date_local):
+                pro_data = _load_professionals(salao_id, [professional_id]).get(professional_id)
+                if pro_data:
+                    schedule = book.for_professional(professional_id, pro_data.get('horario_trabalho'))
+            day_schedule = schedule.for_date(target_date_local)
+
+            # Fechado / fora do expediente / almoço: responde sem consultar agendamentos
+            reason = evaluate_booking(day_schedule, start_minute, end_minute, [])
+            if reason:
+                return BookingValidation(reason)
+
+        # 2. Períodos ocupados do dia (UMA query + Google)
+        day_start_dt = local_tz.localize(datetime.combine(target_date_local, datetime.min.time()))
         day_end_dt = day_start_dt + timedelta(days=1)
-        
-        day_start_utc = day_start_dt.astimezone(pytz.utc)
-        day_end_utc = day_end_dt.astimezone(pytz.utc)
 
-        # --- FIRESTORE ---
-        agendamentos_ref = db.collection('cabeleireiros').document(salao_id).collection('agendamentos')
-        query = agendamentos_ref.where(filter=FieldFilter("startTime", ">=", day_start_utc))\
-                                .where(filter=FieldFilter("startTime", "<", day_end_utc))
-        
-        # 🌟 FILTRO PROFISSIONAL
-        if professional_id:
-            query = query.where(filter=FieldFilter("professionalId", "==", professional_id))
-
-        for doc in query.stream():
-             if doc.id == ignore_firestore_id: continue
-             data = doc.to_dict()
-             if data.get('status') in ['cancelado', 'rejeitado']: continue
-             
-             if data.get('startTime') and data.get('endTime'):
-                busy_periods.append({
-                    "start": data['startTime'].astimezone(local_tz),
-                    "end": data['endTime'].astimezone(local_tz)
-                })
+        busy_periods = [
+            p for p in _query_busy_periods(
+                salao_id, day_start_dt.astimezone(pytz.utc), day_end_dt.astimezone(pytz.utc), professional_id
+            )
+            if p.get('id') != ignore_firestore_id
+        ]
+        if ignore_google_event_id:
+            # freeBusy não traz o id dos eventos: para ignorar o evento do próprio agendamento (reagendamento) lista os eventos do dia
+            busy_periods += _google_busy_periods(salon_data, day_start_dt, day_end_dt, ignore_google_event_id)
+        else:
+            busy_periods += google_busy_service.get_busy_periods(salao_id, salon_data, target_date_local)
 
-        # --- GOOGLE CALENDAR (Se aplicável) ---
-        # Nota: O Google Calendar geralmente é vinculado ao Dono (Geral). 
-        # Se cada profissional tiver seu Google Calendar, a lógica precisaria mudar aqui.
-        # Por enquanto, mantemos a lógica de que o Google bloqueia tudo (ou apenas se não tiver prof específico).
-        refresh_token = salon_data.get("google_refresh_token")
-        if salon_data.get("google_sync_enabled") and refresh_token:
-             # ... (Lógica Google mantida - assume que Google bloqueia a agenda do salão como um todo ou do dono)
-             # Se quiser que o Google não bloqueie outros profissionais, coloque um 'if not professional_id:' aqui.
-             google_service = get_google_calendar_service(refresh_token)
-             if google_service:
-                try:
-                    events_result = google_service.events().list(
-                        calendarId='primary', timeMin=day_start_dt.isoformat(), timeMax=day_end_dt.isoformat(),
-                        singleEvents=True, timeZone=LOCAL_TIMEZONE
-                    ).execute()
-                    for event in events_result.get('items', []):
-                        if ignore_google_event_id and event.get('id') == ignore_google_event_id: continue
-                        start_str = event['start'].get('dateTime')
-                        end_str = event['end'].get('dateTime')
-                        if start_str and end_str and event.get('transparency') != 'transparent':
-                            busy_periods.append({
-                                "start": datetime.fromisoformat(start_str).astimezone(local_tz),
-                                "end": datetime.fromisoformat(end_str).astimezone(local_tz)
-                            })
-                except Exception: pass
-
-        # 2. Verificação Final
-        for event in busy_periods:
-            if new_start_dt < event['end'] and new_end_dt > event['start']:
-                return False # Conflito!
+        busy = [
+            (slot_engine.datetime_to_day_minutes(p['start'], target_date_local),
+             slot_engine.datetime_to_day_minutes(p['end'], target_date_local))
+            for p in busy_periods
+        ]
 
-        return True
+        # 3. Avaliação final (horário já validado acima)
+        return BookingValidation(evaluate_booking(day_schedule, start_minute, end_minute, busy, check_hours=False))
 
     except Exception as e:
-        logging.error(f"Erro is_slot_available: {e}")
-        return False
\ No newline at end of file
+        logging.error(f"Erro validate_booking: {e}")
+        return BookingValidation(BOOKING_REASON_CONFLICT)
+
+
+def is_slot_available(
+    salao_id: str,
+    salon_data: dict,
+    new_start_dt: datetime, 
+    duration_minutes: int,
+    ignore_firestore_id: Optional[str] = None,
+    ignore_google_event_id: Optional[str] = None,
+    professional_id: Optional[str] = None
+) -> bool:
+    """
+    Verifica apenas conflitos (agendamentos + Google) de um slot. Mantida por
+    compatibilidade; as rotas de agendamento usam validate_booking.
+    """
+    return validate_booking(
+        salao_id, salon_data, new_start_dt, duration_minutes,
+        professional_id=professional_id,
+        ignore_firestore_id=ignore_firestore_id,
+        ignore_google_event_id=ignore_google_event_id,
+        check_hours=False
+    ).ok
@@ -0,0 +1,175 @@
+# backend/services/google_busy_service.py
+# Horários ocupados do Google Calendar do salão via freeBusy (uma chamada por
+# janela, sem baixar os eventos), com cache por (salão, dia).
+# Perto de expirar, a entrada é renovada em segundo plano: quem consulta recebe
+# o valor em cache e a chamada externa sai do caminho crítico do agendamento.
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pytz
+
+from core.cache import StatsTTLCache
+from services import google_client_pool
+
+LOCAL_TIMEZONE = 'America/Sao_Paulo'
+GOOGLE_BUSY_TTL_SECONDS = int(os.environ.get("GOOGLE_BUSY_TTL_SECONDS", 120))
+GOOGLE_BUSY_CACHE_MAXSIZE = int(os.environ.get("GOOGLE_BUSY_CACHE_MAXSIZE", 2048))
+# Fração do TTL a partir da qual a entrada é renovada em segundo plano
+GOOGLE_BUSY_REFRESH_AHEAD = float(os.environ.get("GOOGLE_BUSY_REFRESH_AHEAD", 0.7))
+GOOGLE_BUSY_REFRESH_WORKERS = int(os.environ.get("GOOGLE_BUSY_REFRESH_WORKERS", 2))
+
+# Valor em cache: (instante da busca em time.monotonic(), ((início, fim), ...)) no fuso local
+_cache = StatsTTLCache(
+    name="google_busy",
+    maxsize=GOOGLE_BUSY_CACHE_MAXSIZE,
+    ttl=GOOGLE_BUSY_TTL_SECONDS,
+)
+_executor = ThreadPoolExecutor(max_workers=GOOGLE_BUSY_REFRESH_WORKERS, thread_name_prefix="google-busy")
+_inflight = set()
+_inflight_lock = threading.Lock()
+
+
+def is_enabled(salon_data: Dict[str, Any]) -> bool:
+    return bool(salon_data.get("google_sync_enabled") and salon_data.get("google_refresh_token"))
+
+
+def _parse_google_datetime(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _fetch_busy(refresh_token: str, first_day: date, last_day: date) -> Optional[Dict[date, List[Tuple[datetime, datetime]]]]:
+    """
+    UMA chamada freeBusy para [first_day, last_day]. Devolve os intervalos por dia local
+    (um intervalo que atravessa a meia-noite entra nos dois dias) ou None em caso de falha.
+    """
+    google_service = google_client_pool.get_service(refresh_token)
+    if not google_service:
+        return None
+
+    local_tz = pytz.timezone(LOCAL_TIMEZONE)
+    window_start = local_tz.localize(datetime.combine(first_day, datetime.min.time()))
+    window_end = local_tz.localize(datetime.combine(last_day + timedelta(days=1), datetime.min.time()))
+
+    try:
+        response = google_service.freebusy().query(body={
+            "timeMin": window_start.isoformat(),
+            "timeMax": window_end.isoformat(),
+            "timeZone": LOCAL_TIMEZONE,
+            "items": [{"id": "primary"}],
+        }).execute()
+    except Exception as e:
+        logging.error(f"Erro na consulta freeBusy do Google Calendar: {e}")
+        return None
+
+    calendar = response.get('calendars', {}).get('primary', {})
+    if calendar.get('errors'):
+        logging.error(f"freeBusy retornou erros para o calendário: {calendar['errors']}")
+        return None
+
+    by_day: Dict[date, List[Tuple[datetime, datetime]]] = {}
+    day = first_day
+    while day <= last_day:
+        by_day[day] = []
+        day += timedelta(days=1)
+
+    for busy in calendar.get('busy', []):
+        start = _parse_google_datetime(busy['start']).astimezone(local_tz)
+        end = _parse_google_datetime(busy['end']).astimezone(local_tz)
+        # Um evento que termina exatamente à meia-noite não ocupa o dia seguinte
+        last = end.date()
+        if end.time() == datetime.min.time() and last > start.date():
+            last -= timedelta(days=1)
+        day = start.date()
+        while day <= last:
+            if day in by_day:
+                by_day[day].append((start, end))
+            day += timedelta(days=1)
+    return by_day
+
+
+def _store(salao_id: str, by_day: Dict[date, List[Tuple[datetime, datetime]]]) -> None:
+    fetched_at = time.monotonic()
+    for day, periods in by_day.items():
+        _cache.set((salao_id, day.isoformat()), (fetched_at, tuple(periods)))
+
+
+def _refresh_in_background(salao_id: str, refresh_token: str, day: date) -> None:
+    key = (salao_id, day.isoformat())
+    with _inflight_lock:
+        if key in _inflight:
+            return
+        _inflight.add(key)
+
+    def _run():
+        try:
+            by_day = _fetch_busy(refresh_token, day, day)
+            if by_day is not None:
+                _store(salao_id, by_day)
+        finally:
+            with _inflight_lock:
+                _inflight.discard(key)
+
+    _executor.submit(_run)
+
+
+def get_busy_periods_for_days(
+    salao_id: str,
+    salon_data: Dict[str, Any],
+    days: Iterable[date]
+) -> Dict[date, List[Dict[str, datetime]]]:
+    """
+    Períodos ocupados no Google ({'start', 'end'} no fuso local) para cada dia pedido.
+    Os dias fora do cache são buscados juntos, em UMA chamada freeBusy.
+    Em caso de falha no Google o dia volta vazio (não bloqueia a agenda) e não é cacheado.
+    """
+    days = sorted(set(days))
+    if not days or not is_enabled(salon_data):
+        return {day: [] for day in days}
+
+    refresh_token = salon_data["google_refresh_token"]
+    refresh_after = GOOGLE_BUSY_TTL_SECONDS * GOOGLE_BUSY_REFRESH_AHEAD
+    now = time.monotonic()
+
+    found: Dict[date, Tuple[Tuple[datetime, datetime], ...]] = {}
+    missing: List[date] = []
+    for day in days:
+        entry = _cache.get((salao_id, day.isoformat()))
+        if entry is None:
+            missing.append(day)
+            continue
+        fetched_at, periods = entry
+        found[day] = periods
+        if now - fetched_at >= refresh_after:
+            _refresh_in_background(salao_id, refresh_token, day)
+
+    if missing:
+        by_day = _fetch_busy(refresh_token, missing[0], missing[-1])
+        if by_day is not None:
+            _store(salao_id, by_day)
+            for day in missing:
+                found[day] = tuple(by_day.get(day, []))
+
+    return {
+        day: [{"start": start, "end": end} for start, end in found.get(day, ())]
+        for day in days
+    }
+
+
+def get_busy_periods(salao_id: str, salon_data: Dict[str, Any], day: date) -> List[Dict[str, datetime]]:
+    return get_busy_periods_for_days(salao_id, salon_data, [day])[day]
+
+
+def invalidate(salao_id: str, date_str: Optional[str] = None) -> int:
+    """Descarta os dias em cache do salão (ou todos, se date_str for None)."""
+    return _cache.invalidate_where(
+        lambda key: key[0] == salao_id and (date_str is None or key[1] == date_str)
+    )
+
+
+def stats():
+    return _cache.stats()
@@ -0,0 +1,145 @@
+# backend/services/google_client_pool.py
+# Pool (LRU, por processo) de clientes do Google Calendar, chaveado pelo hash do
+# refresh_token. As Credentials ficam no pool e o access_token é reaproveitado
+# até expirar; a renovação acontece sob um lock por chave, então requisições
+# simultâneas do mesmo salão fazem UMA troca de token.
+# O httplib2 não é thread-safe: o objeto 'service' é construído uma vez por
+# thread (threading.local) sobre as Credentials compartilhadas.
+import hashlib
+import logging
+import os
+import threading
+from typing import Any, Dict
+
+from cachetools import LRUCache
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+from core.cache import register_stats_source
+
+GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_OAUTH_CLIENT_ID")
+GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_OAUTH_CLIENT_SECRET")
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+GOOGLE_CLIENT_POOL_MAXSIZE = int(os.environ.get("GOOGLE_CLIENT_POOL_MAXSIZE", 256))
+
+
+class _PoolEntry:
+    def __init__(self, credentials: Credentials):
+        self.credentials = credentials
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+
+class GoogleClientPool:
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.token_refreshes = 0
+        self.refresh_failures = 0
+        self.builds = 0
+
+    @staticmethod
+    def _key(refresh_token: str) -> str:
+        return hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()
+
+    def _get_entry(self, key: str, refresh_token: str) -> _PoolEntry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            entry = _PoolEntry(Credentials.from_authorized_user_info(
+                info={
+                    "refresh_token": refresh_token,
+                    "client_id": GOOGLE_CLIENT_ID,
+                    "client_secret": GOOGLE_CLIENT_SECRET,
+                    "token_uri": "https://oauth2.googleapis.com/token"
+                },
+                scopes=SCOPES
+            ))
+            self._entries[key] = entry
+            return entry
+
+    def _ensure_valid(self, key: str, entry: _PoolEntry) -> bool:
+        """Renova o access_token se necessário (uma thread por vez por chave)."""
+        if entry.credentials.valid:
+            return True
+        with entry.lock:
+            if entry.credentials.valid:
+                return True
+            try:
+                entry.credentials.refresh(Request())
+                with self._lock:
+                    self.token_refreshes += 1
+                return True
+            except RefreshError as e:
+                logging.error(f"Falha ao renovar token do Google (refresh_token revogado/inválido?): {e}")
+                with self._lock:
+                    self.refresh_failures += 1
+                    self._entries.pop(key, None)
+                return False
+
+    def get_service(self, refresh_token: str):
+        if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
+            logging.error("Credenciais OAuth (Client ID/Secret) não configuradas no ambiente.")
+            return None
+
+        key = self._key(refresh_token)
+        entry = self._get_entry(key, refresh_token)
+        if not self._ensure_valid(key, entry):
+            return None
+
+        service = getattr(entry.local, 'service', None)
+        if service is None:
+            service = build('calendar', 'v3', credentials=entry.credentials, cache_discovery=False)
+            entry.local.service = service
+            with self._lock:
+                self.builds += 1
+        return service
+
+    def discard(self, refresh_token: str) -> None:
+        with self._lock:
+            self._entries.pop(self._key(refresh_token), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "token_refreshes": self.token_refreshes,
+                "refresh_failures": self.refresh_failures,
+                "builds": self.builds,
+            }
+
+
+_pool = GoogleClientPool(GOOGLE_CLIENT_POOL_MAXSIZE)
+register_stats_source("google_clients", _pool)
+
+
+def get_service(refresh_token: str):
+    """Cliente do Google Calendar (v3) pronto para uso, ou None se não for possível autenticar."""
+    try:
+        return _pool.get_service(refresh_token)
+    except Exception:
+        logging.exception("Falha CRÍTICA ao obter serviço Google Calendar do pool.")
+        return None
+
+
+def discard(refresh_token: str) -> None:
+    """Remove o cliente do pool (ex: ao desconectar o Google do salão)."""
+    _pool.discard(refresh_token)
+
+
+def stats() -> Dict[str, Any]:
+    return _pool.stats()
@@ -0,0 +1,149 @@
+# backend/services/idempotency.py
+# Idempotency-Key nas rotas que criam agendamento/cobrança. O cliente (app em rede
+# ruim) manda a mesma chave ao repetir o POST; a primeira requisição grava a resposta
+# em cabeleireiros/{id}/idempotency_keys/{hash(rota + chave)} e as repetições recebem
+# essa resposta sem refazer validação, CRM, cobrança no Mercado Pago e e-mails.
+# - Reserva da chave numa transação: duas tentativas simultâneas -> só uma executa,
+#   a outra recebe 409 até a primeira terminar.
+# - Respostas 2xx/4xx ficam gravadas; erro 5xx (ou exceção) libera a chave para nova tentativa.
+# - Mesma chave com outro corpo -> 422 (a chave não pode ser reaproveitada).
+# - 'expireAt' permite uma política de TTL do Firestore na coleção; a expiração
+#   também é conferida na leitura.
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import pytz
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from firebase_admin import firestore
+
+from core import db as core_db
+from core.async_db import run_blocking
+from core.repositories import chaves_idempotencia
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", 86400))
+# Chave 'processando' mais velha que isso é de um processo que morreu: pode ser retomada
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", 120))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+STATE_PROCESSING = "processando"
+STATE_DONE = "concluido"
+
+
+def _record_id(scope: str, key: str) -> str:
+    return hashlib.sha256(f"{scope}:{key}".encode()).hexdigest()
+
+
+def request_hash(payload: Any) -> str:
+    """Hash do corpo da requisição (só o hash é gravado, nunca dados de cartão)."""
+    encoded = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _as_utc(value: datetime) -> datetime:
+    return pytz.utc.localize(value) if value.tzinfo is None else value.astimezone(pytz.utc)
+
+
+@firestore.transactional
+def _claim_in_transaction(transaction, ref, scope: str, body_hash: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    now = datetime.now(pytz.utc)
+    snapshot = ref.get(transaction=transaction)
+    record = snapshot.to_dict() if snapshot.exists else None
+
+    if record and _as_utc(record["expireAt"]) > now:
+        if record.get("requestHash") != body_hash:
+            return "mismatch", record
+        if record.get("state") == STATE_DONE:
+            return "replay", record
+        if _as_utc(record["lockedUntil"]) > now:
+            return "in_progress", record
+        logging.warning(f"Idempotency-Key abandonada retomada ({scope}, {ref.id}).")
+
+    transaction.set(ref, {
+        "scope": scope,
+        "requestHash": body_hash,
+        "state": STATE_PROCESSING,
+        "createdAt": now,
+        "lockedUntil": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+        "expireAt": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+    })
+    return "claimed", None
+
+
+def _claim(salao_id: str, scope: str, key: str, body_hash: str):
+    ref = chaves_idempotencia.ref(salao_id, _record_id(scope, key))
+    outcome, record = _claim_in_transaction(core_db.db.transaction(), ref, scope, body_hash)
+    return outcome, record, ref
+
+
+def _store(ref, status_code: int, body: Any) -> None:
+    try:
+        ref.update({"state": STATE_DONE, "statusCode": status_code, "body": body})
+    except Exception as e:
+        # A resposta já foi produzida; sem o registro a repetição só volta a executar
+        logging.error(f"Falha ao gravar a resposta idempotente {ref.id}: {e}")
+
+
+def _release(ref) -> None:
+    try:
+        ref.delete()
+    except Exception as e:
+        logging.error(f"Falha ao liberar a Idempotency-Key {ref.id}: {e}")
+
+
+def _replay(record: Dict[str, Any]):
+    headers = {REPLAYED_HEADER: "true"}
+    if record["statusCode"] >= 400:
+        raise HTTPException(status_code=record["statusCode"], detail=(record.get("body") or {}).get("detail"), headers=headers)
+    return JSONResponse(content=record.get("body"), status_code=record["statusCode"], headers=headers)
+
+
+async def run(
+    salao_id: str,
+    scope: str,
+    key: Optional[str],
+    payload: Any,
+    handler: Callable[[], Awaitable[Any]],
+    success_status: int = status.HTTP_201_CREATED,
+):
+    """
+    Executa 'handler' uma única vez por (salão, rota, Idempotency-Key).
+    Sem chave o handler roda normalmente. Repetições devolvem a resposta gravada
+    (header Idempotent-Replayed: true), inclusive os erros 4xx.
+    """
+    if not key:
+        return await handler()
+    key = key.strip()
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} inválida (1 a {IDEMPOTENCY_KEY_MAX_LENGTH} caracteres).")
+
+    outcome, record, ref = await run_blocking(_claim, salao_id, scope, key, request_hash(payload))
+    if outcome == "replay":
+        logging.info(f"Idempotency-Key repetida em {scope} ({salao_id}): resposta gravada devolvida.")
+        return _replay(record)
+    if outcome == "mismatch":
+        raise HTTPException(status_code=422, detail=f"{IDEMPOTENCY_HEADER} já usada com outro pedido.")
+    if outcome == "in_progress":
+        raise HTTPException(status_code=409, detail="Pedido com esta chave ainda em processamento. Tente novamente em instantes.")
+
+    try:
+        result = await handler()
+    except HTTPException as he:
+        if he.status_code < 500:
+            await run_blocking(_store, ref, he.status_code, {"detail": jsonable_encoder(he.detail)})
+        else:
+            await run_blocking(_release, ref)
+        raise
+    except BaseException:
+        await run_blocking(_release, ref)
+        raise
+
+    await run_blocking(_store, ref, success_status, jsonable_encoder(result))
+    return result
@@ -0,0 +1,193 @@
+# backend/services/outbox.py
+# Outbox dos efeitos pós-agendamento (e-mails, aviso ao profissional, evento no Google).
+# A rota grava os itens em cabeleireiros/{id}/outbox NA MESMA escrita do agendamento
+# (transação/batch) e responde; um pool de workers executa os itens em segundo plano.
+# Assim a latência do agendamento é só a escrita no Firestore e um provedor de e-mail
+# lento (ou fora do ar) não derruba um agendamento já confirmado.
+# - dispatch() entrega os itens recém-gravados direto ao pool (caminho rápido).
+# - A varredura periódica (start_sweeper, iniciada no main.py) pega o que ficou para
+#   trás: itens com nova tentativa vencida ou de um processo que morreu no meio.
+# - Cada item é "tomado" numa transação antes de rodar: dois workers/processos não
+#   executam o mesmo item ao mesmo tempo.
+# - Falha -> nova tentativa com backoff exponencial; após OUTBOX_MAX_ATTEMPTS fica 'falhou'.
+# Os executores são registrados por tipo (register); ver services/booking_effects.py.
+# Varredura: índice de collection group em outbox (state, nextAttemptAt).
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pytz
+from firebase_admin import firestore
+from google.cloud.firestore import FieldFilter
+
+from core import db as core_db
+from core.repositories import outbox as outbox_repo
+
+OUTBOX_WORKERS = int(os.environ.get("OUTBOX_WORKERS", 4))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 6))
+OUTBOX_RETRY_BASE_SECONDS = int(os.environ.get("OUTBOX_RETRY_BASE_SECONDS", 30))
+# Item 'processando' há mais que isso volta para a fila (o worker morreu)
+OUTBOX_LOCK_SECONDS = int(os.environ.get("OUTBOX_LOCK_SECONDS", 300))
+OUTBOX_SWEEP_SECONDS = int(os.environ.get("OUTBOX_SWEEP_SECONDS", 30))
+OUTBOX_SWEEP_BATCH = int(os.environ.get("OUTBOX_SWEEP_BATCH", 100))
+
+STATE_PENDING = "pendente"
+STATE_PROCESSING = "processando"
+STATE_DONE = "enviado"
+STATE_FAILED = "falhou"
+
+# Efeito: (tipo, payload JSON simples)
+Effect = Tuple[str, Dict[str, Any]]
+Handler = Callable[[str, Dict[str, Any]], None]
+
+_handlers: Dict[str, Handler] = {}
+_executor = ThreadPoolExecutor(max_workers=OUTBOX_WORKERS, thread_name_prefix="outbox")
+_inflight = set()
+_inflight_lock = threading.Lock()
+_sweeper: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def register(kind: str) -> Callable[[Handler], Handler]:
+    """Registra o executor de um tipo: handler(salao_id, payload). Exceção = nova tentativa."""
+    def decorator(handler: Handler) -> Handler:
+        _handlers[kind] = handler
+        return handler
+    return decorator
+
+
+def prepare(salao_id: str, effects: Iterable[Effect], agendamento_id: Optional[str] = None) -> List[Tuple[Any, Dict[str, Any]]]:
+    """(ref, dados) dos itens, para a rota gravar junto com o agendamento."""
+    now = datetime.now(pytz.utc)
+    return [
+        (outbox_repo.ref(salao_id), {
+            "kind": kind,
+            "payload": payload,
+            "salaoId": salao_id,
+            "agendamentoId": agendamento_id,
+            "state": STATE_PENDING,
+            "attempts": 0,
+            "nextAttemptAt": now,
+            "lastError": None,
+            "createdAt": now,
+        })
+        for kind, payload in effects
+    ]
+
+
+def dispatch(items: Iterable[Tuple[Any, Dict[str, Any]]]) -> None:
+    """Entrega os itens já gravados ao pool (não bloqueia a rota)."""
+    for ref, _ in items:
+        _submit(ref)
+
+
+def _submit(ref) -> None:
+    with _inflight_lock:
+        if ref.path in _inflight:
+            return
+        _inflight.add(ref.path)
+    _executor.submit(_run_item, ref)
+
+
+def _as_utc(value: datetime) -> datetime:
+    return pytz.utc.localize(value) if value.tzinfo is None else value.astimezone(pytz.utc)
+
+
+@firestore.transactional
+def _claim_in_transaction(transaction, ref) -> Optional[Dict[str, Any]]:
+    snapshot = ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    item = snapshot.to_dict()
+    now = datetime.now(pytz.utc)
+    if item.get("state") not in (STATE_PENDING, STATE_PROCESSING) or _as_utc(item["nextAttemptAt"]) > now:
+        return None  # Já executado, esgotado, ou com outro worker (lock válido)
+    transaction.update(ref, {
+        "state": STATE_PROCESSING,
+        "nextAttemptAt": now + timedelta(seconds=OUTBOX_LOCK_SECONDS),
+    })
+    return item
+
+
+def _run_item(ref) -> None:
+    try:
+        item = _claim_in_transaction(core_db.db.transaction(), ref)
+        if item is None:
+            return
+        _execute(ref, item)
+    except Exception as e:
+        logging.error(f"[Outbox] Erro ao processar {ref.path}: {e}")
+    finally:
+        with _inflight_lock:
+            _inflight.discard(ref.path)
+
+
+def _execute(ref, item: Dict[str, Any]) -> None:
+    kind = item.get("kind")
+    attempts = item.get("attempts", 0) + 1
+    handler = _handlers.get(kind)
+    try:
+        if handler is None:
+            raise RuntimeError(f"Tipo de efeito sem executor: {kind}")
+        handler(item["salaoId"], item.get("payload") or {})
+    except Exception as e:
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            ref.update({"state": STATE_FAILED, "attempts": attempts, "lastError": str(e)[:500]})
+            logging.error(f"[Outbox] {kind} ({ref.id}) falhou após {attempts} tentativas: {e}")
+        else:
+            delay = OUTBOX_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+            ref.update({
+                "state": STATE_PENDING, "attempts": attempts, "lastError": str(e)[:500],
+                "nextAttemptAt": datetime.now(pytz.utc) + timedelta(seconds=delay),
+            })
+            logging.warning(f"[Outbox] {kind} ({ref.id}) tentativa {attempts} falhou, nova em {delay}s: {e}")
+        return
+    ref.update({"state": STATE_DONE, "attempts": attempts, "lastError": None, "processedAt": firestore.SERVER_TIMESTAMP})
+    logging.info(f"[Outbox] {kind} ({ref.id}) executado.")
+
+
+def sweep() -> int:
+    """Envia ao pool os itens vencidos (pendentes ou com lock expirado). Retorna quantos."""
+    if core_db.db is None:
+        return 0
+    query = core_db.db.collection_group(outbox_repo.collection_name).where(
+        filter=FieldFilter("state", "in", [STATE_PENDING, STATE_PROCESSING])
+    ).where(
+        filter=FieldFilter("nextAttemptAt", "<=", datetime.now(pytz.utc))
+    ).limit(OUTBOX_SWEEP_BATCH)
+    count = 0
+    for doc in query.stream():
+        _submit(doc.reference)
+        count += 1
+    return count
+
+
+def _sweep_loop() -> None:
+    # A primeira varredura (na subida) pega o que um processo anterior deixou na fila
+    while not _stop.is_set():
+        try:
+            found = sweep()
+            if found:
+                logging.info(f"[Outbox] Varredura: {found} itens reenviados ao pool.")
+        except Exception as e:
+            logging.error(f"[Outbox] Falha na varredura: {e}")
+        _stop.wait(OUTBOX_SWEEP_SECONDS)
+
+
+def start_sweeper() -> None:
+    global _sweeper
+    if _sweeper is not None or core_db.db is None:
+        return
+    _stop.clear()
+    _sweeper = threading.Thread(target=_sweep_loop, name="outbox-sweeper", daemon=True)
+    _sweeper.start()
+    logging.info(f"[Outbox] Varredura iniciada ({OUTBOX_WORKERS} workers, a cada {OUTBOX_SWEEP_SECONDS}s).")
+
+
+def stop_sweeper() -> None:
+    global _sweeper
+    _stop.set()
+    _sweeper = None
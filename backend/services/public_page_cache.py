@@ -0,0 +1,86 @@
+# backend/services/public_page_cache.py
+# Página pública do salão (/saloes/{id}/servicos) já serializada, com ETag.
+# O ETag é a versão do conteúdo: update_time do salão, dos 'servicos' e dos
+# 'profissionais'. Com a página em cache, um If-None-Match igual responde 304
+# sem tocar no Firestore; os headers Cache-Control deixam a CDN absorver o tráfego.
+# Invalidação: junto com o cache do salão (listener/escritas) e nas escritas da equipe.
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from core.cache import StatsTTLCache
+from core.db import on_salon_invalidated, version_digest
+
+PUBLIC_PAGE_CACHE_TTL_SECONDS = int(os.environ.get("PUBLIC_PAGE_CACHE_TTL_SECONDS", 300))
+PUBLIC_PAGE_CACHE_MAXSIZE = int(os.environ.get("PUBLIC_PAGE_CACHE_MAXSIZE", 512))
+# Navegador/CDN: max-age curto + stale-while-revalidate longo (o ETag revalida barato)
+PUBLIC_PAGE_MAX_AGE = int(os.environ.get("PUBLIC_PAGE_MAX_AGE", 60))
+PUBLIC_PAGE_STALE_WHILE_REVALIDATE = int(os.environ.get("PUBLIC_PAGE_STALE_WHILE_REVALIDATE", 600))
+
+
+@dataclass(frozen=True)
+class PublicPage:
+    etag: str
+    body: bytes
+
+
+_cache = StatsTTLCache(
+    name="public_page",
+    maxsize=PUBLIC_PAGE_CACHE_MAXSIZE,
+    ttl=PUBLIC_PAGE_CACHE_TTL_SECONDS,
+)
+# Geração por salão: uma página montada antes de uma invalidação não entra no cache
+_generations: Dict[str, int] = {}
+_generations_lock = threading.Lock()
+
+
+def make_etag(salon_version: str, team_versions: Iterable[Tuple[str, Any]]) -> str:
+    return f'"{version_digest([("salon", salon_version)] + sorted(team_versions))}"'
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={PUBLIC_PAGE_MAX_AGE}, stale-while-revalidate={PUBLIC_PAGE_STALE_WHILE_REVALIDATE}",
+    }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Compara o If-None-Match (lista, '*' ou W/"...") com o ETag atual (comparação fraca)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag[2:] == etag if tag.startswith("W/") else tag == etag for tag in candidates)
+
+
+def get(salao_id: str) -> Optional[PublicPage]:
+    return _cache.get(salao_id)
+
+
+def generation(salao_id: str) -> int:
+    """Ler ANTES de buscar os dados; passar para store()."""
+    with _generations_lock:
+        return _generations.get(salao_id, 0)
+
+
+def store(salao_id: str, page: PublicPage, built_at_generation: int) -> None:
+    with _generations_lock:
+        if _generations.get(salao_id, 0) != built_at_generation:
+            return
+        _cache.set(salao_id, page)
+
+
+def invalidate(salao_id: str) -> None:
+    with _generations_lock:
+        _generations[salao_id] = _generations.get(salao_id, 0) + 1
+    _cache.pop(salao_id)
+
+
+def stats():
+    return _cache.stats()
+
+
+on_salon_invalidated(invalidate)
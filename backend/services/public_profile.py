@@ -0,0 +1,183 @@
+# backend/services/public_profile.py
+# Perfil público do salão pré-montado: public_profiles/{salao_id}.
+# Guarda o JSON do microsite já pronto (telefone mesclado, serviços, equipe ativa),
+# a flag de assinatura ativa e o ETag. A rota pública faz UMA leitura de documento
+# em vez de juntar salão + 'servicos' + 'profissionais' a cada requisição, e o mesmo
+# JSON pode ser exportado como arquivo estático (export_public_profiles.py).
+# Reconstrução: toda invalidação do salão (escritas deste processo via
+# invalidate_salon_cache e mudanças vistas pelo listener, inclusive de outro worker)
+# e escritas da equipe (team_routes) agendam um rebuild em segundo plano; um rebuild
+# que chega ao mesmo ETag do perfil gravado não regrava.
+# Leitura (get_current): o perfil guarda a versão do salão com que foi montado e só é
+# servido se ela bate com a dos dados do salão em cache. Perfil ausente ou defasado
+# (escrita fora das rotas, listener atrasado) é montado na hora e agendado.
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import pytz
+from fastapi.encoders import jsonable_encoder
+from firebase_admin import firestore
+
+from core import db as core_db
+from core.db import SALON_VERSION_KEY, get_hairdresser_data_from_db, on_salon_invalidated, run_parallel
+from core.models import Professional, SalonPublicDetails, Service
+from core.repositories import salons
+from services import public_page_cache
+
+PUBLIC_PROFILE_COLLECTION = 'public_profiles'
+
+# Um único worker: rebuilds do mesmo salão nunca se atropelam (o mais novo grava por último)
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="public-profile")
+_pending: Set[str] = set()
+_pending_lock = threading.Lock()
+
+
+def _ref(salao_id: str):
+    return core_db.db.collection(PUBLIC_PROFILE_COLLECTION).document(salao_id)
+
+
+def subscription_active(status: Optional[str], trial_ends_at: Any, now: Optional[datetime] = None) -> bool:
+    """Assinatura 'active' ou 'trialing' com trialEndsAt no futuro."""
+    if status == "active":
+        return True
+    if status != "trialing" or not trial_ends_at:
+        return False
+    trial_ends_at = _as_utc(trial_ends_at)
+    return trial_ends_at > (now or datetime.now(pytz.utc))
+
+
+def _as_utc(value: Any) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=pytz.utc) if value.tzinfo is None else value
+
+
+def is_active(profile: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+    """A flag é gravada no rebuild; o fim do trial é conferido na leitura (passa sem escrita)."""
+    if not profile.get("assinaturaAtiva"):
+        return False
+    trial_ends_at = profile.get("trialEndsAt")
+    return trial_ends_at is None or _as_utc(trial_ends_at) > (now or datetime.now(pytz.utc))
+
+
+def _load_team(salao_id: str) -> Tuple[List[Professional], Optional[List[Tuple[str, Any]]]]:
+    """Equipe ativa + versões (id, update_time) para o ETag; versões None se a leitura falhar."""
+    team = []
+    versions = []
+    try:
+        docs = core_db.db.collection('cabeleireiros').document(salao_id).collection('profissionais').stream()
+        for doc in docs:
+            versions.append((doc.id, doc.update_time))
+            data = doc.to_dict()
+            if data.get('ativo', True) is False: continue
+            team.append(Professional(id=doc.id, **data))
+    except Exception as e:
+        logging.error(f"Erro ao buscar equipe para o perfil público de {salao_id}: {e}")
+        return team, None
+    return team, versions
+
+
+def build(salao_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Monta o perfil a partir do salão (+ serviços) e da equipe. None se o salão não existe.
+    'etag' fica None quando a equipe não pôde ser lida (perfil não é gravado nem cacheado).
+    """
+    salon_data, (team, team_versions) = run_parallel(
+        lambda: get_hairdresser_data_from_db(salao_id),
+        lambda: _load_team(salao_id),
+    )
+    if not salon_data:
+        return None
+
+    # Prioriza 'telefone' (Painel/Personalização); se vazio, usa 'numero_whatsapp' (Cadastro)
+    salon_data['telefone'] = salon_data.get('telefone') or salon_data.get('numero_whatsapp')
+
+    services = [Service(id=service_id, **info) for service_id, info in (salon_data.get("servicos_data") or {}).items()]
+    payload = SalonPublicDetails(servicos=services, profissionais=team, **salon_data)
+
+    status = salon_data.get("subscriptionStatus")
+    trial_ends_at = salon_data.get("trialEndsAt")
+    etag = None
+    if team_versions is not None and salon_data.get(SALON_VERSION_KEY):
+        etag = public_page_cache.make_etag(salon_data[SALON_VERSION_KEY], team_versions)
+
+    return {
+        "payload": jsonable_encoder(payload),
+        "subscriptionStatus": status,
+        "assinaturaAtiva": subscription_active(status, trial_ends_at),
+        "trialEndsAt": _as_utc(trial_ends_at) if status == "trialing" and trial_ends_at else None,
+        "etag": etag,
+        "salonVersion": salon_data.get(SALON_VERSION_KEY),
+    }
+
+
+def get(salao_id: str) -> Optional[Dict[str, Any]]:
+    """Uma leitura: o perfil gravado, ou None se ainda não existe."""
+    doc = _ref(salao_id).get()
+    return doc.to_dict() if doc.exists else None
+
+
+def get_current(salao_id: str) -> Optional[Dict[str, Any]]:
+    """
+    O perfil gravado, se foi montado com a versão atual do salão (dados em cache); senão
+    monta na hora e agenda a gravação. None se o salão não existe.
+    """
+    profile, salon_data = run_parallel(lambda: get(salao_id), lambda: get_hairdresser_data_from_db(salao_id))
+    if salon_data is None:
+        # Salão excluído tem o perfil removido pelo rebuild; aqui é falha de leitura
+        return profile
+    if profile is not None and profile.get("salonVersion") == salon_data.get(SALON_VERSION_KEY):
+        return profile
+    if profile is not None:
+        logging.info(f"Perfil público de {salao_id} defasado em relação ao salão: montado na hora.")
+    fresh = build(salao_id)
+    if fresh is not None:
+        schedule_rebuild(salao_id)
+    return fresh
+
+
+def rebuild(salao_id: str) -> None:
+    profile = build(salao_id)
+    if profile is None:
+        if salons.exists(salao_id):
+            return  # Falha de leitura, não exclusão: mantém o perfil atual
+        _ref(salao_id).delete()
+        logging.info(f"Perfil público de {salao_id} removido (salão não existe).")
+    elif profile["etag"] is None:
+        logging.warning(f"Perfil público de {salao_id} não reconstruído: equipe indisponível.")
+        return
+    else:
+        current = get(salao_id)
+        if current is not None and current.get("etag") == profile["etag"] and current.get("salonVersion") == profile["salonVersion"]:
+            return  # Outro worker (ou rebuild anterior) já gravou esta versão
+        _ref(salao_id).set({**profile, "atualizadoEm": firestore.SERVER_TIMESTAMP})
+        logging.info(f"Perfil público de {salao_id} reconstruído (ETag {profile['etag']}).")
+    # A página em cache pode ter sido montada com o perfil antigo durante o rebuild
+    public_page_cache.invalidate(salao_id)
+
+
+def _run_rebuild(salao_id: str) -> None:
+    # Sai do 'pendente' antes de ler: uma escrita durante o rebuild agenda outro
+    with _pending_lock:
+        _pending.discard(salao_id)
+    try:
+        rebuild(salao_id)
+    except Exception as e:
+        logging.error(f"Falha ao reconstruir o perfil público de {salao_id}: {e}")
+
+
+def schedule_rebuild(salao_id: str) -> None:
+    """Agenda o rebuild em segundo plano (não bloqueia a rota); pedidos repetidos se juntam."""
+    if core_db.db is None:
+        return
+    with _pending_lock:
+        if salao_id in _pending:
+            return
+        _pending.add(salao_id)
+    _executor.submit(_run_rebuild, salao_id)
+
+
+on_salon_invalidated(schedule_rebuild)
@@ -0,0 +1,114 @@
+# backend/services/reservations.py
+# Reserva transacional de horário: fecha a corrida "valida -> grava" entre dois
+# clientes que pedem o mesmo horário ao mesmo tempo.
+# Cada (dia, profissional) tem um documento em cabeleireiros/{id}/agenda_reservas
+# ('2025-11-09__pro-1'; sem profissional: '2025-11-09__salao') com os intervalos
+# reservados. O agendamento é gravado NA MESMA transação que confere e atualiza
+# esse documento, então só um de dois pedidos concorrentes passa. Profissionais e
+# dias diferentes usam documentos diferentes e não disputam a mesma transação.
+# O livro não precisa acompanhar cancelamentos/reagendamentos: uma entrada em
+# conflito só vale se o agendamento ainda existe, está ativo e ocupa o intervalo
+# (conferido dentro da transação); entradas velhas são descartadas na próxima escrita.
+# 'expireAt' permite uma política de TTL do Firestore na coleção.
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import pytz
+from firebase_admin import firestore
+
+from core import db as core_db
+from core.repositories import agendamentos, profissionais, reservas_agenda
+from services.calendar_service import CANCELLED_STATUSES, LOCAL_TIMEZONE
+
+SALON_WIDE_KEY = 'salao'
+RESERVATION_RETENTION_DAYS = 2
+
+
+def _agenda_doc_id(day_iso: str, key: str) -> str:
+    return f"{day_iso}__{key}"
+
+
+def _as_utc(value: datetime) -> datetime:
+    return pytz.utc.localize(value) if value.tzinfo is None else value.astimezone(pytz.utc)
+
+
+def _overlaps(start_a: datetime, end_a: datetime, start_b: datetime, end_b: datetime) -> bool:
+    return _as_utc(start_a) < _as_utc(end_b) and _as_utc(end_a) > _as_utc(start_b)
+
+
+def _still_busy(snapshot, start: datetime, end: datetime) -> bool:
+    """O agendamento da entrada ainda existe, está ativo e ocupa o intervalo pedido?"""
+    if not snapshot.exists:
+        return False
+    data = snapshot.to_dict()
+    if data.get('status') in CANCELLED_STATUSES:
+        return False
+    appt_start, appt_end = data.get('startTime'), data.get('endTime')
+    return bool(appt_start and appt_end and _overlaps(appt_start, appt_end, start, end))
+
+
+@firestore.transactional
+def _reserve_in_transaction(transaction, salao_id: str, agendamento_ref, agendamento_data: Dict[str, Any],
+                            own_key: str, other_keys: Iterable[str], day_iso: str,
+                            extra_writes: Sequence[Tuple[Any, Dict[str, Any]]] = ()) -> bool:
+    start, end = agendamento_data['startTime'], agendamento_data['endTime']
+    own_ref = reservas_agenda.ref(salao_id, _agenda_doc_id(day_iso, own_key))
+    refs = [own_ref] + [reservas_agenda.ref(salao_id, _agenda_doc_id(day_iso, key)) for key in other_keys]
+
+    # 1. Leituras (todas antes das escritas, regra do Firestore)
+    ledgers = {snap.id: (snap.to_dict() or {}).get('reservas', {}) for snap in transaction.get_all(refs)}
+    own_entries = dict(ledgers.get(own_ref.id, {}))
+
+    candidates = {
+        appt_id: entry
+        for ledger in ledgers.values()
+        for appt_id, entry in ledger.items()
+        if _overlaps(entry['start'], entry['end'], start, end)
+    }
+    if candidates:
+        appt_refs = [agendamentos.ref(salao_id, appt_id) for appt_id in candidates]
+        for snapshot in transaction.get_all(appt_refs):
+            if _still_busy(snapshot, start, end):
+                return False
+            # Cancelado, removido ou reagendado: a entrada não vale mais
+            own_entries.pop(snapshot.id, None)
+
+    # 2. Escritas: agendamento + livro do dia (+ cliente do CRM, itens do outbox), atômicos
+    own_entries[agendamento_ref.id] = {'start': start, 'end': end}
+    transaction.set(agendamento_ref, agendamento_data)
+    for ref, data in extra_writes:
+        transaction.set(ref, data, merge=True)
+    transaction.set(own_ref, {
+        'date': day_iso,
+        'professionalId': None if own_key == SALON_WIDE_KEY else own_key,
+        'reservas': own_entries,
+        'expireAt': datetime.fromisoformat(day_iso).replace(tzinfo=pytz.utc) + timedelta(days=RESERVATION_RETENTION_DAYS),
+    })
+    return True
+
+
+def reserve_and_create(salao_id: str, agendamento_data: Dict[str, Any],
+                       professional_id: Optional[str] = None, agendamento_id: Optional[str] = None,
+                       extra_writes: Sequence[Tuple[Any, Dict[str, Any]]] = ()) -> Optional[str]:
+    """
+    Grava o agendamento só se o intervalo [startTime, endTime) continuar livre no
+    livro de reservas. Retorna o id do agendamento, ou None se outro pedido levou o horário.
+    Sem profissional o pedido conflita com a agenda de todos (mesma regra do validate_booking).
+    'agendamento_id' pré-gerado e 'extra_writes' [(ref, dados)] entram na mesma transação
+    (mesclados: serve tanto para criar quanto para atualizar o documento).
+    """
+    start = agendamento_data['startTime']
+    day_iso = _as_utc(start).astimezone(pytz.timezone(LOCAL_TIMEZONE)).date().isoformat()
+    if professional_id:
+        own_key, other_keys = professional_id, []
+    else:
+        own_key, other_keys = SALON_WIDE_KEY, list(profissionais.list_active(salao_id).keys())
+
+    agendamento_ref = agendamentos.ref(salao_id, agendamento_id)
+    transaction = core_db.db.transaction()
+    if not _reserve_in_transaction(transaction, salao_id, agendamento_ref, agendamento_data,
+                                   own_key, other_keys, day_iso, extra_writes):
+        logging.info(f"Reserva recusada em {salao_id} ({day_iso}, {own_key}): horário tomado por pedido concorrente.")
+        return None
+    return agendamento_ref.id
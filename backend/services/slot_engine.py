@@ -0,0 +1,82 @@
+# backend/services/slot_engine.py
+# Motor de slots baseado em intervalos de minutos do dia (0..1440).
+# Todo o cálculo é feito com inteiros: os períodos ocupados são mesclados uma
+# única vez e varridos contra a janela de trabalho em O(n log n). As strings
+# ISO só são geradas no final, para os horários que sobraram.
+from datetime import datetime, date, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+import pytz
+
+MINUTES_PER_DAY = 24 * 60
+
+Interval = Tuple[int, int]
+
+
+def hhmm_to_minutes(value: str) -> int:
+    """Converte 'HH:MM' em minutos desde a meia-noite."""
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def datetime_to_day_minutes(dt: datetime, day: date) -> int:
+    """
+    Minutos de 'dt' (já no fuso local) relativos à meia-noite de 'day'.
+    Pode ser negativo ou passar de 1440 para eventos que atravessam o dia.
+    """
+    return (dt.date() - day).days * MINUTES_PER_DAY + dt.hour * 60 + dt.minute
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Ordena e mescla intervalos sobrepostos ou encostados. Descarta intervalos vazios."""
+    merged: List[List[int]] = []
+    for start, end in sorted(i for i in intervals if i[1] > i[0]):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def _ceil_to_step(minute: int, step: int) -> int:
+    return -(-minute // step) * step
+
+
+def free_starts(
+    window_start: int,
+    window_end: int,
+    busy: Iterable[Interval],
+    duration: int,
+    step: int,
+    not_before: Optional[int] = None,
+) -> List[int]:
+    """
+    Retorna os minutos de início livres dentro de [window_start, window_end).
+
+    Os candidatos andam de 'step' em 'step' a partir do início da busca; ao bater
+    em um período ocupado, a busca pula para o fim dele arredondado para o
+    próximo múltiplo de 'step' (mesma regra de alinhamento do loop antigo).
+    """
+    cursor = window_start if not_before is None else max(window_start, not_before)
+    merged = merge_intervals(busy)
+
+    starts: List[int] = []
+    i, n = 0, len(merged)
+    while cursor + duration <= window_end:
+        # Descarta ocupações que já terminaram antes do candidato
+        while i < n and merged[i][1] <= cursor:
+            i += 1
+        if i < n and merged[i][0] < cursor + duration:
+            cursor = _ceil_to_step(merged[i][1], step)
+            continue
+        starts.append(cursor)
+        cursor += step
+    return starts
+
+
+def starts_to_iso(day: date, starts: Iterable[int], timezone: str) -> List[str]:
+    """Converte minutos do dia em strings ISO com fuso (etapa final do cálculo)."""
+    local_tz = pytz.timezone(timezone)
+    midnight = datetime.combine(day, datetime.min.time())
+    return [local_tz.localize(midnight + timedelta(minutes=m)).isoformat() for m in starts]
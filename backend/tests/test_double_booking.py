@@ -0,0 +1,115 @@
+# backend/tests/test_double_booking.py
+# Garantia contra double booking (services/reservations.py) no backend em memória,
+# sem Firebase nem passos manuais: pedidos simultâneos para o mesmo profissional e
+# intervalo -> exatamente um vence; a rota pública devolve 409 para o horário tomado.
+# Para carga/vazão ver bench_double_booking.py.
+#
+# Uso (a partir de backend/):
+#   python -m unittest discover tests
+import os
+
+# Antes de importar core.db: store em memória com um salão de demonstração
+os.environ["HORALIS_DATA_BACKEND"] = "memory"
+os.environ.setdefault("HORALIS_MEMORY_DEMO_SALOES", "1")
+os.environ.setdefault("HORALIS_SETUP_PRICE", "0")
+
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytz
+from fastapi.testclient import TestClient
+
+import main
+from core.repositories import agendamentos
+from services import calendar_service, reservations
+
+SALAO_ID = "demo-1"
+LOCAL_TZ = pytz.timezone(calendar_service.LOCAL_TIMEZONE)
+
+
+def _open_start(days_ahead: int, hour: int) -> datetime:
+    """Dia útil (seg-sáb) a partir de days_ahead, no horário local informado."""
+    day = datetime.now(LOCAL_TZ).date() + timedelta(days=days_ahead)
+    while day.weekday() == 6:
+        day += timedelta(days=1)
+    return LOCAL_TZ.localize(datetime.combine(day, datetime.min.time()) + timedelta(hours=hour))
+
+
+def _appointment(professional_id: str, start: datetime, index: int) -> dict:
+    return {
+        "salaoId": SALAO_ID, "customerName": f"Concorrente {index}", "customerPhone": f"1190000{index:04d}",
+        "serviceName": "Teste de concorrência", "servicePrice": 0.0, "durationMinutes": 30,
+        "professionalId": professional_id, "startTime": start, "endTime": start + timedelta(minutes=30),
+        "status": "confirmado", "channel": "teste",
+    }
+
+
+def _stored(professional_id: str, start: datetime) -> list:
+    return [
+        a for a in agendamentos.in_range(SALAO_ID, start, start, professional_id=professional_id)
+        if a.get("channel") == "teste"
+    ]
+
+
+class ConcurrentReservationTest(unittest.TestCase):
+
+    def _race(self, professional_id: str, starts: list) -> list:
+        """Dispara um reserve_and_create por início, todos juntos (barreira)."""
+        barrier = threading.Barrier(len(starts))
+
+        def _one(index):
+            barrier.wait()
+            return reservations.reserve_and_create(
+                SALAO_ID, _appointment(professional_id, starts[index], index), professional_id
+            )
+
+        with ThreadPoolExecutor(max_workers=len(starts)) as pool:
+            return list(pool.map(_one, range(len(starts))))
+
+    def test_same_professional_and_interval_only_one_wins(self):
+        start = _open_start(days_ahead=20, hour=10)
+        results = self._race("pro-1", [start, start])
+        self.assertEqual(sum(r is not None for r in results), 1)
+        self.assertEqual(len(_stored("pro-1", start)), 1)
+
+    def test_many_concurrent_requests_only_one_wins(self):
+        start = _open_start(days_ahead=21, hour=10)
+        results = self._race("pro-2", [start] * 16)
+        self.assertEqual(sum(r is not None for r in results), 1)
+        self.assertEqual(len(_stored("pro-2", start)), 1)
+
+    def test_overlapping_interval_conflicts(self):
+        start = _open_start(days_ahead=22, hour=14)
+        self.assertIsNotNone(reservations.reserve_and_create(SALAO_ID, _appointment("pro-3", start, 1), "pro-3"))
+        overlapping = start + timedelta(minutes=15)
+        self.assertIsNone(reservations.reserve_and_create(SALAO_ID, _appointment("pro-3", overlapping, 2), "pro-3"))
+
+    def test_other_professional_same_interval_is_free(self):
+        start = _open_start(days_ahead=23, hour=11)
+        results = self._race("pro-1", [start]) + self._race("pro-2", [start])
+        self.assertTrue(all(r is not None for r in results))
+
+
+class BookingRouteConflictTest(unittest.TestCase):
+
+    def test_second_booking_for_taken_slot_returns_409(self):
+        client = TestClient(main.app)
+        start = _open_start(days_ahead=25, hour=15)
+        body = {
+            "salao_id": SALAO_ID, "service_id": "corte", "start_time": start.isoformat(),
+            "customer_name": "Cliente Um", "customer_email": "um@teste.com", "customer_phone": "11911112222",
+            "professional_id": "pro-1", "professional_name": "Profissional 1",
+        }
+        first = client.post("/api/v1/agendamentos", json=body)
+        self.assertEqual(first.status_code, 201, first.text)
+
+        second = client.post("/api/v1/agendamentos", json={
+            **body, "customer_name": "Cliente Dois", "customer_email": "dois@teste.com", "customer_phone": "11933334444",
+        })
+        self.assertEqual(second.status_code, 409, second.text)
+
+
+if __name__ == "__main__":
+    unittest.main()